@@ -91,7 +91,6 @@ class RegisterSerializer(serializers.ModelSerializer):
                     subdomain=resolved_slug,
                     category=category,
                     theme=theme,
-                    settings=theme.default_settings if theme else {}
                 )
             except Exception:
                 # If site creation fails, we still have the user
@@ -0,0 +1,24 @@
+from django.http import JsonResponse
+
+
+def json_response(data, status=200, **kwargs):
+    """
+    JSON response for plain (non-DRF) views, rendered like DRF's JSONRenderer.
+    """
+    return JsonResponse(
+        data,
+        status=status,
+        safe=False,
+        json_dumps_params={'ensure_ascii': False},
+        **kwargs,
+    )
+
+
+def client_ip(request):
+    """
+    The client address, taking the first hop of X-Forwarded-For when present.
+    """
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded_for:
+        return forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
@@ -0,0 +1,141 @@
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+
+# Bump when widths/formats/quality change so existing variants are regenerated.
+VARIANTS_VERSION = 1
+
+FORMATS = (
+    # (key, Pillow format, extension, save options)
+    ('avif', 'AVIF', 'avif', {'quality': 50}),
+    ('webp', 'WEBP', 'webp', {'quality': 75, 'method': 4}),
+    ('jpeg', 'JPEG', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+)
+
+
+def get_widths():
+    return tuple(getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640, 1280)))
+
+
+def _supported_formats():
+    return [fmt for fmt in FORMATS if fmt[0] != 'avif' or features.check('avif')]
+
+
+def _encode(image, pillow_format, options):
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def build_variants(name):
+    """
+    Resized AVIF/WebP/JPEG renditions of a stored image.
+    Files are content-addressed by the source hash, so re-uploads of the same
+    image (or retries) reuse what is already in storage.
+    Returns the JSON-serializable entry kept in the model's `image_variants`.
+    """
+    with default_storage.open(name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    width, height = image.size
+
+    widths = sorted({min(w, width) for w in get_widths()})
+    variants = {}
+    for key, pillow_format, extension, options in _supported_formats():
+        variants[key] = []
+        for target in widths:
+            path = f'variants/{digest[:2]}/{digest}/{target}.{extension}'
+            if not default_storage.exists(path):
+                resized = image if target == width else image.resize(
+                    (target, max(1, round(height * target / width))), Image.LANCZOS,
+                )
+                default_storage.save(path, ContentFile(_encode(resized, pillow_format, options)))
+            variants[key].append([target, path])
+
+    return {
+        'v': VARIANTS_VERSION,
+        'source': name,
+        'width': width,
+        'height': height,
+        'variants': variants,
+    }
+
+
+def is_current(entry, name) -> bool:
+    return bool(entry) and entry.get('v') == VARIANTS_VERSION and entry.get('source') == name
+
+
+def variant_urls(entry, name, build_url=None):
+    """
+    `srcset`-ready URLs for a variants entry, or None while variants are pending.
+    """
+    if not is_current(entry, name):
+        return None
+    build_url = build_url or (lambda url: url)
+    srcset = {
+        key: ', '.join(f'{build_url(default_storage.url(path))} {width}w' for width, path in renditions)
+        for key, renditions in entry['variants'].items()
+    }
+    jpeg = entry['variants'].get('jpeg') or []
+    return {
+        'width': entry['width'],
+        'height': entry['height'],
+        'src': build_url(default_storage.url(jpeg[-1][1])) if jpeg else None,
+        'srcset': srcset,
+    }
+
+
+def field_variant_urls(instance, field, request=None):
+    """
+    Serializer helper: variant URLs for one image field, absolute when a request is given.
+    """
+    image = getattr(instance, field)
+    if not image:
+        return None
+    build_url = request.build_absolute_uri if request is not None else None
+    return variant_urls((instance.image_variants or {}).get(field), image.name, build_url)
+
+
+def stale_image_fields(instance, fields):
+    """
+    Image fields of `instance` whose stored variants do not match the current file.
+    """
+    entries = instance.image_variants or {}
+    return [
+        field for field in fields
+        if getattr(instance, field) and not is_current(entries.get(field), getattr(instance, field).name)
+    ]
+
+
+def refresh_variants(model, pk, fields):
+    """
+    Builds missing variants for `fields` of one row and stores them with an UPDATE,
+    so no save signals fire. Returns the row, or None when nothing changed.
+    """
+    instance = model._base_manager.filter(pk=pk).first()
+    if instance is None:
+        return None
+    stale = stale_image_fields(instance, fields)
+    if not stale:
+        return None
+
+    entries = dict(instance.image_variants or {})
+    for field in stale:
+        entries[field] = build_variants(getattr(instance, field).name)
+    # Only write if the files did not change while we were encoding.
+    current = {field: getattr(instance, field).name for field in stale}
+    if not model._base_manager.filter(pk=pk, **current).update(image_variants=entries):
+        return None
+    instance.image_variants = entries
+    return instance
@@ -0,0 +1,173 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import F, OrderBy, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a unique ordering such as ('-created_at', '-id').
+    Each page is one indexed range scan, however deep the client pages.
+
+    Every list is paged, so no request reads more than `max_page_size` rows;
+    small curated catalogs opt out with `pagination_class = None`. Views set
+    `keyset_ordering` and may lower `max_page_size`. An ordering already applied
+    to the queryset (model default, search relevance, OrderingFilter) is kept,
+    with the view's unique last key appended as a tie-breaker; the cursor
+    records the ordering it was issued for.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+    default_ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def get_ordering(self, queryset, view):
+        """
+        Returns (queryset, ordering). Expressions and related lookups in the
+        queryset's ordering are annotated, so cursors can carry their values.
+        """
+        keyset = tuple(getattr(view, 'keyset_ordering', self.default_ordering))
+        query = queryset.query
+        terms = query.order_by or (query.get_meta().ordering if query.default_ordering else ())
+        if not terms or '?' in terms:
+            return queryset, keyset
+
+        ordering, annotations = [], {}
+        for position, term in enumerate(terms):
+            if isinstance(term, str):
+                descending, name = term.startswith('-'), term.lstrip('-')
+                if name == 'pk':
+                    name = queryset.model._meta.pk.name
+                if LOOKUP_SEP in name:
+                    annotations[f'keyset_{position}'], name = F(name), f'keyset_{position}'
+            else:
+                descending = isinstance(term, OrderBy) and term.descending
+                annotations[f'keyset_{position}'] = term.expression if isinstance(term, OrderBy) else term
+                name = f'keyset_{position}'
+            ordering.append(f'-{name}' if descending else name)
+
+        tie_breaker = keyset[-1]
+        if tie_breaker.lstrip('-') not in {field.lstrip('-') for field in ordering}:
+            ordering.append(tie_breaker)
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset, tuple(ordering)
+
+    def get_page_size(self, request, view):
+        max_page_size = getattr(view, 'max_page_size', self.max_page_size)
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            size = self.page_size
+        return max(1, min(size, max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset, self.ordering = self.get_ordering(queryset, view)
+        self.page_size = self.get_page_size(request, view)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._after(queryset.model, self._decode(cursor)))
+
+        rows = list(queryset[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        return self.page
+
+    def _after(self, model, values):
+        """
+        WHERE clause for rows strictly after `values` in the keyset ordering:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            value = self._to_python(model, name, value)
+            lookup = f"{name}__lt" if field.startswith('-') else f"{name}__gt"
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _to_python(self, model, name, value):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # An annotated ordering term; its value came from the database as a scalar.
+            if value is not None and not isinstance(value, (int, float, str)):
+                raise NotFound(self.invalid_cursor_message)
+            return value
+        if isinstance(field, models.DateTimeField):
+            parsed = parse_datetime(value) if isinstance(value, str) else None
+            if parsed is None:
+                raise NotFound(self.invalid_cursor_message)
+            return parsed
+        if isinstance(field, (models.IntegerField, models.AutoField)):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return value
+
+    def _position(self, obj):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def _encode(self, values):
+        payload = {'ordering': list(self.ordering), 'values': values}
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def _decode(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        # A cursor only continues the ordering it was issued for.
+        if not isinstance(payload, dict) or payload.get('ordering') != list(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        values = payload.get('values')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_cursor(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._encode(self._position(self.page[-1]))
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = cursor
+        params[self.page_size_query_param] = str(self.page_size)
+        return self.request.build_absolute_uri(f"{self.request.path}?{params.urlencode()}")
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tenants.middleware.TLSAskMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -72,6 +73,8 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # Lists are paged by cursor (?cursor= / ?page_size=); see core.pagination.
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
 }
 
 from datetime import timedelta
@@ -146,6 +149,18 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Shared cache (second tier behind each worker's in-process tenant cache)
+if env.bool('USE_REDIS_CACHE', default=False):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': env('CACHE_URL', default='redis://redis:6379/1'),
+        }
+    }
+
+# Tenant cache invalidations are fanned out to every worker over this pub/sub URL.
+TENANT_CACHE_PUBSUB_URL = env('TENANT_CACHE_PUBSUB_URL', default=CELERY_BROKER_URL)
+
 # Payment Gateways
 ZARINPAL_MERCHANT_ID = os.environ.get('ZARINPAL_MERCHANT_ID', 'placeholder-uuid')
 ZARINPAL_SANDBOX = True # Set to False in production
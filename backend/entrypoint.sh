@@ -15,6 +15,13 @@ if [ "${COLLECT_STATIC:-1}" = "1" ]; then
   python manage.py collectstatic --noinput
 fi
 
-# Start Gunicorn
+# Start Gunicorn. Without an explicit command, serve core.asgi through uvicorn
+# workers so streaming endpoints (site creation progress) do not pin a worker.
+if [ "$#" -eq 0 ]; then
+  set -- gunicorn core.asgi:application \
+    --worker-class uvicorn.workers.UvicornWorker \
+    --bind 0.0.0.0:8000 \
+    --workers "${WEB_CONCURRENCY:-3}"
+fi
 echo "Starting Gunicorn..."
 exec "$@"
@@ -0,0 +1,156 @@
+from datetime import timedelta
+from functools import cache
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from tenants.models import Tenant
+
+from .models import MenuChange, MenuRevision
+from .snapshot import category_rows, get_menu_revision, is_menu_active, product_rows
+from .tasks import schedule_snapshot_rebuild
+
+
+def get_max_delta_changes():
+    # Past this many changed objects the full snapshot is cheaper to send.
+    return getattr(settings, 'MENU_DELTA_MAX_CHANGES', 500)
+
+
+def get_tombstone_ttl():
+    return timedelta(days=getattr(settings, 'MENU_CHANGE_TOMBSTONE_DAYS', 30))
+
+
+def _next_revision(tenant_id):
+    if not MenuRevision.objects.filter(tenant_id=tenant_id).update(revision=F('revision') + 1):
+        if not Tenant.objects.filter(id=tenant_id).exists():
+            return None
+        MenuRevision.objects.get_or_create(tenant_id=tenant_id)
+        MenuRevision.objects.filter(tenant_id=tenant_id).update(revision=F('revision') + 1)
+    return MenuRevision.objects.filter(tenant_id=tenant_id).values_list('revision', flat=True).get()
+
+
+@transaction.atomic
+def record_changes(tenant_id, kind, ids, deleted=False):
+    """
+    Moves the given objects to a new tenant revision; one revision per call.
+    Returns the revision, or None when there is nothing to record.
+    """
+    ids = set(ids)
+    if not tenant_id or not ids:
+        return None
+    # The counter row lock serializes writers per tenant, so revisions commit in order.
+    revision = _next_revision(tenant_id)
+    if revision is None:
+        return None
+    now = timezone.now()
+    MenuChange.objects.bulk_create(
+        [
+            MenuChange(tenant_id=tenant_id, kind=kind, object_id=pk, revision=revision, deleted=deleted, changed_at=now)
+            for pk in ids
+        ],
+        update_conflicts=True,
+        unique_fields=['tenant', 'kind', 'object_id'],
+        update_fields=['revision', 'deleted', 'changed_at'],
+    )
+    return revision
+
+
+def log_menu_changes(tenant_id, kind, ids, deleted=False):
+    """
+    Records the changes in the caller's transaction, so they commit or roll back
+    with the data, then queues the snapshot rebuild for after the commit so the
+    snapshot carries the new revision.
+    """
+    record_changes(tenant_id, kind, ids, deleted)
+    transaction.on_commit(lambda: schedule_snapshot_rebuild(tenant_id))
+
+
+@cache
+def _cascades_to_tenant(model):
+    seen, pending = set(), [model]
+    while pending:
+        current = pending.pop()
+        if current is Tenant:
+            return True
+        seen.add(current)
+        pending.extend(
+            relation.related_model for relation in current._meta.related_objects
+            if relation.on_delete is models.CASCADE and relation.related_model not in seen
+        )
+    return False
+
+
+def deletes_tenant(origin):
+    """
+    Whether the delete() that started at `origin` (an instance or a queryset)
+    removes a tenant too. Menu rows going with their tenant are not logged:
+    the tenant's log goes with it and its clients have nothing left to sync.
+    """
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    return _cascades_to_tenant(model)
+
+
+def compact_changes(now=None):
+    """
+    Drops tombstones older than the TTL and raises each tenant's floor past them.
+    Upsert rows are kept: there is only one per live object.
+    """
+    cutoff = (now or timezone.now()) - get_tombstone_ttl()
+    expired = (
+        MenuChange.objects.filter(deleted=True, changed_at__lt=cutoff)
+        .values('tenant_id')
+        .annotate(last=Max('revision'))
+    )
+    removed = 0
+    for row in expired:
+        with transaction.atomic():
+            MenuRevision.objects.filter(tenant_id=row['tenant_id']).update(floor=Greatest('floor', row['last']))
+            removed += MenuChange.objects.filter(
+                tenant_id=row['tenant_id'], deleted=True, revision__lte=row['last'],
+            ).delete()[0]
+    return removed
+
+
+def build_delta(tenant_id, since):
+    """
+    Upserts and deletes after revision `since`, or None when the client must
+    resync from the full snapshot (log compacted past `since`, unknown revision,
+    inactive menu or too many changes).
+    """
+    revision, floor = get_menu_revision(tenant_id)
+    if since < floor or since > revision or not is_menu_active(tenant_id):
+        return None
+
+    changes = list(
+        MenuChange.objects.filter(tenant_id=tenant_id, revision__gt=since, revision__lte=revision)
+        .values_list('kind', 'object_id', 'deleted')[:get_max_delta_changes() + 1]
+    )
+    if len(changes) > get_max_delta_changes():
+        return None
+
+    changed = {kind: set() for kind in MenuChange.Kind.values}
+    deleted = {kind: set() for kind in MenuChange.Kind.values}
+    for kind, object_id, is_deleted in changes:
+        (deleted if is_deleted else changed)[kind].add(object_id)
+
+    categories = category_rows(tenant_id, changed[MenuChange.Kind.CATEGORY]) if changed[MenuChange.Kind.CATEGORY] else []
+    products = product_rows(tenant_id, changed[MenuChange.Kind.PRODUCT]) if changed[MenuChange.Kind.PRODUCT] else []
+    # Anything changed but no longer visible (deactivated, deleted since) is a delete for the client.
+    deleted[MenuChange.Kind.CATEGORY] |= changed[MenuChange.Kind.CATEGORY] - {row['id'] for row in categories}
+    deleted[MenuChange.Kind.PRODUCT] |= changed[MenuChange.Kind.PRODUCT] - {row['id'] for row in products}
+
+    return {
+        'revision': revision,
+        'full': False,
+        'categories': categories,
+        'products': products,
+        'deleted': {
+            'categories': sorted(deleted[MenuChange.Kind.CATEGORY]),
+            'products': sorted(deleted[MenuChange.Kind.PRODUCT]),
+        },
+    }
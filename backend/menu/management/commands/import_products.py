@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from menu.services import PARSERS, ProductImportError, ProductImportService, detect_format
+from tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Bulk import products for a tenant from a CSV, JSON array or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--tenant', required=True, help='Tenant subdomain')
+        parser.add_argument('--format', choices=sorted(PARSERS), help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        tenant = Tenant.objects.select_related('site').filter(subdomain=options['tenant']).first()
+        if tenant is None or tenant.site is None:
+            raise CommandError(f"Tenant {options['tenant']} not found or has no site.")
+
+        fmt = options['format'] or detect_format(options['path'])
+        service = ProductImportService(tenant, tenant.site, batch_size=options['batch_size'])
+        with open(options['path'], 'rb') as stream:
+            try:
+                result = service.run(stream, fmt)
+            except ProductImportError as exc:
+                for error in exc.errors:
+                    self.stderr.write(f"Row {error['row']}: {error['errors']}")
+                raise CommandError('Import aborted; no products were written.')
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported products: {result['created']} created, {result['updated']} updated."
+        ))
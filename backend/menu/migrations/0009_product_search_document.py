@@ -0,0 +1,109 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:17
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copy of menu.search.normalize as of this migration; later changes to the
+# live normalizer must not change what this migration writes.
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    '\u200c': ' ',
+    '\u0640': None,
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+})
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670]')
+_TOKEN = re.compile(r'\w+')
+
+
+def normalize(text):
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', text.translate(_CHAR_MAP)).lower()
+    return ' '.join(_TOKEN.findall(text))
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "mysql":
+        schema_editor.execute(
+            "ALTER TABLE menu_productsearchdocument ADD FULLTEXT INDEX menu_search_document_ft (document)"
+        )
+    elif vendor == "sqlite":
+        # External-content FTS5 table kept in sync by triggers on the document table.
+        schema_editor.execute("""
+            CREATE VIRTUAL TABLE menu_product_fts USING fts5(
+                document, content='menu_productsearchdocument', content_rowid='product_id'
+            )
+        """)
+        schema_editor.execute("""
+            CREATE TRIGGER menu_product_fts_ai AFTER INSERT ON menu_productsearchdocument BEGIN
+                INSERT INTO menu_product_fts(rowid, document) VALUES (new.product_id, new.document);
+            END
+        """)
+        schema_editor.execute("""
+            CREATE TRIGGER menu_product_fts_ad AFTER DELETE ON menu_productsearchdocument BEGIN
+                INSERT INTO menu_product_fts(menu_product_fts, rowid, document) VALUES ('delete', old.product_id, old.document);
+            END
+        """)
+        schema_editor.execute("""
+            CREATE TRIGGER menu_product_fts_au AFTER UPDATE ON menu_productsearchdocument BEGIN
+                INSERT INTO menu_product_fts(menu_product_fts, rowid, document) VALUES ('delete', old.product_id, old.document);
+                INSERT INTO menu_product_fts(rowid, document) VALUES (new.product_id, new.document);
+            END
+        """)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for trigger in ("menu_product_fts_ai", "menu_product_fts_ad", "menu_product_fts_au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS menu_product_fts")
+
+
+def index_existing_products(apps, schema_editor):
+    Product = apps.get_model("menu", "Product")
+    ProductSearchDocument = apps.get_model("menu", "ProductSearchDocument")
+
+    batch = []
+    for product in Product.objects.exclude(tenant__isnull=True).only("id", "tenant_id", "title", "description").iterator():
+        batch.append(ProductSearchDocument(
+            product_id=product.id,
+            tenant_id=product.tenant_id,
+            document=normalize(f"{product.title or ''} {product.description or ''}"),
+        ))
+        if len(batch) >= 1000:
+            ProductSearchDocument.objects.bulk_create(batch)
+            batch = []
+    ProductSearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0008_alter_product_tenant_alter_productcategory_tenant_and_more'),
+        ('tenants', '0002_canonicalize_custom_domains'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='menu.product')),
+                ('document', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tenants.tenant')),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0009_product_search_document'),
+        ('sites', '0017_usersubdomain'),
+        ('tenants', '0002_canonicalize_custom_domains'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['tenant', 'order', 'id'], name='menu_produc_tenant__139fe6_idx'),
+        ),
+    ]
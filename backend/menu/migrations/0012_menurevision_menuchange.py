@@ -0,0 +1,39 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0011_product_image_variants'),
+        ('tenants', '0002_canonicalize_custom_domains'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuRevision',
+            fields=[
+                ('tenant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='tenants.tenant')),
+                ('revision', models.BigIntegerField(default=0)),
+                ('floor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MenuChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('category', 'Category')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('revision', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tenants.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', 'revision'], name='menu_menuch_tenant__ca5b4c_idx'), models.Index(fields=['deleted', 'changed_at'], name='menu_menuch_deleted_12c31c_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tenant', 'kind', 'object_id'), name='menu_change_object_uniq')],
+            },
+        ),
+    ]
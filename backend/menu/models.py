@@ -41,6 +41,8 @@ class ProductCategory(TenantOwnedModel):
         unique_together = ('site', 'slug')
 
 class Product(TenantOwnedModel):
+    IMAGE_FIELDS = ('image',)
+
     site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='products')
     category = models.ForeignKey(ProductCategory, on_delete=models.CASCADE, related_name='products')
     title = models.CharField(max_length=255)
@@ -50,6 +52,7 @@ class Product(TenantOwnedModel):
     discount_percentage = models.PositiveIntegerField(default=0)
     badge = models.CharField(max_length=50, null=True, blank=True, help_text="e.g. New, Special")
     image = models.ImageField(upload_to='product_images/', null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     tags = models.ManyToManyField(ProductTag, blank=True, related_name='products')
     order = models.PositiveIntegerField(default=0)
     is_available = models.BooleanField(default=True)
@@ -67,3 +70,62 @@ class Product(TenantOwnedModel):
     class Meta:
         ordering = ['order']
         unique_together = ('site', 'slug')
+        indexes = [
+            models.Index(fields=['tenant', 'order', 'id']),
+        ]
+
+
+class ProductSearchDocument(models.Model):
+    """
+    Normalized search text for a product. Indexed with MySQL FULLTEXT,
+    or mirrored into an FTS5 table on SQLite (see menu.search).
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='+')
+    document = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search document for product {self.product_id}"
+
+
+class MenuRevision(models.Model):
+    """
+    Per-tenant menu revision counter. `floor` is the highest revision whose
+    tombstones may have been compacted away; clients behind it need a full resync.
+    """
+    tenant = models.OneToOneField(Tenant, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    revision = models.BigIntegerField(default=0)
+    floor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Menu revision {self.revision} for tenant {self.tenant_id}"
+
+
+class MenuChange(models.Model):
+    """
+    Latest change per menu object: one row per (tenant, kind, object), moved to
+    the revision of its last write. Deletes stay as tombstones until compacted.
+    """
+    class Kind(models.TextChoices):
+        PRODUCT = "product", "Product"
+        CATEGORY = "category", "Category"
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    revision = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'kind', 'object_id'], name='menu_change_object_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['tenant', 'revision']),
+            models.Index(fields=['deleted', 'changed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} @ {self.revision}"
@@ -0,0 +1,119 @@
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, When
+from rest_framework import filters
+
+from .models import ProductSearchDocument
+
+
+SEARCH_TABLE = ProductSearchDocument._meta.db_table
+FTS_TABLE = 'menu_product_fts'
+MAX_RESULTS = 500
+
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی',  # Arabic yeh -> Persian yeh
+    'ى': 'ی',  # Alef maksura -> Persian yeh
+    'ك': 'ک',  # Arabic kaf -> Persian keheh
+    'ة': 'ه',  # Teh marbuta -> heh
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    '\u200c': ' ',  # ZWNJ splits compound words into separate tokens
+    '\u0640': None,  # Tatweel
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # Persian digits
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic-Indic digits
+})
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670]')
+_TOKEN = re.compile(r'\w+')
+
+
+def normalize(text) -> str:
+    """
+    Canonical search form applied at index and query time.
+    """
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', text.translate(_CHAR_MAP)).lower()
+    return ' '.join(_TOKEN.findall(text))
+
+
+def tokenize(text):
+    return normalize(text).split()
+
+
+def build_document(product) -> str:
+    return normalize(f"{product.title or ''} {product.description or ''}")
+
+
+def index_product(product):
+    ProductSearchDocument.objects.update_or_create(
+        product_id=product.pk,
+        defaults={'tenant_id': product.tenant_id, 'document': build_document(product)},
+    )
+
+
+def _mysql_query(tenant_id, tokens, limit):
+    # Boolean mode: every token required, prefix-matched.
+    sql = (
+        f"SELECT product_id FROM {SEARCH_TABLE} "
+        f"WHERE tenant_id = %s AND MATCH(document) AGAINST (%s IN BOOLEAN MODE) "
+        f"ORDER BY MATCH(document) AGAINST (%s IN BOOLEAN MODE) DESC LIMIT %s"
+    )
+    expression = ' '.join(f'+{token}*' for token in tokens)
+    return sql, [tenant_id, expression, expression, limit]
+
+
+def _sqlite_query(tenant_id, tokens, limit):
+    sql = (
+        f"SELECT d.product_id FROM {FTS_TABLE} f JOIN {SEARCH_TABLE} d ON d.product_id = f.rowid "
+        f"WHERE d.tenant_id = %s AND {FTS_TABLE} MATCH %s "
+        f"ORDER BY bm25({FTS_TABLE}) LIMIT %s"
+    )
+    expression = ' '.join(f'"{token}"*' for token in tokens)
+    return sql, [tenant_id, expression, limit]
+
+
+def search_product_ids(tenant_id, term, limit=MAX_RESULTS):
+    """
+    Ranked product ids for a tenant, best match first.
+    """
+    tokens = tokenize(term)
+    if not tokens:
+        return []
+
+    if connection.vendor == 'mysql':
+        sql, params = _mysql_query(tenant_id, tokens, limit)
+    elif connection.vendor == 'sqlite':
+        sql, params = _sqlite_query(tenant_id, tokens, limit)
+    else:
+        documents = ProductSearchDocument.objects.filter(tenant_id=tenant_id)
+        for token in tokens:
+            documents = documents.filter(document__contains=token)
+        return list(documents.values_list('product_id', flat=True)[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search over the tenant's products using the `search` query param.
+    Keeps relevance order unless the client asks for an explicit `ordering`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '')
+        if not tokenize(term):
+            return queryset
+
+        ids = search_product_ids(view.get_tenant().id, term)
+        queryset = queryset.filter(id__in=ids)
+        if request.query_params.get('ordering'):
+            return queryset
+        return queryset.order_by(rank_ordering(ids))
+
+
+def rank_ordering(ids):
+    return Case(*(When(id=pk, then=position) for position, pk in enumerate(ids)), output_field=IntegerField())
@@ -1,8 +1,13 @@
 from rest_framework import serializers
 
+from core.images import field_variant_urls
+
 from .models import Product, ProductCategory, ProductTag
 
 
+MAX_REORDER_IDS = 2000
+
+
 class ProductTagSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductTag
@@ -17,6 +22,7 @@ class ProductCategorySerializer(serializers.ModelSerializer):
 
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
+    image_variants = serializers.SerializerMethodField()
     tags = ProductTagSerializer(many=True, read_only=True)
     tag_ids = serializers.PrimaryKeyRelatedField(
         many=True,
@@ -39,6 +45,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'discount_percentage',
             'badge',
             'image',
+            'image_variants',
             'tags',
             'tag_ids',
             'order',
@@ -47,6 +54,9 @@ class ProductSerializer(serializers.ModelSerializer):
             'created_at',
         ]
 
+    def get_image_variants(self, obj):
+        return field_variant_urls(obj, 'image', self.context.get('request'))
+
     def validate_tag_ids(self, value):
         request = self.context['request']
         tenant = getattr(request, 'tenant', None)
@@ -59,3 +69,12 @@ class ProductSerializer(serializers.ModelSerializer):
             if tag.tenant_id != tenant.id:
                 raise serializers.ValidationError(f'Tag {tag.id} does not belong to this tenant.')
         return value
+
+
+class ReorderIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_REORDER_IDS)
+
+    def validate_ids(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Ids must be unique.')
+        return value
@@ -0,0 +1,382 @@
+import csv
+import hashlib
+import io
+import json
+import uuid
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils.text import slugify
+from rest_framework import serializers
+
+from tenants.generation import bump_tenant_generation
+
+from .changes import log_menu_changes
+from .models import MenuChange, Product, ProductCategory, ProductSearchDocument, ProductTag
+from .search import normalize
+from .tasks import schedule_snapshot_rebuild
+
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+
+EXPORT_FIELDS = [
+    'title', 'slug', 'category', 'description', 'price', 'discount_percentage',
+    'badge', 'tags', 'order', 'is_available', 'is_popular',
+]
+
+
+def invalidate_menu_caches(tenant, kind=None, ids=()):
+    """
+    For writes that bypass model signals (bulk_create, queryset.update).
+    Pass the changed objects so delta clients pick them up.
+    """
+    bump_tenant_generation(tenant)
+    if kind and ids:
+        log_menu_changes(tenant.id, kind, ids)
+    else:
+        tenant_id = tenant.id
+        transaction.on_commit(lambda: schedule_snapshot_rebuild(tenant_id))
+
+
+@transaction.atomic
+def reorder(model, tenant, ids):
+    """
+    Sets `order` to each id's position in one UPDATE.
+    Returns the ids that do not belong to the tenant (nothing is written then).
+    """
+    owned = set(model.unscoped.filter(tenant=tenant, id__in=ids).values_list('id', flat=True))
+    foreign = [pk for pk in ids if pk not in owned]
+    if foreign:
+        return foreign
+
+    positions = Case(*(When(id=pk, then=Value(position)) for position, pk in enumerate(ids)), output_field=IntegerField())
+    model.unscoped.filter(tenant=tenant, id__in=ids).update(order=positions)
+    kind = MenuChange.Kind.PRODUCT if model is Product else MenuChange.Kind.CATEGORY
+    invalidate_menu_caches(tenant, kind, ids)
+    return []
+
+
+class ProductImportError(Exception):
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    category = serializers.CharField(max_length=255)
+    price = serializers.IntegerField(min_value=0)
+    slug = serializers.SlugField(max_length=255, allow_unicode=True, required=False, allow_null=True)
+    description = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    discount_percentage = serializers.IntegerField(min_value=0, max_value=100, default=0)
+    badge = serializers.CharField(max_length=50, required=False, allow_null=True, allow_blank=True)
+    tags = serializers.ListField(child=serializers.CharField(max_length=50), required=False)
+    order = serializers.IntegerField(min_value=0, default=0)
+    is_available = serializers.BooleanField(default=True)
+    is_popular = serializers.BooleanField(default=False)
+
+
+def _iter_csv(stream):
+    for row in csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')):
+        # Empty cells mean "not provided"; tags are pipe separated.
+        row = {key: value for key, value in row.items() if key and value not in ('', None)}
+        if 'tags' in row:
+            row['tags'] = [tag.strip() for tag in row['tags'].split('|') if tag.strip()]
+        yield row
+
+
+def _iter_jsonl(stream):
+    for line in io.TextIOWrapper(stream, encoding='utf-8-sig'):
+        if line.strip():
+            yield json.loads(line)
+
+
+def _iter_json_array(stream, chunk_size=64 * 1024):
+    """
+    Yields the objects of a top-level JSON array without loading the whole document.
+    """
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise ValueError('Expected a JSON array of products.')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if started and buffer.startswith(']'):
+            return
+        if buffer and started:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                buffer = buffer[end:]
+                continue
+        if eof:
+            if started:
+                raise ValueError('Unterminated JSON array.')
+            return
+        chunk = reader.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+
+PARSERS = {
+    'csv': _iter_csv,
+    'jsonl': _iter_jsonl,
+    'json': _iter_json_array,
+}
+
+
+def detect_format(filename, default='csv'):
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension == 'ndjson':
+        return 'jsonl'
+    return extension if extension in PARSERS else default
+
+
+def _category_slug(name):
+    # Imported categories are keyed by slug, the only unique column they have.
+    return slugify(name, allow_unicode=True)[:255] or hashlib.md5(name.encode()).hexdigest()
+
+
+class ProductImportService:
+    """
+    Streams products from CSV/JSON/JSONL into a tenant's menu.
+    Rows are validated and written per batch; categories and tags are resolved
+    by name with a few queries per batch. Rows with an existing slug are updated.
+    Any invalid row rolls the whole import back.
+    """
+
+    def __init__(self, tenant, site, batch_size=IMPORT_BATCH_SIZE):
+        self.tenant = tenant
+        self.site = site
+        self.batch_size = batch_size
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self._categories = {}
+        self._tags = {}
+        self._seen_slugs = set()
+        self._changed_products = set()
+        self._new_categories = set()
+
+    def run(self, stream, fmt):
+        rows = PARSERS[fmt](stream)
+        with transaction.atomic():
+            batch = []
+            for number, row in enumerate(rows, start=1):
+                batch.append((number, row))
+                if len(batch) >= self.batch_size:
+                    self._process(batch)
+                    batch = []
+            if batch:
+                self._process(batch)
+            if self.errors:
+                raise ProductImportError(self.errors[:MAX_REPORTED_ERRORS])
+
+            # bulk_create skips model signals; invalidate once for the whole import.
+            invalidate_menu_caches(self.tenant, MenuChange.Kind.PRODUCT, self._changed_products)
+            if self._new_categories:
+                log_menu_changes(self.tenant.id, MenuChange.Kind.CATEGORY, self._new_categories)
+        return {'created': self.created, 'updated': self.updated}
+
+    def _validate(self, batch):
+        serializer = ProductImportRowSerializer(data=[row for _, row in batch], many=True)
+        if not serializer.is_valid():
+            errors = serializer.errors
+            # Newer DRF reports only failing items, keyed by index.
+            items = errors.items() if isinstance(errors, dict) else enumerate(errors)
+            for index, error in items:
+                if error:
+                    self.errors.append({'row': batch[index][0], 'errors': error})
+            return []
+
+        valid = []
+        for (number, _), row in zip(batch, serializer.validated_data):
+            slug = row.get('slug')
+            if slug:
+                if slug in self._seen_slugs:
+                    self.errors.append({'row': number, 'errors': {'slug': ['Duplicate slug in import.']}})
+                    continue
+                self._seen_slugs.add(slug)
+            valid.append(row)
+        return valid
+
+    def _resolve(self, model, cache, names):
+        missing = {name for name in names if name not in cache}
+        if not missing:
+            return
+        for obj in model.objects.filter(tenant=self.tenant, name__in=missing):
+            cache[obj.name] = obj
+        missing = [name for name in missing if name not in cache]
+        if not missing:
+            return
+
+        # Insert-or-ignore on the (site, key) unique index, then read the rows back
+        # by key: a name created concurrently by another import is reused, not duplicated.
+        key_field = 'slug' if model is ProductCategory else 'name'
+        keys = {name: _category_slug(name) if model is ProductCategory else name for name in missing}
+        model.objects.bulk_create([
+            model(tenant=self.tenant, site=self.site, name=name, **({'slug': keys[name]} if model is ProductCategory else {}))
+            for name in missing
+        ], ignore_conflicts=True)
+        rows = {
+            getattr(obj, key_field): obj
+            for obj in model.unscoped.filter(site=self.site, **{f'{key_field}__in': keys.values()})
+        }
+        for name, key in keys.items():
+            cache[name] = rows[key]
+            if model is ProductCategory:
+                self._new_categories.add(rows[key].id)
+
+    def _create_products(self, products):
+        """
+        bulk_create that always leaves primary keys set. MySQL cannot return ids
+        from a bulk insert, so they are re-selected by the unique (site, slug);
+        rows without a slug carry a temporary one until then.
+        """
+        if not products or connection.features.can_return_rows_from_bulk_insert:
+            return Product.objects.bulk_create(products)
+
+        token = uuid.uuid4().hex
+        unslugged = [product for product in products if not product.slug]
+        for number, product in enumerate(unslugged):
+            product.slug = f'import-{token}-{number}'
+        Product.objects.bulk_create(products)
+        ids = dict(
+            Product.unscoped.filter(site=self.site, slug__in=[product.slug for product in products])
+            .values_list('slug', 'id')
+        )
+        for product in products:
+            product.pk = ids[product.slug]
+            product._state.adding = False
+        for product in unslugged:
+            product.slug = None
+        if unslugged:
+            Product.unscoped.filter(id__in=[product.pk for product in unslugged]).update(slug=None)
+        return products
+
+    def _process(self, batch):
+        rows = self._validate(batch)
+        if self.errors or not rows:
+            return
+
+        self._resolve(ProductCategory, self._categories, {row['category'] for row in rows})
+        self._resolve(ProductTag, self._tags, {tag for row in rows for tag in row.get('tags', [])})
+
+        slugs = [row['slug'] for row in rows if row.get('slug')]
+        existing = {
+            product.slug: product
+            for product in Product.objects.filter(site=self.site, slug__in=slugs)
+        } if slugs else {}
+
+        to_create, to_update, tag_rows = [], [], []
+        for row in rows:
+            tags = row.pop('tags', None)
+            row['category'] = self._categories[row['category']]
+            product = existing.get(row.get('slug'))
+            if product is None:
+                product = Product(tenant=self.tenant, site=self.site, **row)
+                to_create.append(product)
+            else:
+                for field, value in row.items():
+                    setattr(product, field, value)
+                to_update.append(product)
+            tag_rows.append((product, tags))
+
+        self._create_products(to_create)
+        if to_update:
+            Product.objects.bulk_update(to_update, [field for field in EXPORT_FIELDS if field != 'tags'])
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        self._changed_products.update(product.id for product in to_create + to_update)
+
+        updated_ids = {product.id for product in to_update}
+        self._write_tags(tag_rows, updated_ids)
+        self._write_search_documents(to_create + to_update, updated_ids)
+
+    def _write_tags(self, tag_rows, updated_ids):
+        through = Product.tags.through
+        replaced = [product.id for product, tags in tag_rows if tags is not None and product.id in updated_ids]
+        if replaced:
+            through.objects.filter(product_id__in=replaced).delete()
+        through.objects.bulk_create([
+            through(product_id=product.id, producttag_id=self._tags[name].id)
+            for product, tags in tag_rows
+            for name in set(tags or [])
+        ], ignore_conflicts=True)
+
+    def _write_search_documents(self, products, updated_ids):
+        if updated_ids:
+            ProductSearchDocument.objects.filter(product_id__in=updated_ids).delete()
+        ProductSearchDocument.objects.bulk_create([
+            ProductSearchDocument(
+                product_id=product.id,
+                tenant_id=self.tenant.id,
+                document=normalize(f"{product.title or ''} {product.description or ''}"),
+            )
+            for product in products
+        ])
+
+
+class ProductExportService:
+    """
+    Streams a tenant's products as CSV or JSONL in id order, one batch in memory at a time.
+    """
+
+    def __init__(self, tenant, batch_size=EXPORT_BATCH_SIZE):
+        self.tenant = tenant
+        self.batch_size = batch_size
+
+    def rows(self):
+        products = Product.objects.filter(tenant=self.tenant).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(
+                products.filter(id__gt=last_id).values(
+                    'id', 'title', 'slug', 'category__name', 'description', 'price',
+                    'discount_percentage', 'badge', 'order', 'is_available', 'is_popular',
+                )[:self.batch_size]
+            )
+            if not batch:
+                return
+            tags = {}
+            links = Product.tags.through.objects.filter(
+                product_id__in=[row['id'] for row in batch]
+            ).values_list('product_id', 'producttag__name')
+            for product_id, name in links:
+                tags.setdefault(product_id, []).append(name)
+
+            for row in batch:
+                row['category'] = row.pop('category__name')
+                row['tags'] = sorted(tags.get(row['id'], []))
+                yield {field: row[field] for field in EXPORT_FIELDS}
+            last_id = batch[-1]['id']
+
+    def stream(self, fmt):
+        if fmt == 'jsonl':
+            for row in self.rows():
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+            return
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in self.rows():
+            row['tags'] = '|'.join(row['tags'])
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.images import stale_image_fields
+
+from .changes import deletes_tenant, log_menu_changes
+from .models import MenuChange, Product, ProductCategory, ProductTag
+from .search import index_product
+from .tasks import schedule_product_image_variants
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_log_change(sender, instance, raw=False, **kwargs):
+    if raw or deletes_tenant(kwargs.get('origin')):
+        return
+    deleted = kwargs.get('signal') is post_delete
+    log_menu_changes(instance.tenant_id, MenuChange.Kind.PRODUCT, [instance.pk], deleted=deleted)
+
+
+@receiver(post_save, sender=ProductCategory)
+def category_log_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    log_menu_changes(instance.tenant_id, MenuChange.Kind.CATEGORY, [instance.pk])
+    # Products embed the category name.
+    log_menu_changes(instance.tenant_id, MenuChange.Kind.PRODUCT, instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=ProductCategory)
+def category_log_delete(sender, instance, origin=None, **kwargs):
+    if deletes_tenant(origin):
+        return
+    log_menu_changes(instance.tenant_id, MenuChange.Kind.CATEGORY, [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=ProductTag)
+@receiver(pre_delete, sender=ProductTag)
+def tag_log_change(sender, instance, raw=False, **kwargs):
+    # Tags are embedded in products; a tag change is a change of its products.
+    if raw or deletes_tenant(kwargs.get('origin')):
+        return
+    log_menu_changes(instance.tenant_id, MenuChange.Kind.PRODUCT, instance.products.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_log_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            log_menu_changes(instance.tenant_id, MenuChange.Kind.PRODUCT, [instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        log_menu_changes(instance.tenant_id, MenuChange.Kind.PRODUCT, pk_set)
+    elif action == 'pre_clear':
+        log_menu_changes(instance.tenant_id, MenuChange.Kind.PRODUCT, instance.products.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Product)
+def product_update_search_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    index_product(instance)
+
+
+@receiver(post_save, sender=Product)
+def product_generate_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not stale_image_fields(instance, Product.IMAGE_FIELDS):
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: schedule_product_image_variants(product_id))
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import time
+from functools import cache as memoize
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from core.images import variant_urls
+
+from sites.models import SitePlugin
+from tenants.generation import get_with_generation
+
+from .models import MenuRevision, Product, ProductCategory
+from .serializers import ProductCategorySerializer, ProductSerializer, ProductTagSerializer
+
+
+# Bump whenever the payload shape changes so stale snapshots are rebuilt.
+SNAPSHOT_VERSION = 3
+
+# Media URLs are stored relative to this token and made absolute per request host.
+ORIGIN_TOKEN = '__MENU_ORIGIN__'
+
+CATEGORY_FIELDS = tuple(ProductCategorySerializer.Meta.fields)
+TAG_FIELDS = tuple(ProductTagSerializer.Meta.fields)
+
+# ProductSerializer fields that are not a plain column read; product_rows fills these in.
+COMPUTED_PRODUCT_FIELDS = ('image', 'image_variants', 'tags')
+
+
+@memoize
+def product_columns():
+    """
+    (name, values() lookup, field) for every readable ProductSerializer field, in
+    the serializer's order. The lookup is None for COMPUTED_PRODUCT_FIELDS.
+    """
+    columns = []
+    for name, field in ProductSerializer().fields.items():
+        if field.write_only:
+            continue
+        if name in COMPUTED_PRODUCT_FIELDS:
+            columns.append((name, None, field))
+            continue
+        if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)) or field.source == '*':
+            raise ImproperlyConfigured(
+                f"ProductSerializer.{name} is not a column; add it to COMPUTED_PRODUCT_FIELDS and product_rows."
+            )
+        columns.append((name, field.source.replace('.', '__'), field))
+    return columns
+
+
+def _render(field, value):
+    if value is None:
+        return None
+    # values() already yields the primary key of a relation.
+    if isinstance(field, serializers.RelatedField):
+        return value
+    return field.to_representation(value)
+
+
+def snapshot_key(tenant_id) -> str:
+    return f'menu:snapshot:{tenant_id}'
+
+
+def _lock_key(tenant_id) -> str:
+    return f'menu:snapshot-lock:{tenant_id}'
+
+
+def _image_url(name):
+    if not name:
+        return None
+    return ORIGIN_TOKEN + default_storage.url(name)
+
+
+def _product_tags(tenant_id, ids=None):
+    tags = {}
+    rows = Product.tags.through.objects.filter(product__tenant_id=tenant_id)
+    if ids is not None:
+        rows = rows.filter(product_id__in=ids)
+    lookups = [f'producttag__{name}' for name in TAG_FIELDS]
+    for row in rows.order_by('producttag_id').values('product_id', *lookups):
+        tags.setdefault(row['product_id'], []).append({name: row[f'producttag__{name}'] for name in TAG_FIELDS})
+    return tags
+
+
+def is_menu_active(tenant_id) -> bool:
+    return SitePlugin.objects.filter(site__tenant__id=tenant_id, plugin__key='menu', is_active=True).exists()
+
+
+def get_menu_revision(tenant_id):
+    """
+    Returns (revision, floor) of the tenant's change log.
+    """
+    row = MenuRevision.objects.filter(tenant_id=tenant_id).values_list('revision', 'floor').first()
+    return row or (0, 0)
+
+
+def category_rows(tenant_id, ids=None):
+    categories = ProductCategory.objects.filter(tenant_id=tenant_id, is_active=True)
+    if ids is not None:
+        categories = categories.filter(id__in=ids)
+    return list(categories.order_by('order').values(*CATEGORY_FIELDS))
+
+
+def product_rows(tenant_id, ids=None):
+    """
+    Products in ProductSerializer's shape, from two flat queries.
+    """
+    products = Product.objects.filter(tenant_id=tenant_id)
+    if ids is not None:
+        products = products.filter(id__in=ids)
+    tags = _product_tags(tenant_id, ids)
+    columns = product_columns()
+    lookups = {lookup for _, lookup, _ in columns if lookup} | {'id', 'image', 'image_variants'}
+    rows = []
+    for row in products.order_by('order').values(*lookups):
+        computed = {
+            'image': _image_url(row['image']),
+            'image_variants': variant_urls(
+                (row['image_variants'] or {}).get('image'), row['image'], lambda url: ORIGIN_TOKEN + url,
+            ) if row['image'] else None,
+            'tags': tags.get(row['id'], []),
+        }
+        rows.append({
+            name: computed[name] if lookup is None else _render(field, row[lookup])
+            for name, lookup, field in columns
+        })
+    return rows
+
+
+def build_menu_payload(tenant_id):
+    """
+    Full public menu. `revision` is read first, so the data is at least that new
+    and clients can continue with `?since=<revision>`.
+    """
+    revision, _ = get_menu_revision(tenant_id)
+    if not is_menu_active(tenant_id):
+        return {'revision': revision, 'full': True, 'categories': [], 'products': [], 'plugin_inactive': True}
+    return {
+        'revision': revision,
+        'full': True,
+        'categories': category_rows(tenant_id),
+        'products': product_rows(tenant_id),
+    }
+
+
+def build_snapshot(tenant_id, generation):
+    body = json.dumps(build_menu_payload(tenant_id), ensure_ascii=False, separators=(',', ':')).encode()
+    return {
+        'v': SNAPSHOT_VERSION,
+        'generation': generation,
+        'etag': '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest(),
+        'body': body,
+    }
+
+
+def is_current(snapshot, generation) -> bool:
+    return (
+        isinstance(snapshot, dict)
+        and snapshot.get('v') == SNAPSHOT_VERSION
+        and snapshot.get('generation') == generation
+    )
+
+
+def rebuild_snapshot(tenant_id):
+    """
+    Builds and stores the snapshot for the tenant's current generation.
+    """
+    generation, _ = get_with_generation(tenant_id, snapshot_key(tenant_id))
+    snapshot = build_snapshot(tenant_id, generation)
+    cache.set(snapshot_key(tenant_id), snapshot, timeout=None)
+    return snapshot
+
+
+def get_or_build_snapshot(tenant_id, wait=1.0):
+    """
+    Returns a current snapshot. Concurrent misses are coalesced behind a cache lock;
+    losers wait briefly for the winner instead of querying.
+    """
+    key = snapshot_key(tenant_id)
+    generation, snapshot = get_with_generation(tenant_id, key)
+    if is_current(snapshot, generation):
+        return snapshot
+
+    if cache.add(_lock_key(tenant_id), 1, timeout=10):
+        try:
+            return rebuild_snapshot(tenant_id)
+        finally:
+            cache.delete(_lock_key(tenant_id))
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        generation, snapshot = get_with_generation(tenant_id, key)
+        if is_current(snapshot, generation):
+            return snapshot
+    # Lock holder is slow or gone; serve a fresh build without storing it.
+    return build_snapshot(tenant_id, generation)
@@ -0,0 +1,71 @@
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+
+from core.images import refresh_variants
+from tenants.generation import bump_tenant_generation
+
+from .models import MenuChange, Product
+from .snapshot import rebuild_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def _queued_key(tenant_id):
+    return f'menu:snapshot-queued:{tenant_id}'
+
+
+def schedule_snapshot_rebuild(tenant_id):
+    """
+    Queues one rebuild per tenant; writes made while one is queued ride along.
+    """
+    if not tenant_id:
+        return
+    key = _queued_key(tenant_id)
+    try:
+        if cache.add(key, 1, timeout=60):
+            rebuild_menu_snapshot_task.delay(tenant_id)
+    except Exception:
+        # Do not fail writes if the cache or broker is unavailable; the next write retries.
+        logger.warning('Could not queue menu snapshot rebuild for tenant %s', tenant_id, exc_info=True)
+        try:
+            cache.delete(key)
+        except Exception:
+            pass
+
+
+def schedule_product_image_variants(product_id):
+    try:
+        generate_product_image_variants_task.delay(product_id)
+    except Exception:
+        # Variants are regenerated on the next save; the write itself must stand.
+        logger.warning('Could not queue image variants for product %s', product_id, exc_info=True)
+
+
+@shared_task
+def rebuild_menu_snapshot_task(tenant_id):
+    cache.delete(_queued_key(tenant_id))
+    snapshot = rebuild_snapshot(tenant_id)
+    return f"Menu snapshot for tenant {tenant_id} rebuilt ({snapshot['etag']})."
+
+
+@shared_task
+def generate_product_image_variants_task(product_id):
+    product = refresh_variants(Product, product_id, Product.IMAGE_FIELDS)
+    if product is None:
+        return f"Product {product_id}: variants up to date."
+    from .changes import log_menu_changes
+
+    # Variants are written with update(), so invalidate menu caches here.
+    bump_tenant_generation(product.tenant_id)
+    log_menu_changes(product.tenant_id, MenuChange.Kind.PRODUCT, [product.id])
+    return f"Product {product_id}: variants generated."
+
+
+@shared_task
+def compact_menu_changes_task():
+    from .changes import compact_changes
+
+    removed = compact_changes()
+    return f"Compacted {removed} menu change tombstones."
@@ -0,0 +1,428 @@
+import io
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from sites.models import Plugin, Site, SiteCategory, SitePlugin
+from tenants.middleware import TenantResolverMiddleware
+from tenants.resolver import _local_cache
+from tenants.services import ensure_tenant_for_site
+
+from .changes import compact_changes
+from .models import MenuChange, Product, ProductCategory, ProductTag
+from .search import normalize
+from .serializers import ProductSerializer
+from .views import PublicMenuDataView
+
+User = get_user_model()
+
+
+class PublicMenuSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.host = f'{self.tenant.subdomain}.vofino.ir'
+        SitePlugin.objects.create(site=self.site, plugin=Plugin.objects.create(key='menu', name='Menu'))
+        self.drinks = ProductCategory.objects.create(site=self.site, name='Drinks')
+        tag = ProductTag.objects.create(site=self.site, name='Hot')
+        for i in range(5):
+            product = Product.objects.create(site=self.site, category=self.drinks, title=f'Item {i}', price=100, order=i)
+            product.tags.add(tag)
+        self.middleware = TenantResolverMiddleware(PublicMenuDataView.as_view())
+
+    def get(self, **headers):
+        request = self.factory.get('/api/menu/public-data/', HTTP_HOST=self.host, **headers)
+        return async_to_sync(self.middleware)(request)
+
+    def test_snapshot_matches_serializer_shape(self):
+        data = json.loads(self.get().content)
+        self.assertEqual(len(data['products']), 5)
+        product = data['products'][0]
+        self.assertEqual(product['category_name'], 'Drinks')
+        self.assertEqual(product['tags'][0]['name'], 'Hot')
+        self.assertEqual(data['categories'][0]['name'], 'Drinks')
+
+    def test_snapshot_rows_have_the_serializer_keys(self):
+        product = Product.objects.filter(site=self.site).order_by('order').first()
+        expected = ProductSerializer(product, context={'request': self.factory.get('/')}).data
+        row = json.loads(self.get().content)['products'][0]
+        self.assertEqual(list(row), list(expected))
+        self.assertEqual({k: v for k, v in row.items() if k != 'tags'}, {k: v for k, v in expected.items() if k != 'tags'})
+        self.assertEqual(row['tags'], [dict(tag) for tag in expected['tags']])
+
+    def test_rebuild_query_count_does_not_grow_with_products(self):
+        # Tenant resolution (2) + revision, plugin check, categories, tags, products.
+        with self.assertNumQueries(7):
+            self.get()
+
+    def test_etag_revalidation(self):
+        response = self.get()
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(title='Item 0').first().delete()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(json.loads(response.content)['products']), 4)
+
+
+
+class MenuDeltaSyncTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.host = f'{self.tenant.subdomain}.vofino.ir'
+        SitePlugin.objects.create(site=self.site, plugin=Plugin.objects.create(key='menu', name='Menu'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drinks = ProductCategory.objects.create(site=self.site, name='Drinks')
+            self.products = [
+                Product.objects.create(site=self.site, category=self.drinks, title=f'Item {i}', price=100, order=i)
+                for i in range(5)
+            ]
+        self.middleware = TenantResolverMiddleware(PublicMenuDataView.as_view())
+
+    def get(self, **params):
+        request = self.factory.get('/api/menu/public-data/', params, HTTP_HOST=self.host)
+        return async_to_sync(self.middleware)(request)
+
+    def test_delta_contains_only_changes_since_revision(self):
+        full = json.loads(self.get().content)
+        self.assertTrue(full['full'])
+        revision = full['revision']
+
+        deleted_id = self.products[1].id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].price = 150
+            self.products[0].save()
+            self.products[1].delete()
+
+        delta = json.loads(self.get(since=revision).content)
+        self.assertFalse(delta['full'])
+        self.assertGreater(delta['revision'], revision)
+        self.assertEqual([p['price'] for p in delta['products']], [150])
+        self.assertEqual(delta['deleted'], {'categories': [], 'products': [deleted_id]})
+
+        self.assertEqual(json.loads(self.get(since=delta['revision']).content)['products'], [])
+        self.assertEqual(json.loads(self.get().content)['revision'], delta['revision'])
+
+    def test_bulk_reorder_is_logged(self):
+        revision = json.loads(self.get().content)['revision']
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ids = [p.id for p in reversed(self.products)]
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/menu/products/reorder/', {'ids': ids}, format='json', HTTP_HOST=self.host)
+
+        delta = json.loads(self.get(since=revision).content)
+        self.assertEqual(sorted(p['id'] for p in delta['products']), sorted(ids))
+
+    def test_compacted_log_forces_full_resync(self):
+        revision = json.loads(self.get().content)['revision']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[2].delete()
+        MenuChange.objects.filter(deleted=True).update(changed_at=timezone.now() - timedelta(days=60))
+        self.assertEqual(compact_changes(), 1)
+
+        response = json.loads(self.get(since=revision).content)
+        self.assertTrue(response['full'])
+        self.assertEqual(len(response['products']), 4)
+
+    def test_log_rolls_back_with_the_write(self):
+        revision = json.loads(self.get().content)['revision']
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.products[0].title = 'Renamed'
+            self.products[0].save()
+            raise RuntimeError
+        self.assertEqual(json.loads(self.get(since=revision).content)['products'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].title = 'Renamed'
+            self.products[0].save()
+        delta = json.loads(self.get(since=revision).content)
+        self.assertEqual([p['title'] for p in delta['products']], ['Renamed'])
+
+    def test_tenant_delete_logs_nothing(self):
+        tag = ProductTag.objects.create(site=self.site, name='Hot')
+        self.products[0].tags.add(tag)
+        changes = MenuChange.objects.count()
+        self.site.delete()
+        self.assertFalse(MenuChange.objects.filter(tenant_id=self.tenant.id).exists())
+        self.assertLess(MenuChange.objects.count(), changes)
+
+    def test_failed_rebuild_enqueue_does_not_fail_the_write(self):
+        with mock.patch('menu.tasks.rebuild_menu_snapshot_task.delay', side_effect=ConnectionError), \
+                self.assertLogs('menu.tasks', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            self.products[0].title = 'Renamed'
+            self.products[0].save()
+        self.assertIsNone(cache.get(f'menu:snapshot-queued:{self.tenant.id}'))
+        self.assertTrue(Product.objects.filter(title='Renamed').exists())
+
+    def test_invalid_revision(self):
+        self.assertEqual(self.get(since='abc').status_code, 400)
+        self.assertTrue(json.loads(self.get(since=10 ** 9).content)['full'])
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_cache.clear()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.user.refresh_from_db()
+        self.host = f'{self.tenant.subdomain}.vofino.ir'
+        SitePlugin.objects.create(site=self.site, plugin=Plugin.objects.create(key='menu', name='Menu'))
+        drinks = ProductCategory.objects.create(site=self.site, name='Drinks')
+        self.tea = Product.objects.create(site=self.site, category=drinks, title='چای کیک', price=100)
+        self.cake = Product.objects.create(site=self.site, category=drinks, title='کیک', description='کیک شکلاتی تازه', price=200)
+        self.coffee = Product.objects.create(site=self.site, category=drinks, title='قهوه', price=300)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, term):
+        response = self.client.get('/api/menu/products/', {'search': term}, HTTP_HOST=self.host)
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.json()['results']]
+
+    def test_arabic_characters_match_persian_text(self):
+        self.assertEqual(self.search('چاي'), [self.tea.id])
+        self.assertEqual(self.search('كيك'), [self.cake.id, self.tea.id])
+
+    def collect(self, params):
+        ids, next_url = [], None
+        response = self.client.get('/api/menu/products/', params, HTTP_HOST=self.host)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [product['id'] for product in response.json()['results']]
+            next_url = response.json()['next']
+            if not next_url:
+                return ids
+            response = self.client.get(next_url, HTTP_HOST=self.host)
+
+    def test_paged_search_keeps_relevance_order(self):
+        self.assertEqual(self.collect({'search': 'كيك', 'page_size': 1}), self.search('كيك'))
+        self.assertEqual(self.collect({'ordering': '-price', 'page_size': 1}), [self.coffee.id, self.cake.id, self.tea.id])
+
+        # A cursor cannot be replayed under a different ordering.
+        response = self.client.get('/api/menu/products/', {'ordering': '-price', 'page_size': 1}, HTTP_HOST=self.host)
+        cursor = response.json()['next'].split('cursor=')[1].split('&')[0]
+        response = self.client.get('/api/menu/products/', {'ordering': 'price', 'cursor': cursor}, HTTP_HOST=self.host)
+        self.assertEqual(response.status_code, 404)
+
+    def test_index_follows_product_changes(self):
+        self.tea.title = 'دمنوش'
+        self.tea.save()
+        self.assertEqual(self.search('چای'), [])
+        self.assertEqual(self.search('دمنوش'), [self.tea.id])
+
+        self.tea.delete()
+        self.assertEqual(self.search('دمنوش'), [])
+
+    def test_autocomplete_matches_prefixes(self):
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/menu/products/autocomplete/', {'q': 'قه'}, HTTP_HOST=self.host)
+        self.assertEqual([product['title'] for product in response.json()], ['قهوه'])
+
+
+class ProductBulkImportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_cache.clear()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.user.refresh_from_db()
+        self.host = f'{self.tenant.subdomain}.vofino.ir'
+        SitePlugin.objects.create(site=self.site, plugin=Plugin.objects.create(key='menu', name='Menu'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content):
+        return self.client.post(
+            '/api/menu/products/import/',
+            {'file': SimpleUploadedFile(name, content.encode())},
+            HTTP_HOST=self.host,
+        )
+
+    def test_csv_import_uses_constant_queries(self):
+        lines = ['title,category,price,slug,tags']
+        lines += [f'Item {i},Cat {i % 3},{i * 10},item-{i},hot|new' for i in range(1200)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload('menu.csv', '\n'.join(lines))
+        # A few statements per batch of 500 rows, not per row, plus the change log.
+        self.assertLess(len(queries), 80)
+        self.assertEqual(response.json(), {'created': 1200, 'updated': 0})
+        self.assertEqual(Product.objects.filter(tenant=self.tenant).count(), 1200)
+        self.assertEqual(ProductCategory.objects.filter(tenant=self.tenant).count(), 3)
+        self.assertEqual(Product.tags.through.objects.count(), 2400)
+
+        response = self.upload('menu.jsonl', json.dumps({'title': 'Renamed', 'category': 'Cat 0', 'price': 5, 'slug': 'item-0'}))
+        self.assertEqual(response.json(), {'created': 0, 'updated': 1})
+        self.assertEqual(Product.objects.get(slug='item-0').title, 'Renamed')
+
+    def test_invalid_row_rolls_back_import(self):
+        rows = [{'title': 'Tea', 'category': 'Drinks', 'price': 10}, {'title': 'Bad', 'category': 'Drinks', 'price': -1}]
+        response = self.upload('menu.json', json.dumps(rows))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['row'], 2)
+        self.assertFalse(Product.objects.filter(tenant=self.tenant).exists())
+
+    def test_export_round_trips_import(self):
+        rows = [{'title': 'چای', 'category': 'Drinks', 'price': 10, 'tags': ['hot']}]
+        self.upload('menu.json', json.dumps(rows, ensure_ascii=False))
+
+        response = self.client.get('/api/menu/products/export/', {'file_format': 'jsonl'}, HTTP_HOST=self.host)
+        exported = [json.loads(line) for line in io.StringIO(b''.join(response.streaming_content).decode())]
+        self.assertEqual(exported[0]['title'], 'چای')
+        self.assertEqual(exported[0]['tags'], ['hot'])
+
+        response = self.client.get('/api/menu/products/export/', HTTP_HOST=self.host)
+        self.assertIn('چای,,Drinks', b''.join(response.streaming_content).decode())
+
+    def test_ids_are_read_back_by_key_without_insert_returning(self):
+        # Another import already created one of the categories.
+        ProductCategory.objects.create(site=self.site, name='Drinks', slug='cold')
+        rows = [
+            {'title': f'Item {i}', 'category': ['Cold', 'Hot'][i % 2], 'price': i, 'tags': [f'tag-{i}']}
+            for i in range(6)
+        ]
+        rows.append({'title': 'Named', 'category': 'Hot', 'price': 1, 'slug': 'named', 'tags': ['tag-named']})
+        features = type(connection.features)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock, return_value=False):
+            response = self.upload('menu.json', json.dumps(rows))
+        self.assertEqual(response.json(), {'created': 7, 'updated': 0})
+
+        products = Product.objects.filter(tenant=self.tenant).prefetch_related('tags').select_related('category')
+        for product in products:
+            expected = 'tag-named' if product.slug == 'named' else f"tag-{product.price}"
+            self.assertEqual([tag.name for tag in product.tags.all()], [expected])
+            self.assertEqual(product.search_document.document, normalize(product.title))
+        self.assertEqual(products.filter(slug__isnull=True).count(), 6)
+        self.assertEqual({p.category.slug for p in products}, {'cold', 'hot'})
+        self.assertEqual(ProductCategory.objects.filter(tenant=self.tenant).count(), 2)
+
+
+class ReorderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_cache.clear()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.user.refresh_from_db()
+        self.host = f'{self.tenant.subdomain}.vofino.ir'
+        SitePlugin.objects.create(site=self.site, plugin=Plugin.objects.create(key='menu', name='Menu'))
+        drinks = ProductCategory.objects.create(site=self.site, name='Drinks')
+        self.products = [
+            Product.objects.create(site=self.site, category=drinks, title=f'Item {i}', price=10, order=i)
+            for i in range(50)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def reorder(self, ids):
+        return self.client.post('/api/menu/products/reorder/', {'ids': ids}, format='json', HTTP_HOST=self.host)
+
+    def test_reorder_uses_one_update(self):
+        ids = [product.id for product in reversed(self.products)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reorder(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "menu_product"') for query in queries), 1)
+        self.assertEqual(list(Product.objects.order_by('order').values_list('id', flat=True)), ids)
+
+    def test_foreign_ids_are_rejected(self):
+        other_user = User.objects.create_user(username='owner2', phone_number='09120000000', password='password')
+        other_site = Site.objects.create(owner=other_user, name='Other', slug='other', subdomain='other', category=self.category)
+        ensure_tenant_for_site(other_site)
+        foreign = Product.objects.create(
+            site=other_site, category=ProductCategory.objects.create(site=other_site, name='X'), title='X', price=1,
+        )
+
+        response = self.reorder([self.products[1].id, foreign.id])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.get(id=self.products[1].id).order, 1)
+
+        self.assertEqual(self.reorder([self.products[0].id, self.products[0].id]).status_code, 400)
+
+
+class ProductImageVariantsTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_VARIANT_WIDTHS=(160, 320))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        cache.clear()
+        _local_cache.clear()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.drinks = ProductCategory.objects.create(site=self.site, name='Drinks')
+
+    def photo(self, color='red'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 600), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_variants_are_generated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(site=self.site, category=self.drinks, title='Latte', price=10, image=self.photo())
+
+        product.refresh_from_db()
+        entry = product.image_variants['image']
+        self.assertEqual(entry['source'], product.image.name)
+        self.assertEqual([width for width, _ in entry['variants']['webp']], [160, 320])
+
+        urls = ProductSerializer(product).data['image_variants']
+        self.assertEqual(urls['height'], 600)
+        self.assertIn('160w', urls['srcset']['jpeg'])
+        with Image.open(f"{self.media_root}/{entry['variants']['webp'][0][1]}") as variant:
+            self.assertEqual(variant.size, (160, 96))
+
+    def test_failed_variant_enqueue_does_not_fail_the_write(self):
+        with mock.patch('menu.tasks.generate_product_image_variants_task.delay', side_effect=ConnectionError), \
+                self.assertLogs('menu.tasks', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(site=self.site, category=self.drinks, title='Latte', price=10, image=self.photo())
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+
+    def test_same_content_reuses_stored_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Product.objects.create(site=self.site, category=self.drinks, title='A', price=10, image=self.photo())
+            second = Product.objects.create(site=self.site, category=self.drinks, title='B', price=10, image=self.photo())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image_variants['image']['variants'], second.image_variants['image']['variants'])
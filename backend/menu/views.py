@@ -1,41 +1,68 @@
+import json
+
+from asgiref.sync import sync_to_async
 from django.db import transaction
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from rest_framework import exceptions, filters, generics, permissions, viewsets
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions, filters, permissions, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from core.http import json_response
+from tenants.generation import aget_with_generation
+from .changes import build_delta
 from .models import Product, ProductCategory, ProductTag
-from .serializers import ProductCategorySerializer, ProductSerializer, ProductTagSerializer
+from .services import PARSERS, ProductExportService, ProductImportError, ProductImportService, detect_format, reorder
+from .search import ProductSearchFilter, rank_ordering, search_product_ids
+from .snapshot import ORIGIN_TOKEN, get_or_build_snapshot, is_current, snapshot_key
+from .serializers import ProductCategorySerializer, ProductSerializer, ProductTagSerializer, ReorderIdsSerializer
+
 
+class PublicMenuDataView(View):
+    """
+    Public, read-only menu for the tenant resolved from the host.
+    Served from a prebuilt JSON snapshot: one cache round trip on a hit, 304 when unchanged.
 
-class PublicMenuDataView(generics.RetrieveAPIView):
-    permission_classes = [permissions.AllowAny]
+    `?since=<revision>` returns only what changed after that revision
+    (`full: false`), or the full snapshot (`full: true`) when the client must resync.
+    """
 
-    @method_decorator(cache_page(60 * 15))
-    def get(self, request, slug=None):
+    async def get(self, request, slug=None):
         tenant = getattr(request, 'tenant', None)
         if not tenant or not tenant.site_id:
-            return Response({'detail': 'Tenant not found'}, status=404)
-
-        site = tenant.site
-        if not site.is_plugin_active('menu'):
-            return Response(
-                {
-                    'categories': [],
-                    'products': [],
-                    'plugin_inactive': True,
-                }
+            return json_response({'detail': 'Tenant not found'}, status=404)
+
+        since = request.GET.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return json_response({'detail': 'since must be an integer revision.'}, status=400)
+            delta = await sync_to_async(build_delta)(tenant.id, since)
+            if delta is not None:
+                origin = request.build_absolute_uri('/')[:-1]
+                body = json.dumps(delta, ensure_ascii=False, separators=(',', ':')).replace(ORIGIN_TOKEN, origin)
+                response = HttpResponse(body, content_type='application/json')
+                response['Cache-Control'] = 'no-cache'
+                return response
+
+        generation, snapshot = await aget_with_generation(tenant, snapshot_key(tenant.id))
+        if not is_current(snapshot, generation):
+            snapshot = await sync_to_async(get_or_build_snapshot)(tenant.id)
+
+        etag = snapshot['etag']
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*':
+            response = HttpResponse(status=304)
+        else:
+            origin = request.build_absolute_uri('/')[:-1].encode()
+            response = HttpResponse(
+                snapshot['body'].replace(ORIGIN_TOKEN.encode(), origin),
+                content_type='application/json',
             )
-
-        categories = ProductCategory.objects.filter(tenant=tenant, is_active=True).order_by('order')
-        products = Product.objects.filter(tenant=tenant).order_by('order')
-
-        return Response(
-            {
-                'categories': ProductCategorySerializer(categories, many=True, context={'request': request}).data,
-                'products': ProductSerializer(products, many=True, context={'request': request}).data,
-            }
-        )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
 
 
 class SiteSpecificMixin:
@@ -71,34 +98,110 @@ class SiteSpecificMixin:
 
         return self.queryset.filter(tenant=tenant)
 
-    @transaction.atomic
-    def perform_create(self, serializer):
+    def get_menu_site(self):
+        """
+        (tenant, site) for writes, which are refused while the menu plugin is off.
+        """
         tenant = self.get_tenant()
         site = self.get_site(tenant)
-
         if not site.is_plugin_active('menu'):
             raise exceptions.PermissionDenied('Menu plugin is not active for this tenant.')
+        return tenant, site
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        tenant, site = self.get_menu_site()
         serializer.save(site=site, tenant=tenant)
 
 
+class ReorderMixin:
+    """
+    `POST <list>/reorder/` with `{"ids": [...]}` in display order.
+    Positions are written in one statement and caches invalidated once.
+    """
+
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        tenant, site = self.get_menu_site()
+
+        serializer = ReorderIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+
+        foreign = reorder(self.queryset.model, tenant, ids)
+        if foreign:
+            return Response(
+                {'ids': [f'Unknown ids for this tenant: {foreign[:20]}']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({'ids': ids})
+
+
 class ProductTagViewSet(SiteSpecificMixin, viewsets.ModelViewSet):
     queryset = ProductTag.objects.all()
     serializer_class = ProductTagSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('id',)
 
 
-class ProductCategoryViewSet(SiteSpecificMixin, viewsets.ModelViewSet):
+class ProductCategoryViewSet(ReorderMixin, SiteSpecificMixin, viewsets.ModelViewSet):
     queryset = ProductCategory.objects.all()
     serializer_class = ProductCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
     ordering_fields = ['order', 'name']
+    keyset_ordering = ('order', 'id')
 
 
-class ProductViewSet(SiteSpecificMixin, viewsets.ModelViewSet):
+class ProductViewSet(ReorderMixin, SiteSpecificMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().select_related('category').prefetch_related('tags')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'description']
+    filter_backends = [ProductSearchFilter, filters.OrderingFilter]
     ordering_fields = ['order', 'price', 'created_at']
+    keyset_ordering = ('order', 'id')
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    def autocomplete(self, request):
+        """
+        Prefix suggestions for storefront search: `?q=<partial term>`.
+        """
+        ids = search_product_ids(self.get_tenant().id, request.query_params.get('q', ''), limit=10)
+        products = self.get_queryset().filter(id__in=ids).order_by(rank_ordering(ids)).values('id', 'title', 'slug')
+        return Response(list(products))
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_products(self, request):
+        """
+        Bulk upsert from an uploaded CSV, JSON array or JSONL `file`.
+        Rows with a slug that already exists update that product.
+        """
+        tenant, site = self.get_menu_site()
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'file is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('file_format') or detect_format(upload.name)
+        if fmt not in PARSERS:
+            return Response({'detail': f'Unsupported format: {fmt}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Read the underlying binary file so large uploads are parsed as a stream.
+        stream = getattr(upload.file, 'file', upload.file)
+        try:
+            result = ProductImportService(tenant, site).run(stream, fmt)
+        except ProductImportError as exc:
+            return Response({'errors': exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams every product of the tenant as CSV (default) or JSONL (`?file_format=jsonl`).
+        """
+        tenant = self.get_tenant()
+        fmt = 'jsonl' if request.query_params.get('file_format') == 'jsonl' else 'csv'
+        content_type = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+        response = StreamingHttpResponse(ProductExportService(tenant).stream(fmt), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_rename_orders_cart_tenant_user_idx_orders_cart_tenant__4e13fb_idx_and_more'),
+        ('sites', '0017_usersubdomain'),
+        ('tenants', '0002_canonicalize_custom_domains'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['tenant', 'created_at', 'id'], name='orders_orde_tenant__cb1951_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['tenant', 'created_at', 'id'], name='orders_paym_tenant__673d55_idx'),
+        ),
+    ]
@@ -7,6 +7,8 @@ from tenants.models import TenantOwnedModel
 
 
 class Cart(TenantOwnedModel):
+    bumps_tenant_generation = False
+
     site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='carts')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='carts')
     session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
@@ -26,6 +28,8 @@ class Cart(TenantOwnedModel):
 
 
 class CartItem(TenantOwnedModel):
+    bumps_tenant_generation = False
+
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
@@ -47,6 +51,8 @@ class CartItem(TenantOwnedModel):
 
 
 class Order(TenantOwnedModel):
+    bumps_tenant_generation = False
+
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('paid', 'Paid'),
@@ -73,6 +79,7 @@ class Order(TenantOwnedModel):
             models.Index(fields=['site', 'status']),
             models.Index(fields=['tenant', 'status']),
             models.Index(fields=['user', 'status']),
+            models.Index(fields=['tenant', 'created_at', 'id']),
         ]
 
     def __str__(self):
@@ -84,6 +91,8 @@ class Order(TenantOwnedModel):
 
 
 class OrderItem(TenantOwnedModel):
+    bumps_tenant_generation = False
+
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
     quantity = models.PositiveIntegerField()
@@ -105,6 +114,8 @@ class OrderItem(TenantOwnedModel):
 
 
 class Payment(TenantOwnedModel):
+    bumps_tenant_generation = False
+
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('completed', 'Completed'),
@@ -124,5 +135,10 @@ class Payment(TenantOwnedModel):
             self.tenant_id = self.order.tenant_id
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return f'Payment for Order {self.order.id} - {self.status}'
\ No newline at end of file
@@ -1,3 +1,5 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from rest_framework.test import APIClient
@@ -5,7 +7,8 @@ from rest_framework.test import APIClient
 from menu.models import Product, ProductCategory
 from sites.models import Site, SiteCategory
 from tenants.services import ensure_tenant_for_site
-from .models import Order
+from .models import Order, Payment
+from .views import OrderViewSet
 
 User = get_user_model()
 
@@ -76,3 +79,52 @@ class OrderWorkflowTest(TestCase):
 
         response = self.client.get('/api/orders/cart/', HTTP_HOST=self.host)
         self.assertEqual(len(response.data['items']), 0)
+
+
+class OrderPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.user.refresh_from_db()
+        self.host = f'{self.tenant.subdomain}.vofino.ir'
+        self.client.force_authenticate(self.user)
+
+        for i in range(7):
+            order = Order.objects.create(
+                tenant=self.tenant, site=self.site, first_name='A', last_name='B',
+                phone_number='0912', address='X', total_amount=100,
+            )
+            Payment.objects.create(
+                tenant=self.tenant, order=order, provider='zarinpal', amount=100,
+                status='completed' if i % 2 else 'pending',
+            )
+
+    def collect(self, url, key):
+        ids, next_url = [], url
+        while next_url:
+            response = self.client.get(next_url, HTTP_HOST=self.host)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data[key]]
+            next_url = response.data['next']
+        return ids
+
+    def test_orders_are_paged_by_keyset(self):
+        ids = self.collect('/api/orders/?page_size=3', 'results')
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_list_is_paged_by_default(self):
+        with mock.patch.object(OrderViewSet, 'max_page_size', 2):
+            response = self.client.get('/api/orders/?page_size=1000', HTTP_HOST=self.host)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIn('page_size=2', response.data['next'])
+        self.assertEqual(len(self.collect('/api/orders/', 'results')), 7)
+
+    def test_payment_list_pages_and_sums_in_database(self):
+        ids = self.collect('/api/orders/payment-list/?page_size=2', 'payments')
+        self.assertEqual(len(ids), 7)
+        response = self.client.get('/api/orders/payment-list/?page_size=2', HTTP_HOST=self.host)
+        self.assertEqual(response.data['total_sum'], 300)
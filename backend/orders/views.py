@@ -1,4 +1,5 @@
 from django.db import transaction
+from django.db.models import Sum
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.decorators import action
@@ -31,19 +32,25 @@ class TenantSiteMixin:
 class PaymentListView(TenantSiteMixin, generics.ListAPIView):
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         tenant, site = self.get_tenant_and_site()
         if not tenant or not site:
             return Payment.objects.none()
 
-        return Payment.objects.filter(tenant=tenant, order__site=site).select_related('order').order_by('-created_at')
+        return Payment.objects.filter(tenant=tenant, order__site=site).select_related('order').order_by('-created_at', '-id')
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        total_sum = sum(p.amount for p in queryset if p.status == 'completed')
-        return Response({'payments': serializer.data, 'total_sum': total_sum})
+        total_sum = queryset.filter(status='completed').aggregate(total=Sum('amount'))['total'] or 0
+
+        page = self.paginate_queryset(queryset)
+        return Response({
+            'payments': self.get_serializer(page, many=True).data,
+            'total_sum': total_sum,
+            'next': self.paginator.get_next_link(),
+        })
 
 
 class CartViewSet(TenantSiteMixin, viewsets.ModelViewSet):
@@ -134,6 +141,8 @@ class CartViewSet(TenantSiteMixin, viewsets.ModelViewSet):
 
 class OrderViewSet(TenantSiteMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
+    keyset_ordering = ('-created_at', '-id')
+    max_page_size = 100
 
     def get_permissions(self):
         if self.action in {'create', 'verify_payment'}:
@@ -18,9 +18,9 @@ class DashboardBuilder:
         sections = template.get_dashboard_layout(user)
         dashboard_config = []
 
-        active_plugin_slugs = SitePlugin.objects.filter(
+        active_plugin_slugs = set(SitePlugin.objects.filter(
             site=site, is_active=True
-        ).values_list('plugin_slug', flat=True)
+        ).values_list('plugin_slug', flat=True))
 
         for section in sections:
             plugin_slug = section.get('plugin')
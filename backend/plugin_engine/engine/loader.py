@@ -0,0 +1,64 @@
+import importlib.util
+import os
+import threading
+
+from django.conf import settings
+
+
+def hot_reload_enabled():
+    # Re-checking file mtimes costs a stat per lookup; only worth it while developing.
+    return settings.DEBUG and getattr(settings, 'PLUGIN_ENGINE_HOT_RELOAD', True)
+
+
+class ClassLoader:
+    """
+    Executes a plugin/template file once and keeps the first `base_class`
+    subclass it defines, per slug. Thread-safe: concurrent first lookups load
+    the file once. With hot reload (DEBUG only) a changed mtime reloads it.
+    """
+
+    def __init__(self, base_class, module_prefix):
+        self.base_class = base_class
+        self.module_prefix = module_prefix
+        self._classes = {}
+        self._lock = threading.Lock()
+
+    def _mtime(self, py_path):
+        try:
+            return os.stat(py_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _is_current(self, entry, py_path, hot_reload):
+        if entry is None or entry[1] != py_path:
+            return False
+        return not hot_reload or entry[0] == self._mtime(py_path)
+
+    def get(self, slug, py_path):
+        hot_reload = hot_reload_enabled()
+        entry = self._classes.get(slug)
+        if self._is_current(entry, py_path, hot_reload):
+            return entry[2]
+        with self._lock:
+            entry = self._classes.get(slug)
+            if self._is_current(entry, py_path, hot_reload):
+                return entry[2]
+            mtime = self._mtime(py_path)
+            loaded = self._load(slug, py_path)
+            self._classes[slug] = (mtime, py_path, loaded)
+            return loaded
+
+    def _load(self, slug, py_path):
+        spec = importlib.util.spec_from_file_location(f"{self.module_prefix}_{slug}", py_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        for name, obj in module.__dict__.items():
+            if isinstance(obj, type) and issubclass(obj, self.base_class) and obj is not self.base_class:
+                return obj
+
+        raise ValueError(f"No {self.base_class.__name__} subclass found in {py_path}")
+
+    def clear(self):
+        with self._lock:
+            self._classes.clear()
@@ -1,12 +1,18 @@
 import os
 import json
-import importlib.util
+import threading
 from django.conf import settings
+from ..loader import ClassLoader, hot_reload_enabled
 from .base import BasePlugin
 
 class PluginRegistry:
     _instance = None
     _plugins = {}
+    _discovered = False
+    _loader = ClassLoader(BasePlugin, 'plugin')
+    # Plugins hold no per-site state, so one instance per slug serves every request.
+    _instances = {}
+    _instances_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -33,35 +39,38 @@ class PluginRegistry:
                         'path': path,
                         'py_path': plugin_py_path
                     }
+        PluginRegistry._discovered = True
 
-    def get_plugin_class(self, slug):
-        if slug not in self._plugins:
+    def _ensure_discovered(self, slug=None):
+        # Unknown slugs rescan the directory only once, unless hot reload is on.
+        if (slug is None or slug not in self._plugins) and (not self._discovered or hot_reload_enabled()):
             self.discover()
-        
+
+    def get_plugin_class(self, slug):
+        self._ensure_discovered(slug)
+
         if slug not in self._plugins:
             raise ValueError(f"Plugin {slug} not found")
 
-        plugin_info = self._plugins[slug]
-        spec = importlib.util.spec_from_file_location(f"plugin_{slug}", plugin_info['py_path'])
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        
-        for name, obj in module.__dict__.items():
-            if isinstance(obj, type) and issubclass(obj, BasePlugin) and obj is not BasePlugin:
-                return obj
-        
-        raise ValueError(f"No BasePlugin subclass found in {plugin_info['py_path']}")
+        return self._loader.get(slug, self._plugins[slug]['py_path'])
 
     def get_instance(self, slug):
         plugin_class = self.get_plugin_class(slug)
-        return plugin_class()
+        cached = self._instances.get(slug)
+        if cached is not None and cached[0] is plugin_class:
+            return cached[1]
+        with self._instances_lock:
+            cached = self._instances.get(slug)
+            if cached is None or cached[0] is not plugin_class:
+                cached = (plugin_class, plugin_class())
+                self._instances[slug] = cached
+        return cached[1]
 
     def get_manifest(self, slug):
-        if slug not in self._plugins:
-            self.discover()
+        self._ensure_discovered(slug)
         return self._plugins.get(slug, {}).get('manifest')
 
     def all_plugins(self):
         if not self._plugins:
-            self.discover()
+            self._ensure_discovered()
         return self._plugins
@@ -1,12 +1,14 @@
 import os
 import json
-import importlib.util
 from django.conf import settings
+from ..loader import ClassLoader, hot_reload_enabled
 from .base import BaseTemplate
 
 class TemplateRegistry:
     _instance = None
     _templates = {}
+    _discovered = False
+    _loader = ClassLoader(BaseTemplate, 'template')
 
     def __new__(cls):
         if cls._instance is None:
@@ -33,30 +35,26 @@ class TemplateRegistry:
                         'path': path,
                         'py_path': template_py_path
                     }
+        TemplateRegistry._discovered = True
 
-    def get_template_class(self, slug):
-        if slug not in self._templates:
+    def _ensure_discovered(self, slug):
+        # Unknown slugs rescan the directory only once, unless hot reload is on.
+        if slug not in self._templates and (not self._discovered or hot_reload_enabled()):
             self.discover()
-        
+
+    def get_template_class(self, slug):
+        self._ensure_discovered(slug)
+
         if slug not in self._templates:
             raise ValueError(f"Template {slug} not found")
 
-        template_info = self._templates[slug]
-        spec = importlib.util.spec_from_file_location(f"template_{slug}", template_info['py_path'])
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        
-        for name, obj in module.__dict__.items():
-            if isinstance(obj, type) and issubclass(obj, BaseTemplate) and obj is not BaseTemplate:
-                return obj
-        
-        raise ValueError(f"No BaseTemplate subclass found in {template_info['py_path']}")
+        return self._loader.get(slug, self._templates[slug]['py_path'])
 
     def get_instance(self, slug, site):
+        # Templates are bound to a site, so only the class is cached.
         template_class = self.get_template_class(slug)
         return template_class(site)
 
     def get_manifest(self, slug):
-        if slug not in self._templates:
-            self.discover()
+        self._ensure_discovered(slug)
         return self._templates.get(slug, {}).get('manifest')
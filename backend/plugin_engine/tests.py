@@ -1,3 +1,106 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from .engine.plugin_engine.registry import PluginRegistry
+from .engine.template_engine.registry import TemplateRegistry
+
+
+PLUGIN_SOURCE = '''
+from plugin_engine.engine.plugin_engine.base import BasePlugin
+
+class Plugin(BasePlugin):
+    version = {version}
+
+    def activate(self, site): pass
+    def deactivate(self, site): pass
+    def get_dashboard_widgets(self, user, site): return [{{'version': self.version}}]
+    def register_api_routes(self): return []
+'''
+
+TEMPLATE_SOURCE = '''
+from plugin_engine.engine.template_engine.base import BaseTemplate
+
+class Template(BaseTemplate):
+    def get_required_plugins(self): return ['counter']
+    def get_dashboard_layout(self, user): return [{'plugin': 'counter', 'title': 'Counter'}]
+    def validate_settings(self, settings): return True
+'''
+
+
+class RegistryCachingTest(SimpleTestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir)
+        self.plugin_py = self.write('plugins', 'counter', 'plugin.py', PLUGIN_SOURCE.format(version=1))
+        self.write('templates', 'minimal', 'template.py', TEMPLATE_SOURCE)
+
+        settings_override = override_settings(BASE_DIR=self.base_dir, DEBUG=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for registry in (PluginRegistry, TemplateRegistry):
+            self.addCleanup(self.reset, registry)
+            self.reset(registry)
+
+    def reset(self, registry):
+        getattr(registry, '_plugins', getattr(registry, '_templates', {})).clear()
+        registry._discovered = False
+        registry._loader.clear()
+        getattr(registry, '_instances', {}).clear()
+
+    def write(self, kind, slug, filename, source):
+        directory = os.path.join(self.base_dir, kind, slug)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump({'slug': slug}, f)
+        path = os.path.join(directory, filename)
+        with open(path, 'w') as f:
+            f.write(source)
+        return path
+
+    def update_plugin(self, version):
+        with open(self.plugin_py, 'w') as f:
+            f.write(PLUGIN_SOURCE.format(version=version))
+        stat = os.stat(self.plugin_py)
+        os.utime(self.plugin_py, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_classes_and_plugin_instances_are_loaded_once(self):
+        registry = PluginRegistry()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get_plugin_class('counter'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(cls) for cls in results}), 1)
+        self.assertIs(registry.get_instance('counter'), registry.get_instance('counter'))
+
+        templates = TemplateRegistry()
+        self.assertIs(templates.get_template_class('minimal'), templates.get_template_class('minimal'))
+        self.assertEqual(templates.get_instance('minimal', 'site').site, 'site')
+
+        # Without DEBUG, edits on disk are not picked up.
+        self.update_plugin(2)
+        self.assertEqual(registry.get_instance('counter').version, 1)
+
+    def test_unknown_slugs_do_not_rescan_the_directory(self):
+        registry = PluginRegistry()
+        registry.get_plugin_class('counter')
+        self.write('plugins', 'late', 'plugin.py', PLUGIN_SOURCE.format(version=1))
+        with self.assertRaises(ValueError):
+            registry.get_plugin_class('late')
+
+    @override_settings(DEBUG=True)
+    def test_debug_hot_reloads_changed_files(self):
+        registry = PluginRegistry()
+        first = registry.get_instance('counter')
+        self.assertIs(registry.get_instance('counter'), first)
+
+        self.update_plugin(2)
+        second = registry.get_instance('counter')
+        self.assertIsNot(second, first)
+        self.assertEqual(second.get_dashboard_widgets(None, None), [{'version': 2}])
@@ -1,6 +1,8 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.utils.html import format_html
-from .models import SiteCategory, Theme, Site, Plugin, SitePlugin, UserSubdomain
+from .models import SiteCategory, Theme, Site, Plugin, SitePlugin, SubdomainReservation, UserSubdomain
+from .subdomains import claim_subdomain, is_available, normalize_subdomain, release_subdomain
 from menu.models import Product
 
 @admin.register(UserSubdomain)
@@ -9,6 +11,12 @@ class UserSubdomainAdmin(admin.ModelAdmin):
     search_fields = ('subdomain', 'site__name', 'user_ip')
     list_filter = ('is_active', 'created_at')
 
+@admin.register(SubdomainReservation)
+class SubdomainReservationAdmin(admin.ModelAdmin):
+    list_display = ('subdomain', 'site', 'expires_at', 'created_at')
+    search_fields = ('subdomain', 'site__name')
+    raw_id_fields = ('site',)
+
 class SitePluginInline(admin.TabularInline):
     model = SitePlugin
     extra = 1
@@ -51,8 +59,24 @@ class ThemeAdmin(admin.ModelAdmin):
         }),
     )
 
+class SiteAdminForm(forms.ModelForm):
+    class Meta:
+        model = Site
+        fields = '__all__'
+
+    def clean_subdomain(self):
+        subdomain = self.cleaned_data.get('subdomain')
+        if not subdomain:
+            return subdomain
+        subdomain = normalize_subdomain(subdomain)
+        site = self.instance if self.instance.pk else None
+        if not is_available(subdomain, site=site):
+            raise forms.ValidationError('Subdomain is reserved by another site or signup.')
+        return subdomain
+
 @admin.register(Site)
 class SiteAdmin(admin.ModelAdmin):
+    form = SiteAdminForm
     list_display = ('name', 'owner', 'category', 'theme', 'view_site_link', 'created_at')
     list_filter = ('category', 'theme')
     search_fields = ('name', 'owner__phone_number')
@@ -64,6 +88,18 @@ class SiteAdmin(admin.ModelAdmin):
             inlines.append(ProductInline)
         return inlines
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'subdomain' not in form.changed_data:
+            return
+        previous = form.initial.get('subdomain')
+        if obj.subdomain and not claim_subdomain(obj.subdomain, obj):
+            # Lost a race after clean_subdomain; keep the old reservation.
+            messages.warning(request, f"Subdomain {obj.subdomain} is reserved by another site or signup.")
+            return
+        if previous and previous != obj.subdomain:
+            release_subdomain(previous, obj)
+
     def view_site_link(self, obj):
         if obj.slug:
             url = f"/{obj.slug}/"
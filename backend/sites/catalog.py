@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import transaction
+
+from tenants.counters import aget_counter, bump_counter, get_counter
+
+
+_VERSION_KEY = "themes:catalog:ver"
+
+
+def get_catalog_ttl():
+    return getattr(settings, "THEME_CATALOG_CACHE_TTL", 60 * 60)
+
+
+def get_catalog_version() -> int:
+    return get_counter(_VERSION_KEY)
+
+
+async def aget_catalog_version() -> int:
+    return await aget_counter(_VERSION_KEY)
+
+
+def catalog_cache_key(host, category_id) -> str:
+    return f"themes:catalog:v{get_catalog_version()}:{host}:{category_id or 'all'}"
+
+
+def _bump():
+    bump_counter(_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """
+    Orphans every cached theme catalog response; runs again on commit.
+    """
+    _bump()
+    transaction.on_commit(_bump)
@@ -0,0 +1,214 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from tenants.models import Tenant
+
+from .models import Site
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_size():
+    return getattr(settings, 'SITE_CLEANUP_BATCH_SIZE', 1000)
+
+
+def get_pause():
+    # Seconds to sleep between batches so replicas and live queries keep up.
+    return getattr(settings, 'SITE_CLEANUP_PAUSE', 0.05)
+
+
+def get_time_budget():
+    return getattr(settings, 'SITE_CLEANUP_TIME_BUDGET', 240)
+
+
+def expired_sites(now=None):
+    """
+    Sites whose trial ended over two days ago and that have no subscription,
+    or whose subscription also ended over two days ago.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=2)
+    return Site.objects.filter(
+        Q(subscription_ends_at__isnull=True) | Q(subscription_ends_at__lt=cutoff),
+        trial_ends_at__lt=cutoff,
+    )
+
+
+def _dependents(model):
+    """
+    Reverse foreign keys pointing at `model`, including hidden ones (M2M through tables).
+    """
+    for field in model._meta.get_fields(include_hidden=True):
+        if field.auto_created and not field.concrete and (field.one_to_many or field.one_to_one):
+            yield field
+
+
+def _subtree(model, stack):
+    """
+    Models deleted along with `model` through cascading reverse relations.
+    """
+    models_ = {model}
+    if model in stack:
+        return models_
+    for relation in _dependents(model):
+        if relation.field.remote_field.on_delete is models.CASCADE:
+            models_ |= _subtree(relation.related_model, stack + (model,))
+    return models_
+
+
+def _references(models_):
+    return {
+        field.related_model
+        for model in models_
+        for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is not None
+    }
+
+
+def _ordered(relations, stack, ignore=()):
+    """
+    Orders sibling relations so a subtree whose rows point into another subtree
+    is emptied first (orders, whose items reference products, before products).
+    Falls back to declaration order on cycles.
+    """
+    remaining = [
+        (relation, subtree, _references(subtree) - set(ignore) - subtree)
+        for relation in relations
+        for subtree in [_subtree(relation.related_model, stack)]
+    ]
+    ordered = []
+    while remaining:
+        for index, (relation, subtree, _) in enumerate(remaining):
+            if not any(refs & subtree for other, _, refs in remaining if other is not relation):
+                break
+        else:
+            index = 0
+        ordered.append(remaining.pop(index)[0])
+    return ordered
+
+
+class SiteDeletionJob:
+    """
+    Deletes a site and everything hanging off it in bounded batches, bottom-up
+    (order items -> orders -> products -> ... -> site), with raw DELETEs that skip
+    the collector. Each batch commits on its own, so the job can stop at any
+    point and be run again: it only ever deletes rows that are still there.
+
+    One-to-one dependents of the site (its tenant, subdomain record) are emptied
+    the same way, then removed with the site by a regular delete() so their
+    cache invalidation signals still fire.
+    """
+
+    def __init__(self, batch_size=None, pause=None):
+        self.batch_size = batch_size or get_batch_size()
+        self.pause = get_pause() if pause is None else pause
+        self.rows = {}
+        self.elapsed = 0.0
+
+    @property
+    def total_rows(self):
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self):
+        return self.total_rows / self.elapsed if self.elapsed else 0.0
+
+    def delete_site(self, site_id):
+        started = time.monotonic()
+        site = Site.objects.filter(pk=site_id).first()
+        if site is not None:
+            self._disable_tenant(site)
+            relations = list(_dependents(Site))
+            kept = {relation.related_model for relation in relations if relation.one_to_one}
+            for relation in _ordered(relations, (Site,), ignore={Site, *kept}):
+                self._clear(relation, site_id, stack=(Site,), keep=relation.one_to_one, ignore={Site, *kept})
+            site.delete()
+            self._count(Site, 1)
+        self.elapsed += time.monotonic() - started
+        return site is not None
+
+    def _disable_tenant(self, site):
+        # Stop serving the site before its menu starts disappearing.
+        tenant = Tenant.objects.filter(site_id=site.pk).exclude(status=Tenant.Status.DISABLED).first()
+        if tenant is not None:
+            tenant.status = Tenant.Status.DISABLED
+            tenant.save(update_fields=['status'])
+
+    def _clear(self, relation, value, stack, keep=False, parent_lookup=None, ignore=()):
+        """
+        Empties the rows of `relation.related_model` that point at the site, children
+        first. `parent_lookup` locates the parent rows (None for the site itself).
+        Rows are deleted unless `keep` is set.
+        """
+        model = relation.related_model
+        field = relation.field
+        lookup = f'{field.name}__{parent_lookup}' if parent_lookup else field.attname
+        on_delete = field.remote_field.on_delete
+
+        if on_delete in (models.SET_NULL, models.SET_DEFAULT):
+            default = None if on_delete is models.SET_NULL else field.get_default()
+            self._batched(model, lookup, value, lambda rows: rows.update(**{field.attname: default}))
+            return
+        if on_delete is not models.CASCADE:
+            # DO_NOTHING is the database's business; PROTECT/RESTRICT are left to delete() to enforce.
+            return
+
+        if model not in stack:
+            for child in _ordered(list(_dependents(model)), stack + (model,), ignore):
+                self._clear(child, value, stack + (model,), parent_lookup=lookup, ignore=ignore)
+        if not keep:
+            self._batched(model, lookup, value, lambda rows: rows._raw_delete(rows.db))
+
+    def _batched(self, model, lookup, value, apply):
+        manager = model._base_manager
+        using = router.db_for_write(model)
+        while True:
+            pks = list(manager.filter(**{lookup: value}).values_list('pk', flat=True)[:self.batch_size])
+            if not pks:
+                return
+            with transaction.atomic(using=using):
+                done = apply(manager.filter(pk__in=pks))
+            self._count(model, done if isinstance(done, int) else len(pks))
+            if len(pks) < self.batch_size:
+                return
+            if self.pause:
+                time.sleep(self.pause)
+
+    def _count(self, model, rows):
+        label = model._meta.label
+        self.rows[label] = self.rows.get(label, 0) + rows
+
+
+def delete_expired_sites(now=None, time_budget=None, job=None):
+    """
+    Deletes expired sites one at a time until none are left or the time budget
+    is spent. Returns (deleted site count, job, finished).
+    """
+    job = job or SiteDeletionJob()
+    time_budget = get_time_budget() if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget
+    deleted = 0
+    last_id = 0
+    while True:
+        # Keyset chunks rather than one open cursor, which the deletes would interleave with.
+        site_ids = list(
+            expired_sites(now).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:100]
+        )
+        if not site_ids:
+            return deleted, job, True
+        for site_id in site_ids:
+            if time.monotonic() >= deadline:
+                return deleted, job, False
+            if job.delete_site(site_id):
+                deleted += 1
+                logger.info(
+                    'Deleted expired site %s: %s rows so far, %.0f rows/s',
+                    site_id, job.total_rows, job.rows_per_second,
+                )
+        last_id = site_ids[-1]
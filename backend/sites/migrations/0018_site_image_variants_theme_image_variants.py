@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0017_usersubdomain'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='site',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='theme',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+
+def backfill_supported_categories(apps, schema_editor):
+    Theme = apps.get_model('sites', 'Theme')
+    SiteCategory = apps.get_model('sites', 'SiteCategory')
+
+    ids_by_slug = dict(SiteCategory.objects.values_list('slug', 'id'))
+    for theme in Theme.objects.all():
+        ids = {ids_by_slug[slug] for slug in (theme.site_types or []) if slug in ids_by_slug}
+        if theme.category_id:
+            ids.add(theme.category_id)
+        theme.supported_categories.set(ids)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0018_site_image_variants_theme_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='theme',
+            name='supported_categories',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='supported_themes', to='sites.sitecategory'),
+        ),
+        migrations.RunPython(backfill_supported_categories, migrations.RunPython.noop),
+    ]
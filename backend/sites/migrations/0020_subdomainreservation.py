@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_reservations(apps, schema_editor):
+    SubdomainReservation = apps.get_model('sites', 'SubdomainReservation')
+    Site = apps.get_model('sites', 'Site')
+    UserSubdomain = apps.get_model('sites', 'UserSubdomain')
+    Tenant = apps.get_model('tenants', 'Tenant')
+
+    # Live tenant hosts first, then names recorded on sites and at signup.
+    owners = {}
+    sources = (
+        Tenant.objects.values_list('subdomain', 'site_id'),
+        Site.objects.exclude(subdomain__isnull=True).values_list('subdomain', 'id'),
+        UserSubdomain.objects.values_list('subdomain', 'site_id'),
+    )
+    for rows in sources:
+        for subdomain, site_id in rows.iterator():
+            if subdomain:
+                owners.setdefault(subdomain.lower(), site_id)
+    SubdomainReservation.objects.bulk_create(
+        [SubdomainReservation(subdomain=subdomain, site_id=site_id) for subdomain, site_id in owners.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0019_theme_supported_categories'),
+        ('tenants', '0002_canonicalize_custom_domains'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubdomainReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subdomain', models.CharField(max_length=100, unique=True)),
+                ('token', models.CharField(blank=True, default='', max_length=32)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('site', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subdomain_reservations', to='sites.site')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='sites_subres_expires_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_reservations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0020_subdomainreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='site',
+            name='settings_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+def strip_defaults(defaults, values):
+    # Drops values equal to the theme default; keys the site lacks stay inherited.
+    if not isinstance(defaults, dict) or not isinstance(values, dict):
+        return values
+    overrides = {}
+    for key, value in values.items():
+        if key not in defaults:
+            overrides[key] = value
+        elif value != defaults[key]:
+            nested = isinstance(value, dict) and isinstance(defaults[key], dict)
+            overrides[key] = strip_defaults(defaults[key], value) if nested else value
+    return overrides
+
+
+def settings_to_overrides(apps, schema_editor):
+    Site = apps.get_model('sites', 'Site')
+    Theme = apps.get_model('sites', 'Theme')
+
+    defaults_by_theme = dict(Theme.objects.values_list('id', 'default_settings'))
+    batch = []
+    for site in Site.objects.exclude(theme__isnull=True).only('id', 'theme_id', 'settings').iterator(chunk_size=1000):
+        overrides = strip_defaults(defaults_by_theme.get(site.theme_id) or {}, site.settings)
+        if overrides != site.settings:
+            site.settings = overrides
+            batch.append(site)
+        if len(batch) >= 1000:
+            Site.objects.bulk_update(batch, ['settings'])
+            batch = []
+    if batch:
+        Site.objects.bulk_update(batch, ['settings'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0021_site_settings_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='theme',
+            name='settings_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(settings_to_overrides, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
+from tenants.models import SnapshotLoadingMixin
+
 class SiteCategory(models.Model):
     name = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(max_length=255, unique=True, allow_unicode=True)
@@ -24,25 +27,78 @@ class Plugin(models.Model):
         return self.name
 
 class Theme(models.Model):
+    IMAGE_FIELDS = ('preview_image',)
+
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True, allow_unicode=True)
     category = models.ForeignKey(SiteCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='themes')
     required_plugins = models.ManyToManyField(Plugin, blank=True, related_name='themes')
     site_types = models.JSONField(default=list, blank=True, help_text="List of SiteCategory slugs this theme supports")
+    # Derived from `category` and `site_types` so catalog filtering is one indexed join.
+    supported_categories = models.ManyToManyField(SiteCategory, blank=True, editable=False, related_name='supported_themes')
     preview_image = models.ImageField(upload_to='theme_previews/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     preview_url = models.URLField(max_length=500, null=True, blank=True)
     tag = models.CharField(max_length=50, null=True, blank=True, help_text="e.g. New, Special")
     description = models.TextField(null=True, blank=True)
     source_identifier = models.CharField(max_length=255, help_text="Used by frontend to load theme assets")
     config = models.JSONField(default=dict, blank=True, help_text="Modular theme configuration")
     default_settings = models.JSONField(default=dict, blank=True)
+    # Bumped when default_settings change; part of every effective-settings memo key.
+    settings_version = models.PositiveIntegerField(default=1, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.name
 
-class Site(models.Model):
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if not self._state.adding and (update_fields is None or 'default_settings' in update_fields):
+            previous = Theme.objects.filter(pk=self.pk).values_list('default_settings', flat=True).first()
+            if previous != self.default_settings:
+                self.settings_version += 1
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'settings_version'}
+        super().save(*args, **kwargs)
+
+    def sync_supported_categories(self):
+        ids = set(SiteCategory.objects.filter(slug__in=list(self.site_types or [])).values_list('id', flat=True))
+        if self.category_id:
+            ids.add(self.category_id)
+        self.supported_categories.set(ids)
+
+class SiteQuerySet(models.QuerySet):
+    def with_profile(self):
+        """
+        Loads everything SiteSerializer reads, in a fixed number of queries
+        however many sites are listed.
+        """
+        products = self.model._meta.get_field('products').related_model
+        product_count = (
+            products.unscoped.filter(site=models.OuterRef('pk'))
+            .order_by()
+            .values('site')
+            .annotate(count=models.Count('id'))
+            .values('count')
+        )
+        return (
+            self.select_related('owner', 'category', 'theme')
+            .annotate(product_count=Coalesce(models.Subquery(product_count), 0))
+            .prefetch_related(
+                models.Prefetch(
+                    'site_plugins',
+                    queryset=SitePlugin.objects.filter(is_active=True).select_related('plugin').order_by('plugin__key'),
+                    to_attr='active_site_plugins',
+                ),
+                'theme__required_plugins',
+            )
+        )
+
+
+class Site(SnapshotLoadingMixin, models.Model):
+    IMAGE_FIELDS = ('logo', 'cover_image')
+
     PROVISIONING_STATUS = (
         ('optimizing_products', 'Optimizing Products'),
         ('preparing_settings', 'Preparing Settings'),
@@ -62,9 +118,13 @@ class Site(models.Model):
     )
     logo = models.ImageField(upload_to='site_logos/', null=True, blank=True)
     cover_image = models.ImageField(upload_to='site_covers/', null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(SiteCategory, on_delete=models.PROTECT, related_name='sites')
     theme = models.ForeignKey(Theme, on_delete=models.PROTECT, related_name='sites', null=True, blank=True)
+    # Only the site's overrides of its theme's default_settings; see sites.site_settings.
     settings = models.JSONField(default=dict, blank=True)
+    # Bumped by save() whenever settings change; the dashboard sends it back as If-Match.
+    settings_version = models.PositiveIntegerField(default=1, editable=False)
     
     # SEO Fields
     meta_title = models.CharField(max_length=255, null=True, blank=True)
@@ -76,14 +136,22 @@ class Site(models.Model):
     trial_ends_at = models.DateTimeField(null=True, blank=True)
     subscription_ends_at = models.DateTimeField(null=True, blank=True)
 
+    objects = SiteQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-        if is_new and not self.trial_ends_at:
+        if self._state.adding and not self.trial_ends_at:
             from django.utils import timezone
             from datetime import timedelta
-            self.trial_ends_at = self.created_at + timedelta(hours=24)
-            self.save(update_fields=['trial_ends_at'])
+            # Set before the insert rather than with a second save.
+            self.trial_ends_at = timezone.now() + timedelta(hours=24)
+        update_fields = kwargs.get('update_fields')
+        if not self._state.adding and (update_fields is None or 'settings' in update_fields):
+            previous = Site.objects.filter(pk=self.pk).values_list('settings', flat=True).first()
+            if previous != self.settings:
+                self.settings_version += 1
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'settings_version'}
+        super().save(*args, **kwargs)
 
     @staticmethod
     @transaction.atomic
@@ -117,7 +185,6 @@ class Site(models.Model):
                 'slug': slugify(getattr(user, 'restaurant_name', '') or f"site-{user.phone_number}", allow_unicode=True),
                 'category': category,
                 'theme': theme,
-                'settings': theme.default_settings
             }
         )
         
@@ -127,11 +194,33 @@ class Site(models.Model):
             
         return site
 
+    def _loaded_plugin_keys(self):
+        # Set by the tenant snapshot or by SiteQuerySet.with_profile().
+        keys = getattr(self, '_active_plugin_keys', None)
+        if keys is None and hasattr(self, 'active_site_plugins'):
+            keys = frozenset(sp.plugin.key for sp in self.active_site_plugins)
+        return keys
+
     def is_plugin_active(self, plugin_key):
-        return self.site_plugins.filter(plugin__key=plugin_key, is_active=True).exists()
+        keys = self._loaded_plugin_keys()
+        if keys is None:
+            from .plugin_cache import get_active_plugin_keys
+            keys = get_active_plugin_keys(self.pk)
+        return plugin_key in keys
+
+    async def ais_plugin_active(self, plugin_key):
+        keys = self._loaded_plugin_keys()
+        if keys is None:
+            from .plugin_cache import aget_active_plugin_keys
+            keys = await aget_active_plugin_keys(self.pk)
+        return plugin_key in keys
 
     def get_active_plugins(self):
-        return [sp.plugin.key for sp in self.site_plugins.filter(is_active=True)]
+        keys = self._loaded_plugin_keys()
+        if keys is None:
+            from .plugin_cache import get_active_plugin_keys
+            keys = get_active_plugin_keys(self.pk)
+        return sorted(keys)
 
     def __str__(self):
         return f"{self.name} - {self.owner.phone_number}"
@@ -156,3 +245,32 @@ class UserSubdomain(models.Model):
 
     def __str__(self):
         return self.subdomain
+
+class SubdomainReservationQuerySet(models.QuerySet):
+    def active(self, now=None):
+        """
+        Claimed names plus holds that have not expired yet.
+        """
+        from django.utils import timezone
+
+        now = now or timezone.now()
+        return self.filter(models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now))
+
+class SubdomainReservation(models.Model):
+    """
+    Every subdomain that is taken or being signed up for, under one unique index.
+    A hold has a token and an expiry; claiming it for a site clears both.
+    """
+    subdomain = models.CharField(max_length=100, unique=True)
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, null=True, blank=True, related_name='subdomain_reservations')
+    token = models.CharField(max_length=32, blank=True, default='')
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = SubdomainReservationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['expires_at'], name='sites_subres_expires_idx')]
+
+    def __str__(self):
+        return self.subdomain
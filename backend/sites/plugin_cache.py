@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from tenants.counters import aget_counter, bump_counter, get_counter
+from tenants.local_cache import MISSING, LocalLRUCache
+from tenants.pubsub import publish, register_handler
+
+
+_local_cache = LocalLRUCache(
+    maxsize=getattr(settings, "SITE_PLUGIN_CACHE_LOCAL_MAXSIZE", 4096),
+    ttl=getattr(settings, "SITE_PLUGIN_CACHE_LOCAL_TTL", 60),
+)
+
+
+def _version_key(site_id) -> str:
+    return f"site:plugins:ver:{site_id}"
+
+
+def _keys_key(site_id, version) -> str:
+    return f"site:plugins:{site_id}:v{version}"
+
+
+def _cache_ttl():
+    # Bounds staleness for writers that do not bump the version.
+    return getattr(settings, "SITE_PLUGIN_CACHE_TTL", 60 * 60)
+
+
+def _evict(payload):
+    _local_cache.delete(payload.get("site_id"))
+
+
+def _reset(payload):
+    _local_cache.clear()
+
+
+register_handler("site-plugins", _evict)
+register_handler("reset", _reset)
+
+
+def _load(site_id):
+    from .models import SitePlugin
+
+    return frozenset(
+        SitePlugin.objects.filter(site_id=site_id, is_active=True).values_list("plugin__key", flat=True)
+    )
+
+
+async def _aload(site_id):
+    from .models import SitePlugin
+
+    rows = SitePlugin.objects.filter(site_id=site_id, is_active=True).values_list("plugin__key", flat=True)
+    return frozenset([key async for key in rows])
+
+
+def get_plugin_version(site_id) -> int:
+    return get_counter(_version_key(site_id))
+
+
+async def aget_plugin_version(site_id) -> int:
+    return await aget_counter(_version_key(site_id))
+
+
+def get_active_plugin_keys(site_id) -> frozenset:
+    """
+    Active plugin keys of a site: process memory, then the shared cache under
+    the site's plugin version, then one query.
+    """
+    keys = _local_cache.get(site_id)
+    if keys is not MISSING:
+        return keys
+
+    shared_key = _keys_key(site_id, get_plugin_version(site_id))
+    try:
+        keys = cache.get(shared_key)
+    except Exception:
+        keys = None
+    if keys is None:
+        keys = _load(site_id)
+        try:
+            cache.set(shared_key, keys, _cache_ttl())
+        except Exception:
+            pass
+    keys = frozenset(keys)
+    _local_cache.set(site_id, keys)
+    return keys
+
+
+async def aget_active_plugin_keys(site_id) -> frozenset:
+    keys = _local_cache.get(site_id)
+    if keys is not MISSING:
+        return keys
+
+    shared_key = _keys_key(site_id, await aget_plugin_version(site_id))
+    try:
+        keys = await cache.aget(shared_key)
+    except Exception:
+        keys = None
+    if keys is None:
+        keys = await _aload(site_id)
+        try:
+            await cache.aset(shared_key, keys, _cache_ttl())
+        except Exception:
+            pass
+    keys = frozenset(keys)
+    _local_cache.set(site_id, keys)
+    return keys
+
+
+def _bump(site_id):
+    bump_counter(_version_key(site_id))
+
+
+def bump_plugin_version(site_or_id):
+    """
+    Call after changing which plugins a site has active.
+    Bumps again on commit and tells every worker to drop its local copy.
+    """
+    site_id = getattr(site_or_id, "pk", site_or_id)
+    if not site_id:
+        return
+    _bump(site_id)
+    _local_cache.delete(site_id)
+
+    def broadcast():
+        _bump(site_id)
+        _local_cache.delete(site_id)
+        publish("site-plugins", site_id=site_id)
+
+    transaction.on_commit(broadcast)
+
+
+def forget_site(site_id):
+    """
+    Drops a process-local entry without bumping, e.g. for a newly created site.
+    """
+    _local_cache.delete(site_id)
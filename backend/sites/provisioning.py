@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from tenants.pubsub import get_pubsub_url
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('optimizing_products', 'preparing_settings', 'setting_subdomain', 'receiving_ssl', 'ready')
+READY = 'ready'
+
+STEP_LABELS = (
+    "در حال بهینه‌سازی محصولات",
+    "در حال آماده‌سازی تنظیمات سایت",
+    "در حال ست کردن سابدامین",
+    "در حال دریافت و فعال‌سازی SSL",
+    "سایت آماده است",
+)
+
+_publisher = None
+_publisher_pid = None
+
+
+def get_provisioning_pubsub_url():
+    return getattr(settings, 'SITE_PROVISIONING_PUBSUB_URL', None) or get_pubsub_url()
+
+
+def get_stream_timeout():
+    # Provisioning takes seconds; a stream left open longer than this is abandoned.
+    return getattr(settings, 'SITE_PROVISIONING_STREAM_TIMEOUT', 300)
+
+
+def get_heartbeat_interval():
+    return getattr(settings, 'SITE_PROVISIONING_HEARTBEAT', 15)
+
+
+def get_poll_interval():
+    # Only used when pub/sub is not configured.
+    return getattr(settings, 'SITE_PROVISIONING_POLL_INTERVAL', 0.5)
+
+
+def get_retry_interval():
+    # Milliseconds a client waits before reconnecting to a non-streamed response.
+    return getattr(settings, 'SITE_PROVISIONING_RETRY_MS', 2000)
+
+
+def channel_name(site_id):
+    return f'site:provisioning:{site_id}'
+
+
+def state_key(site_id):
+    return f'site:provisioning:state:{site_id}'
+
+
+def progress_payload(site_id, subdomain, provisioning_status):
+    """
+    The body of the creation progress endpoint, also sent as each SSE event.
+    """
+    current = STAGES.index(provisioning_status) + 1 if provisioning_status in STAGES else 1
+    steps = []
+    for number, label in enumerate(STEP_LABELS, start=1):
+        if number < current or (number == current == len(STAGES)):
+            step_status = 'completed'
+        elif number == current:
+            step_status = 'in_progress'
+        else:
+            step_status = 'pending'
+        steps.append({'id': number, 'label': label, 'status': step_status})
+    return {
+        'site_id': site_id,
+        'current_status': provisioning_status,
+        'subdomain': subdomain,
+        'steps': steps,
+        'is_ready': provisioning_status == READY,
+    }
+
+
+def _redis_client(url):
+    import redis
+
+    return redis.Redis.from_url(url, socket_connect_timeout=1, socket_timeout=1)
+
+
+def publish_progress(site_id, subdomain, provisioning_status):
+    """
+    Stores the latest stage for late subscribers and pushes it to the site's channel.
+    """
+    global _publisher, _publisher_pid
+
+    payload = progress_payload(site_id, subdomain, provisioning_status)
+    cache.set(state_key(site_id), payload, get_stream_timeout())
+
+    url = get_provisioning_pubsub_url()
+    if not url:
+        return
+    try:
+        if _publisher is None or _publisher_pid != os.getpid():
+            _publisher = _redis_client(url)
+            _publisher_pid = os.getpid()
+        _publisher.publish(channel_name(site_id), json.dumps(payload, ensure_ascii=False))
+    except Exception:
+        # Subscribers still pick the stage up from the cached state.
+        logger.warning('Could not publish provisioning progress for site %s', site_id, exc_info=True)
+
+
+def set_stage(site, provisioning_status):
+    """
+    Moves a site to the next provisioning stage and announces it once committed.
+    """
+    site.provisioning_status = provisioning_status
+    site.save(update_fields=['provisioning_status'])
+    site_id, subdomain = site.pk, site.subdomain
+    transaction.on_commit(lambda: publish_progress(site_id, subdomain, provisioning_status))
+
+
+def _event(payload):
+    return f'event: progress\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n'
+
+
+def single_event(payload):
+    """
+    SSE body for servers that cannot hold a stream open: the current state and a
+    `retry` hint, after which the client reconnects, i.e. polls.
+    """
+    return f'retry: {get_retry_interval()}\n' + _event(payload)
+
+
+async def _polled_updates(site_id):
+    """
+    Fallback without pub/sub: watches the cached state, never the database.
+    Yields a payload per change, or None when a heartbeat is due.
+    """
+    loop = asyncio.get_running_loop()
+    beat = loop.time()
+    seen = None
+    while True:
+        await asyncio.sleep(get_poll_interval())
+        state = await cache.aget(state_key(site_id))
+        if state is not None and state != seen:
+            seen = state
+        elif loop.time() - beat >= get_heartbeat_interval():
+            state = None
+        else:
+            continue
+        beat = loop.time()
+        yield state
+
+
+async def _pubsub_updates(url, site_id):
+    import redis.asyncio as aioredis
+
+    client = aioredis.Redis.from_url(url, socket_connect_timeout=1)
+    pubsub = client.pubsub()
+    try:
+        try:
+            await pubsub.subscribe(channel_name(site_id))
+        except Exception:
+            logger.warning('Provisioning pub/sub unavailable, polling site %s', site_id, exc_info=True)
+            async for state in _polled_updates(site_id):
+                yield state
+            return
+
+        # A stage published before the subscription took effect is only in the cache.
+        state = await cache.aget(state_key(site_id))
+        if state is not None:
+            yield state
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=get_heartbeat_interval())
+            yield json.loads(message['data']) if message else None
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+async def stream_progress(initial):
+    """
+    SSE body: the current state, then every later stage until ready or timeout,
+    with comment lines as keep-alives while nothing happens.
+    """
+    yield _event(initial)
+    if initial['is_ready']:
+        return
+
+    site_id = initial['site_id']
+    current = STAGES.index(initial['current_status']) if initial['current_status'] in STAGES else 0
+    url = get_provisioning_pubsub_url()
+    updates = _pubsub_updates(url, site_id) if url else _polled_updates(site_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + get_stream_timeout()
+    try:
+        async for payload in updates:
+            if loop.time() >= deadline:
+                return
+            if payload is None:
+                yield ': keep-alive\n\n'
+                continue
+            stage = STAGES.index(payload['current_status']) if payload['current_status'] in STAGES else -1
+            # Stages only move forward; skip repeats and anything already sent.
+            if stage <= current:
+                continue
+            current = stage
+            yield _event(payload)
+            if payload['is_ready']:
+                return
+    finally:
+        await updates.aclose()
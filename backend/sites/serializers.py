@@ -1,11 +1,22 @@
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.utils.text import slugify
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from tenants.models import Tenant
-from tenants.services import ensure_tenant_for_site
+from core.http import client_ip
+from core.images import field_variant_urls
 from .models import Plugin, Site, SiteCategory, SitePlugin, Theme
+from .site_settings import effective_settings
+from .subdomains import (
+    claim_subdomain,
+    hold_subdomain,
+    is_available,
+    is_reserved_name,
+    normalize_subdomain,
+    release_subdomain,
+    suggest_subdomains,
+)
 
 User = get_user_model()
 
@@ -38,6 +49,7 @@ class ThemeSerializer(serializers.ModelSerializer):
         read_only=True,
         slug_field='key',
     )
+    preview_image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Theme
@@ -49,6 +61,7 @@ class ThemeSerializer(serializers.ModelSerializer):
             'category_name',
             'site_types',
             'preview_image',
+            'preview_image_variants',
             'preview_url',
             'tag',
             'description',
@@ -60,6 +73,9 @@ class ThemeSerializer(serializers.ModelSerializer):
             'created_at',
         ]
 
+    def get_preview_image_variants(self, obj):
+        return field_variant_urls(obj, 'preview_image', self.context.get('request'))
+
 
 class SiteSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -74,15 +90,32 @@ class SiteSerializer(serializers.ModelSerializer):
     product_count = serializers.SerializerMethodField()
     subscription_days_left = serializers.SerializerMethodField()
     is_trial = serializers.SerializerMethodField()
+    logo_variants = serializers.SerializerMethodField()
+    cover_image_variants = serializers.SerializerMethodField()
 
     def validate_subdomain(self, value):
-        from .models import UserSubdomain
-
-        normalized = value.lower()
-        if Tenant.objects.filter(subdomain=normalized).exists() or UserSubdomain.objects.filter(subdomain=normalized).exists():
+        normalized = normalize_subdomain(value)
+        if not is_available(normalized, site=self.instance):
             raise serializers.ValidationError('Subdomain is already taken.')
         return normalized
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Clients see the merged document; the row only stores overrides.
+        data['settings'] = effective_settings(instance)
+        return data
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        previous = instance.subdomain
+        subdomain = validated_data.get('subdomain')
+        if subdomain and subdomain != previous:
+            if not claim_subdomain(subdomain, instance):
+                raise serializers.ValidationError({'subdomain': 'Subdomain is already taken.'})
+            if previous:
+                release_subdomain(previous, instance)
+        return super().update(instance, validated_data)
+
     class Meta:
         model = Site
         fields = [
@@ -92,7 +125,9 @@ class SiteSerializer(serializers.ModelSerializer):
             'slug',
             'provisioning_status',
             'logo',
+            'logo_variants',
             'cover_image',
+            'cover_image_variants',
             'category',
             'category_name',
             'theme',
@@ -101,6 +136,7 @@ class SiteSerializer(serializers.ModelSerializer):
             'owner_phone',
             'owner_id',
             'settings',
+            'settings_version',
             'active_plugins',
             'required_plugins',
             'product_count',
@@ -114,13 +150,19 @@ class SiteSerializer(serializers.ModelSerializer):
             'meta_description',
             'schema_type',
         ]
-        read_only_fields = ['owner', 'provisioning_status']
+        read_only_fields = ['owner', 'provisioning_status', 'settings_version']
 
     def get_source_identifier(self, obj):
         if obj.theme:
             return obj.theme.source_identifier
         return 'minimal-cafe'
 
+    def get_logo_variants(self, obj):
+        return field_variant_urls(obj, 'logo', self.context.get('request'))
+
+    def get_cover_image_variants(self, obj):
+        return field_variant_urls(obj, 'cover_image', self.context.get('request'))
+
     def get_active_plugins(self, obj):
         return obj.get_active_plugins()
 
@@ -130,7 +172,11 @@ class SiteSerializer(serializers.ModelSerializer):
         return []
 
     def get_product_count(self, obj):
-        return obj.products.count()
+        # Annotated by Site.objects.with_profile().
+        count = getattr(obj, 'product_count', None)
+        if count is None:
+            count = obj.products.count()
+        return count
 
     def get_subscription_days_left(self, obj):
         from django.utils import timezone
@@ -178,66 +224,58 @@ class SignupSerializer(serializers.Serializer):
         if theme.category_id != category.id and category.slug not in (theme.site_types or []):
             raise serializers.ValidationError({'theme_id': 'Theme does not support the selected category.'})
 
+        # Hold the name now so a concurrent signup fails here, not on an index inside create().
         subdomain = attrs.get('subdomain')
         if subdomain:
-            from .models import UserSubdomain
-
-            normalized = subdomain.lower()
-            if Tenant.objects.filter(subdomain=normalized).exists() or UserSubdomain.objects.filter(subdomain=normalized).exists():
+            subdomain = normalize_subdomain(subdomain)
+            token = None if is_reserved_name(subdomain) else hold_subdomain(subdomain)
+            if token is None:
                 raise serializers.ValidationError({'subdomain': 'Subdomain is already taken.'})
-            attrs['subdomain'] = normalized
+        else:
+            subdomain, token = self.hold_generated_subdomain(attrs['site_name'])
+        attrs['subdomain'] = subdomain
+        attrs['subdomain_token'] = token
 
         attrs['category'] = category
         attrs['theme'] = theme
         return attrs
 
+    def hold_generated_subdomain(self, site_name):
+        base = slugify(site_name, allow_unicode=False)
+        if base and not is_reserved_name(base):
+            token = hold_subdomain(base)
+            if token:
+                return base, token
+        for candidate in suggest_subdomains(base or 'site'):
+            token = hold_subdomain(candidate)
+            if token:
+                return candidate, token
+        raise serializers.ValidationError({'subdomain': 'Could not find a free subdomain; please choose one.'})
+
     @transaction.atomic
     def create(self, validated_data):
-        from django.utils.text import slugify
-
-        from .models import Site, UserSubdomain
-        from .services import ThemeService
-        from .tasks import provision_site_task
+        from .services import SiteCreationService, SubdomainTakenError
 
         user = User.objects.create_user(
+            username=validated_data['phone_number'],
             phone_number=validated_data['phone_number'],
             password=validated_data['password'],
             is_verified=True,
         )
 
-        subdomain = validated_data.get('subdomain') or slugify(validated_data['site_name'], allow_unicode=False)
-
-        site = Site.objects.create(
-            owner=user,
-            name=validated_data['site_name'],
-            subdomain=subdomain,
-            slug=subdomain,
-            category=validated_data['category'],
-            theme=validated_data['theme'],
-            settings=validated_data['theme'].default_settings,
-            provisioning_status='optimizing_products',
-        )
-
-        ensure_tenant_for_site(site)
-
-        ThemeService.activate_theme(site, validated_data['theme'])
-
         request = self.context.get('request')
-        ip = None
-        if request:
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip = x_forwarded_for.split(',')[0]
-            else:
-                ip = request.META.get('REMOTE_ADDR')
-
-        UserSubdomain.objects.create(
-            subdomain=subdomain,
-            site=site,
-            user_ip=ip,
-        )
-
-        transaction.on_commit(lambda: provision_site_task.delay(site.id))
+        try:
+            site = SiteCreationService.create_site(
+                user,
+                name=validated_data['site_name'],
+                subdomain=validated_data['subdomain'],
+                category=validated_data['category'],
+                theme=validated_data['theme'],
+                subdomain_token=validated_data['subdomain_token'],
+                user_ip=client_ip(request) if request else None,
+            )
+        except SubdomainTakenError:
+            raise serializers.ValidationError({'subdomain': 'Subdomain is already taken.'})
 
         self.user = user
         return site
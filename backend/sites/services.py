@@ -1,5 +1,12 @@
 from django.db import transaction
-from .models import Site, Theme, Plugin, SitePlugin
+from tenants.services import ensure_tenant_for_site, invalidate_site_tenant
+from .models import Site, Theme, Plugin, SitePlugin, UserSubdomain
+from .plugin_cache import bump_plugin_version
+from .site_settings import merge_patch, settings_overrides
+from .subdomains import claim_subdomain
+
+class SubdomainTakenError(Exception):
+    pass
 
 class ThemeService:
     @staticmethod
@@ -9,21 +16,73 @@ class ThemeService:
         Activates a theme for a site and ensures all required plugins are active.
         """
         # 1. Set the theme on the site
-        site.theme = theme
-        site.save()
+        if site.theme_id != theme.id:
+            site.theme = theme
+            site.save(update_fields=['theme', 'updated_at'])
 
         # 2. Activate required plugins
-        required_plugins = theme.required_plugins.all()
-        
-        for plugin in required_plugins:
-            site_plugin, created = SitePlugin.objects.get_or_create(
-                site=site,
-                plugin=plugin,
-                defaults={'is_active': True}
+        ThemeService.activate_required_plugins(site, theme)
+        return site
+
+    @staticmethod
+    def activate_required_plugins(site: Site, theme: Theme, created=False):
+        """
+        Upserts an active SitePlugin row per required plugin in two statements at most.
+        `created` skips reactivating rows a brand-new site cannot have.
+        """
+        plugin_ids = list(theme.required_plugins.values_list('id', flat=True))
+        if plugin_ids:
+            SitePlugin.objects.bulk_create(
+                [SitePlugin(site=site, plugin_id=plugin_id, is_active=True) for plugin_id in plugin_ids],
+                ignore_conflicts=True,
             )
-            
-            if not created and not site_plugin.is_active:
-                site_plugin.is_active = True
-                site_plugin.save()
-        
+            if not created:
+                SitePlugin.objects.filter(site=site, plugin_id__in=plugin_ids, is_active=False).update(is_active=True)
+                # Bulk writes skip the SitePlugin signals that refresh the tenant snapshot.
+                invalidate_site_tenant(site.pk)
+        bump_plugin_version(site)
+
+class SiteCreationService:
+    @staticmethod
+    @transaction.atomic
+    def create_site(owner, *, name, subdomain, category, theme=None, settings=None,
+                    subdomain_token=None, user_ip=None, **fields):
+        """
+        Creates a site with every field computed up front, so each row is inserted
+        once: the site, its subdomain claim, tenant, required plugins and signup
+        record. Provisioning starts after commit.
+        """
+        from .tasks import provision_site_task
+
+        # Stored as overrides of the theme defaults, which stay on the theme.
+        defaults = (theme.default_settings or {}) if theme else {}
+        site_settings = settings_overrides(defaults, merge_patch(defaults, settings)) if isinstance(settings, dict) else {}
+
+        site = Site(
+            owner=owner,
+            name=name,
+            subdomain=subdomain,
+            slug=subdomain,
+            category=category,
+            theme=theme,
+            settings=site_settings,
+            provisioning_status='optimizing_products',
+            **fields,
+        )
+        # The tenant is synced once below instead of from the post_save signal.
+        site._skip_tenant_sync = True
+        site.save(force_insert=True)
+
+        if not claim_subdomain(subdomain, site, token=subdomain_token):
+            raise SubdomainTakenError(subdomain)
+
+        if theme:
+            ThemeService.activate_required_plugins(site, theme, created=True)
+        # After the plugins, so the tenant's cache invalidation covers them.
+        ensure_tenant_for_site(site)
+
+        UserSubdomain.objects.create(subdomain=subdomain, site=site, user_ip=user_ip)
+
+        site_id = site.id
+        transaction.on_commit(lambda: provision_site_task.delay(site_id))
         return site
@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.images import stale_image_fields
+
+from .catalog import bump_catalog_version
+from .models import Plugin, Site, SiteCategory, SitePlugin, Theme
+from .plugin_cache import bump_plugin_version, forget_site
+from .tasks import generate_site_image_variants_task, generate_theme_image_variants_task
+
+
+@receiver(post_save, sender=Site)
+def site_forget_cached_plugins(sender, instance, created=False, **kwargs):
+    # A new row may reuse the id of a deleted site still cached in this process.
+    if created:
+        forget_site(instance.pk)
+
+
+@receiver(post_save, sender=SitePlugin)
+@receiver(post_delete, sender=SitePlugin)
+def site_plugin_bump_plugin_version(sender, instance, raw=False, **kwargs):
+    # Bulk writes (queryset.update, bulk_create) bypass this and bump explicitly.
+    if raw:
+        return
+    bump_plugin_version(instance.site_id)
+
+
+@receiver(post_save, sender=Site)
+def site_generate_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not stale_image_fields(instance, Site.IMAGE_FIELDS):
+        return
+    site_id = instance.pk
+    transaction.on_commit(lambda: generate_site_image_variants_task.delay(site_id))
+
+
+@receiver(post_save, sender=Theme)
+def theme_generate_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not stale_image_fields(instance, Theme.IMAGE_FIELDS):
+        return
+    theme_id = instance.pk
+    transaction.on_commit(lambda: generate_theme_image_variants_task.delay(theme_id))
+
+
+@receiver(post_save, sender=Theme)
+def theme_sync_supported_categories(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance.sync_supported_categories()
+
+
+@receiver(post_save, sender=SiteCategory)
+def category_sync_supported_themes(sender, instance, raw=False, **kwargs):
+    # Themes may list a slug before its category exists, or keep a renamed one.
+    if raw:
+        return
+    linked = set(instance.supported_themes.values_list('id', flat=True))
+    for theme in Theme.objects.only('id', 'category_id', 'site_types'):
+        if theme.pk in linked or instance.slug in (theme.site_types or []):
+            theme.sync_supported_categories()
+
+
+@receiver(post_save, sender=Theme)
+@receiver(post_delete, sender=Theme)
+@receiver(post_save, sender=SiteCategory)
+@receiver(post_delete, sender=SiteCategory)
+@receiver(post_save, sender=Plugin)
+@receiver(post_delete, sender=Plugin)
+@receiver(m2m_changed, sender=Theme.required_plugins.through)
+def theme_catalog_invalidate(sender, raw=False, **kwargs):
+    if raw:
+        return
+    bump_catalog_version()
@@ -0,0 +1,93 @@
+import json
+
+from django.conf import settings
+
+from tenants.local_cache import MISSING, LocalLRUCache
+
+
+def merge_patch(target, patch):
+    """
+    Applies an RFC 7396 JSON merge patch: objects merge recursively, null deletes
+    a key and any other value (arrays included) replaces the target outright.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def parse_settings_patch(value):
+    # Multipart dashboards send the patch as a JSON string.
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return value
+
+
+def settings_etag(site):
+    return f'"site-settings-{site.pk}-{site.settings_version}"'
+
+
+def if_match_satisfied(if_match, etag):
+    """
+    True when an If-Match header (absent, `*` or a list of tags) allows writing
+    the representation tagged `etag`. Weak tags never match, per RFC 9110.
+    """
+    if not if_match:
+        return True
+    tags = [tag.strip() for tag in if_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+_effective_cache = LocalLRUCache(
+    maxsize=getattr(settings, 'SITE_SETTINGS_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'SITE_SETTINGS_CACHE_TTL', 60 * 60),
+)
+
+
+def settings_overrides(defaults, effective):
+    """
+    The smallest document that merge-patches `defaults` into `effective`: values
+    that differ, nested objects diffed recursively, and null for removed keys.
+    """
+    if not isinstance(defaults, dict) or not isinstance(effective, dict):
+        return effective
+    overrides = {}
+    for key, value in effective.items():
+        if key not in defaults:
+            overrides[key] = value
+        elif value != defaults[key]:
+            nested = isinstance(value, dict) and isinstance(defaults[key], dict)
+            overrides[key] = settings_overrides(defaults[key], value) if nested else value
+    for key in defaults:
+        if key not in effective:
+            overrides[key] = None
+    return overrides
+
+
+def theme_defaults(site):
+    theme = site.theme if site.theme_id else None
+    return (theme.default_settings or {}) if theme else {}
+
+
+def effective_settings(site):
+    """
+    The site's theme defaults deep-merged with its stored overrides. Memoized per
+    worker on both versions, so edits to either side are picked up without
+    invalidation. Treat the result as read-only; it is shared.
+    """
+    theme = site.theme if site.theme_id else None
+    key = (site.pk, site.theme_id, theme.settings_version if theme else 0, site.settings_version)
+    value = _effective_cache.get(key) if site.pk else MISSING
+    if value is MISSING:
+        value = merge_patch(theme_defaults(site), site.settings or {})
+        if site.pk:
+            _effective_cache.set(key, value)
+    return value
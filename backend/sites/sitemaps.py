@@ -0,0 +1,123 @@
+import json
+import math
+from datetime import timezone as dt_timezone
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, Max
+from rest_framework.fields import DateTimeField
+
+from menu.models import MenuChange, Product
+from tenants.generation import get_tenant_generation
+from tenants.models import Tenant
+from tenants.resolver import get_platform_domain
+
+from .models import Site
+
+
+# Protocol limit for both urlsets and sitemap indexes.
+SITEMAP_MAX_URLS = 50000
+SITEMAP_CHUNK_SIZE = 2000
+
+SITE_PAGES = ('', '/menu', '/about', '/contact')
+
+_datetime = DateTimeField()
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def get_base_url():
+    return getattr(settings, 'SITEMAP_BASE_URL', None) or f'https://{get_platform_domain()}'
+
+
+def site_url(base_url, slug, path=''):
+    return f'{base_url}/preview/{quote(slug)}{path}'
+
+
+def _lastmod(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00') if value else None
+
+
+def _entry(tag, loc, lastmod=None):
+    lastmod = f'<lastmod>{_lastmod(lastmod)}</lastmod>' if lastmod else ''
+    return f'<{tag}><loc>{escape(loc)}</loc>{lastmod}</{tag}>\n'
+
+
+def listed_sites():
+    return Site.objects.exclude(slug__isnull=True).exclude(slug='')
+
+
+def index_state():
+    """
+    (site count, latest site update): enough to page the index and validate caches.
+    """
+    state = listed_sites().aggregate(count=Count('id'), last=Max('updated_at'))
+    return state['count'], state['last']
+
+
+def index_page_count(site_count):
+    return max(1, math.ceil(site_count / SITEMAP_MAX_URLS))
+
+
+def iter_sitemap_index(page, sitemap_url):
+    """
+    One index page: a per-tenant sitemap for each of up to 50k sites, streamed in id order.
+    `sitemap_url(slug)` returns the tenant sitemap location.
+    """
+    start = (page - 1) * SITEMAP_MAX_URLS
+    rows = listed_sites().order_by('id').values_list('slug', 'updated_at')[start:start + SITEMAP_MAX_URLS]
+
+    yield XML_HEADER + f'<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    for slug, updated_at in rows.iterator(chunk_size=SITEMAP_CHUNK_SIZE):
+        yield _entry('sitemap', sitemap_url(slug), updated_at)
+    yield '</sitemapindex>\n'
+
+
+def tenant_sitemap_state(slug):
+    """
+    Returns (tenant_id, site_id, last_modified, etag) for a site's sitemap, or None.
+    Menu edits do not touch the site row, so the menu change log supplies their time.
+    """
+    row = Tenant.objects.filter(site__slug=slug).values_list('id', 'site_id', 'site__updated_at').first()
+    if row is None:
+        return None
+    tenant_id, site_id, updated_at = row
+    menu_changed_at = (
+        MenuChange.objects.filter(tenant_id=tenant_id).order_by('-revision').values_list('changed_at', flat=True).first()
+    )
+    last_modified = max(filter(None, (updated_at, menu_changed_at)))
+    etag = f'"sitemap-{tenant_id}-{get_tenant_generation(tenant_id)}"'
+    return tenant_id, site_id, last_modified, etag
+
+
+def iter_tenant_sitemap(site_id, slug, last_modified, base_url):
+    """
+    The site's pages followed by one URL per available product, capped at 50k URLs.
+    """
+    root = site_url(base_url, slug)
+    products = (
+        Product.unscoped.filter(site_id=site_id, is_available=True)
+        .order_by('id')
+        .values_list('id', 'slug')[:SITEMAP_MAX_URLS - len(SITE_PAGES)]
+    )
+
+    yield XML_HEADER + f'<urlset xmlns="{SITEMAP_NS}">\n'
+    for path in SITE_PAGES:
+        yield _entry('url', f'{root}{path}', last_modified)
+    for product_id, product_slug in products.iterator(chunk_size=SITEMAP_CHUNK_SIZE):
+        yield _entry('url', f'{root}/menu?product={quote(product_slug or str(product_id))}')
+    yield '</urlset>\n'
+
+
+def iter_site_list_json():
+    """
+    The legacy JSON site list ([{slug, updated_at}, ...]) without loading models.
+    """
+    rows = listed_sites().order_by('id').values_list('slug', 'updated_at')
+    yield '['
+    for number, (slug, updated_at) in enumerate(rows.iterator(chunk_size=SITEMAP_CHUNK_SIZE)):
+        item = json.dumps({'slug': slug, 'updated_at': _datetime.to_representation(updated_at)}, ensure_ascii=False)
+        yield item if number == 0 else ',' + item
+    yield ']'
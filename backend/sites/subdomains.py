@@ -0,0 +1,209 @@
+import hashlib
+import math
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from tenants.local_cache import ReloadableSet
+from tenants.pubsub import publish, register_handler
+from tenants.resolver import get_platform_domain
+
+from .models import SubdomainReservation
+
+
+def get_hold_ttl():
+    # Long enough to finish a signup request, short enough that abandoned ones free the name.
+    return getattr(settings, 'SUBDOMAIN_HOLD_TTL', 120)
+
+
+def get_filter_capacity():
+    return getattr(settings, 'SUBDOMAIN_FILTER_CAPACITY', 100000)
+
+
+def normalize_subdomain(value):
+    value = (value or '').strip().lower()
+    suffix = f'.{get_platform_domain()}'
+    if value.endswith(suffix):
+        value = value[: -len(suffix)]
+    return value
+
+
+def is_reserved_name(name):
+    reserved = {item.lower() for item in getattr(settings, 'TENANT_RESERVED_SUBDOMAINS', [])}
+    return name == get_platform_domain() or name in reserved
+
+
+class SubdomainFilter(ReloadableSet):
+    """
+    Per-worker Bloom filter over every reserved subdomain. A miss means the name
+    is free without touching the database; a hit (taken, expired hold or false
+    positive) is confirmed with a query. Loaded with one query, grown by broadcast
+    add events and rebuilt after its TTL, which also drops released names.
+
+    The state is one (bits, size, hashes) tuple, replaced whole on rebuild, so a
+    reader never mixes the bit array of one load with the size of another.
+    """
+
+    def __init__(self, capacity, error_rate=0.01, ttl=300):
+        super().__init__(ttl=ttl)
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+    def _positions(self, name, size, hashes):
+        digest = hashlib.blake2b(name.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % size for i in range(hashes)]
+
+    def build(self):
+        names = list(SubdomainReservation.objects.active().values_list('subdomain', flat=True).iterator())
+        # Leave room to grow between rebuilds.
+        capacity = max(self.capacity, 2 * len(names))
+        size = max(64, math.ceil(-capacity * math.log(self.error_rate) / math.log(2) ** 2))
+        hashes = max(1, round(size / capacity * math.log(2)))
+        return self.patch((bytearray((size + 7) // 8), size, hashes), names)
+
+    def patch(self, state, names):
+        # Setting bits in place is safe: the size and hash count never change within a state.
+        bits, size, hashes = state
+        for name in names:
+            for position in self._positions(name, size, hashes):
+                bits[position >> 3] |= 1 << (position & 7)
+        return state
+
+    def might_contain(self, name):
+        state = self._state
+        if state is None:
+            return True
+        bits, size, hashes = state
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(name, size, hashes))
+
+    def add(self, names):
+        self.apply(list(names))
+
+
+subdomain_filter = SubdomainFilter(
+    get_filter_capacity(), ttl=getattr(settings, 'SUBDOMAIN_FILTER_TTL', 300),
+)
+
+
+register_handler('subdomains', lambda payload: subdomain_filter.add(payload.get('added', [])))
+register_handler('reset', lambda payload: subdomain_filter.invalidate())
+
+
+def _announce(name):
+    transaction.on_commit(lambda: publish('subdomains', added=[name]))
+
+
+def _candidates(names):
+    subdomain_filter.ensure_loaded()
+    return [name for name in names if subdomain_filter.might_contain(name)]
+
+
+def _taken_query(names, site=None):
+    queryset = SubdomainReservation.objects.active().filter(subdomain__in=names)
+    if site is not None:
+        queryset = queryset.exclude(site=site)
+    return queryset.values_list('subdomain', flat=True)
+
+
+def taken_subdomains(names, site=None):
+    """
+    The subset of `names` reserved by anyone other than `site`, in at most one query.
+    """
+    names = _candidates(names)
+    return set(_taken_query(names, site)) if names else set()
+
+
+async def ataken_subdomains(names, site=None):
+    if subdomain_filter.is_stale():
+        await sync_to_async(subdomain_filter.ensure_loaded)()
+    names = [name for name in names if subdomain_filter.might_contain(name)]
+    return {name async for name in _taken_query(names, site)} if names else set()
+
+
+def is_available(name, site=None):
+    return not is_reserved_name(name) and name not in taken_subdomains([name], site)
+
+
+async def ais_available(name, site=None):
+    return not is_reserved_name(name) and name not in await ataken_subdomains([name], site)
+
+
+def suggestion_candidates(name, count):
+    base = slugify(name, allow_unicode=False) or 'site'
+    candidates = []
+    for number in range(2, 2 + count * 3):
+        suffix = f'-{number}'
+        candidates.append(f'{base[:100 - len(suffix)]}{suffix}')
+    return candidates
+
+
+def suggest_subdomains(name, count=5):
+    """
+    Up to `count` free alternatives to `name`, checked together in one query.
+    """
+    candidates = [c for c in suggestion_candidates(name, count) if not is_reserved_name(c)]
+    taken = taken_subdomains(candidates)
+    return [c for c in candidates if c not in taken][:count]
+
+
+async def asuggest_subdomains(name, count=5):
+    candidates = [c for c in suggestion_candidates(name, count) if not is_reserved_name(c)]
+    taken = await ataken_subdomains(candidates)
+    return [c for c in candidates if c not in taken][:count]
+
+
+def hold_subdomain(name, ttl=None):
+    """
+    Reserves a free name for a short while. Returns the hold token, or None when
+    the name is claimed or held by someone else. The unique index makes concurrent
+    holds on one name race safely: exactly one insert or takeover wins.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    expires_at = now + timedelta(seconds=get_hold_ttl() if ttl is None else ttl)
+    try:
+        with transaction.atomic():
+            SubdomainReservation.objects.create(subdomain=name, token=token, expires_at=expires_at)
+    except IntegrityError:
+        # Take over an abandoned hold; anything else means the name is in use.
+        taken_over = SubdomainReservation.objects.filter(
+            subdomain=name, site__isnull=True, expires_at__lte=now,
+        ).update(token=token, expires_at=expires_at)
+        if not taken_over:
+            return None
+    _announce(name)
+    return token
+
+
+def claim_subdomain(name, site, token=None):
+    """
+    Permanently reserves `name` for `site`, converting the caller's hold if given.
+    Returns False when someone else holds or owns the name.
+    """
+    free = Q(site=site) | Q(site__isnull=True, expires_at__lte=timezone.now())
+    if token:
+        free |= Q(token=token)
+    if SubdomainReservation.objects.filter(free, subdomain=name).update(site=site, token='', expires_at=None):
+        return True
+    try:
+        with transaction.atomic():
+            SubdomainReservation.objects.create(subdomain=name, site=site)
+    except IntegrityError:
+        return False
+    _announce(name)
+    return True
+
+
+def release_subdomain(name, site):
+    SubdomainReservation.objects.filter(subdomain=name, site=site).delete()
+
+
+def purge_expired_holds(now=None):
+    return SubdomainReservation.objects.filter(site__isnull=True, expires_at__lte=now or timezone.now()).delete()[0]
@@ -1,8 +1,11 @@
 import time
 from celery import shared_task
-from django.utils import timezone
-from datetime import timedelta
-from .models import Site
+from core.images import refresh_variants
+from tenants.generation import bump_tenant_generation
+from tenants.models import Tenant
+from . import cleanup, subdomains
+from .models import Site, Theme
+from .provisioning import set_stage
 
 @shared_task
 def provision_site_task(site_id):
@@ -12,42 +15,51 @@ def provision_site_task(site_id):
         return f"Site {site_id} not found."
 
     # Stage 1: Optimizing Products
-    site.provisioning_status = 'optimizing_products'
-    site.save()
+    set_stage(site, 'optimizing_products')
 
     # Stage 2: Preparing Settings
-    site.provisioning_status = 'preparing_settings'
-    site.save()
+    set_stage(site, 'preparing_settings')
 
     # Stage 3: Setting Subdomain (Wildcard DNS handles this automatically)
-    site.provisioning_status = 'setting_subdomain'
-    site.save()
+    set_stage(site, 'setting_subdomain')
 
     # Stage 4: Receiving SSL (Handled on-demand by Caddy)
-    site.provisioning_status = 'receiving_ssl'
-    site.save()
+    set_stage(site, 'receiving_ssl')
 
     # Stage 5: Ready
-    site.provisioning_status = 'ready'
-    site.save()
+    set_stage(site, 'ready')
 
     return f"Site {site.subdomain} is ready."
 
 @shared_task
 def delete_expired_sites():
-    now = timezone.now()
-    # Delete sites where trial_ends_at + 2 days < now AND no active subscription
-    expired_sites = Site.objects.filter(
-        trial_ends_at__lt=now - timedelta(days=2),
-        subscription_ends_at__isnull=True
-    ) | Site.objects.filter(
-        trial_ends_at__lt=now - timedelta(days=2),
-        subscription_ends_at__lt=now - timedelta(days=2) # Grace period for paid subscription too
+    deleted, job, finished = cleanup.delete_expired_sites()
+    if not finished:
+        # Out of time for this run; pick up where we left off.
+        delete_expired_sites.apply_async(countdown=60)
+    return (
+        f"Deleted {deleted} expired sites ({job.total_rows} rows in {job.elapsed:.1f}s, "
+        f"{job.rows_per_second:.0f} rows/s): {job.rows}"
     )
-    
-    count = expired_sites.count()
-    # Perform deletion
-    for site in expired_sites:
-        site.delete()
-        
-    return f"Deleted {count} expired sites."
+
+
+@shared_task
+def purge_expired_subdomain_holds():
+    return f"Purged {subdomains.purge_expired_holds()} expired subdomain holds."
+
+
+@shared_task
+def generate_site_image_variants_task(site_id):
+    site = refresh_variants(Site, site_id, Site.IMAGE_FIELDS)
+    if site is None:
+        return f"Site {site_id}: variants up to date."
+    bump_tenant_generation(Tenant.objects.filter(site_id=site_id).values_list('id', flat=True).first())
+    return f"Site {site_id}: variants generated."
+
+
+@shared_task
+def generate_theme_image_variants_task(theme_id):
+    theme = refresh_variants(Theme, theme_id, Theme.IMAGE_FIELDS)
+    if theme is None:
+        return f"Theme {theme_id}: variants up to date."
+    return f"Theme {theme_id}: variants generated."
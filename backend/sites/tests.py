@@ -0,0 +1,614 @@
+import json
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from menu.models import Product, ProductCategory, ProductTag
+from orders.models import Order, OrderItem, Payment
+from tenants.models import Tenant
+from tenants.services import ensure_tenant_for_site
+from . import cleanup
+from .admin import SiteAdmin
+from .models import Plugin, Site, SiteCategory, SitePlugin, SubdomainReservation, Theme
+from .plugin_cache import _local_cache as _plugin_cache
+from .provisioning import publish_progress, state_key
+from .serializers import SiteSerializer
+from .subdomains import (
+    SubdomainFilter, claim_subdomain, hold_subdomain, is_available, subdomain_filter, suggest_subdomains,
+)
+from .services import ThemeService
+from .site_settings import _effective_cache, effective_settings
+from .tasks import provision_site_task
+from .views import SiteCreationProgressStreamView, SitePublicView
+
+User = get_user_model()
+
+
+class SiteTestCase(TestCase):
+    """
+    An authenticated site owner and a site category, with every cache emptied.
+    """
+
+    def setUp(self):
+        cache.clear()
+        _plugin_cache.clear()
+        _effective_cache.clear()
+        subdomain_filter.invalidate()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.client.force_authenticate(self.user)
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+
+
+class SiteSerializerQueryCountTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.menu = Plugin.objects.create(key='menu', name='Menu')
+        self.orders = Plugin.objects.create(key='orders', name='Orders')
+        self.theme = Theme.objects.create(name='Minimal', slug='minimal', category=self.category)
+        self.theme.required_plugins.add(self.menu)
+        self.count = 0
+
+    def add_site(self):
+        self.count += 1
+        site = Site.objects.create(
+            owner=self.user, name=f'Cafe {self.count}', slug=f'cafe-{self.count}',
+            subdomain=f'cafe-{self.count}', category=self.category, theme=self.theme,
+        )
+        ensure_tenant_for_site(site)
+        SitePlugin.objects.create(site=site, plugin=self.menu)
+        SitePlugin.objects.create(site=site, plugin=self.orders, is_active=False)
+        product_category = ProductCategory.objects.create(site=site, name='Drinks')
+        for i in range(self.count):
+            Product.objects.create(site=site, category=product_category, title=f'Item {i}', price=100)
+        return site
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/sites/user-sites/', HTTP_HOST='vofino.ir')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_user_sites_query_count_is_constant(self):
+        self.add_site()
+        single, _ = self.list_queries()
+        for _ in range(3):
+            self.add_site()
+        many, data = self.list_queries()
+
+        self.assertEqual(single, many)
+        self.assertEqual(len(data), 4)
+        site = next(item for item in data if item['slug'] == 'cafe-3')
+        self.assertEqual(site['product_count'], 3)
+        self.assertEqual(site['active_plugins'], ['menu'])
+        self.assertEqual(site['required_plugins'], ['menu'])
+        self.assertEqual(site['theme_name'], 'Minimal')
+        self.assertEqual(site['owner_phone'], '09123456789')
+
+    def test_public_site_query_count(self):
+        site = self.add_site()
+        request = RequestFactory().get(f'/api/sites/site/public/{site.slug}/', HTTP_HOST='vofino.ir')
+        view = SitePublicView.as_view()
+
+        # Tenant id, site with owner/category/theme, active plugins, required plugins.
+        with self.assertNumQueries(4):
+            response = async_to_sync(view)(request, slug=site.slug)
+        self.assertEqual(json.loads(response.content)['product_count'], 1)
+
+
+class SitePluginCacheTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.menu = Plugin.objects.create(key='menu', name='Menu')
+        SitePlugin.objects.create(site=self.site, plugin=self.menu)
+
+    def fresh_site(self):
+        return Site.objects.get(pk=self.site.pk)
+
+    def test_membership_checks_are_cached(self):
+        self.assertTrue(self.fresh_site().is_plugin_active('menu'))
+        site = self.fresh_site()
+        with self.assertNumQueries(0):
+            self.assertTrue(site.is_plugin_active('menu'))
+            self.assertFalse(site.is_plugin_active('orders'))
+            self.assertEqual(site.get_active_plugins(), ['menu'])
+
+        _plugin_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertTrue(site.is_plugin_active('menu'))
+
+    def test_any_site_plugin_write_bumps_the_version(self):
+        self.assertTrue(self.fresh_site().is_plugin_active('menu'))
+        with self.captureOnCommitCallbacks(execute=True):
+            SitePlugin.objects.filter(site=self.site).get().delete()
+        self.assertFalse(self.fresh_site().is_plugin_active('menu'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SitePlugin.objects.create(site=self.site, plugin=self.menu)
+        self.assertTrue(self.fresh_site().is_plugin_active('menu'))
+
+    def test_toggle_and_theme_activation_bump_the_version(self):
+        self.assertTrue(self.fresh_site().is_plugin_active('menu'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/sites/site/toggle-plugin/',
+                {'site_slug': 'my-cafe', 'plugin_key': 'menu', 'is_active': False},
+                format='json',
+                HTTP_HOST='vofino.ir',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.fresh_site().is_plugin_active('menu'))
+
+        orders = Plugin.objects.create(key='orders', name='Orders')
+        theme = Theme.objects.create(name='Shop', slug='shop', category=self.category)
+        theme.required_plugins.add(orders)
+        with self.captureOnCommitCallbacks(execute=True):
+            ThemeService.activate_theme(self.fresh_site(), theme)
+        self.assertEqual(self.fresh_site().get_active_plugins(), ['orders'])
+
+
+class ThemeCatalogTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bakery = SiteCategory.objects.create(name='Bakery', slug='bakery')
+        self.menu = Plugin.objects.create(key='menu', name='Menu')
+        self.minimal = Theme.objects.create(name='Minimal', slug='minimal', category=self.category, site_types=['bakery'])
+        self.minimal.required_plugins.add(self.menu)
+        Theme.objects.create(name='Bread', slug='bread', category=self.bakery)
+        Theme.objects.create(name='Shop', slug='shop', site_types=['store'])
+
+    def themes(self, category):
+        response = self.client.get('/api/sites/themes/', {'category_id': category.id}, HTTP_HOST='vofino.ir')
+        self.assertEqual(response.status_code, 200)
+        return sorted(theme['slug'] for theme in response.data)
+
+    def test_filters_by_primary_category_and_site_types(self):
+        self.assertEqual(self.themes(self.category), ['minimal'])
+        self.assertEqual(self.themes(self.bakery), ['bread', 'minimal'])
+
+        # A category created after the theme that lists it is picked up too.
+        store = SiteCategory.objects.create(name='Store', slug='store')
+        self.assertEqual(self.themes(store), ['shop'])
+
+    def test_catalog_is_cached_until_a_theme_changes(self):
+        self.themes(self.bakery)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.themes(self.bakery), ['bread', 'minimal'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.minimal.site_types = []
+            self.minimal.save()
+        self.assertEqual(self.themes(self.bakery), ['bread'])
+
+
+class SitemapTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        ensure_tenant_for_site(self.site)
+        self.drinks = ProductCategory.objects.create(site=self.site, name='Drinks')
+        Product.objects.create(site=self.site, category=self.drinks, title='Latte', slug='latte', price=100)
+
+    def get(self, path, **headers):
+        return self.client.get(path, HTTP_HOST='vofino.ir', **headers)
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode() if response.streaming else response.content.decode()
+
+    def test_index_lists_tenant_sitemaps(self):
+        response = self.get('/api/sites/sitemap.xml')
+        self.assertEqual(response.status_code, 200)
+        body = self.content(response)
+        self.assertIn('<sitemapindex', body)
+        self.assertIn('http://vofino.ir/api/sites/sitemap/my-cafe.xml', body)
+
+        self.assertEqual(self.get('/api/sites/sitemap.xml', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.get('/api/sites/sitemap.xml?page=2').status_code, 404)
+
+    def test_tenant_sitemap_is_revalidated_until_the_menu_changes(self):
+        response = self.get('/api/sites/sitemap/my-cafe.xml')
+        body = response.content.decode()
+        self.assertIn('https://vofino.ir/preview/my-cafe/menu</loc>', body)
+        self.assertIn('https://vofino.ir/preview/my-cafe/menu?product=latte</loc>', body)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get('/api/sites/sitemap/my-cafe.xml', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(site=self.site, category=self.drinks, title='Mocha', slug='mocha', price=100)
+        response = self.get('/api/sites/sitemap/my-cafe.xml', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('product=mocha', response.content.decode())
+
+    def test_json_site_list_is_unchanged(self):
+        data = json.loads(self.content(self.get('/api/sites/site/sitemap/')))
+        self.assertEqual([item['slug'] for item in data], ['my-cafe'])
+        self.assertTrue(data[0]['updated_at'])
+
+
+class ExpiredSiteCleanupTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.menu = Plugin.objects.create(key='menu', name='Menu')
+        self.expired = self.make_site('old-cafe', trial_days=-5)
+        self.active = self.make_site('new-cafe', trial_days=5)
+
+    def make_site(self, slug, trial_days):
+        site = Site.objects.create(owner=self.user, name=slug, slug=slug, subdomain=slug, category=self.category)
+        Site.objects.filter(pk=site.pk).update(trial_ends_at=timezone.now() + timedelta(days=trial_days))
+        tenant = ensure_tenant_for_site(site)
+        SitePlugin.objects.create(site=site, plugin=self.menu)
+        drinks = ProductCategory.objects.create(site=site, name='Drinks')
+        tag = ProductTag.objects.create(site=site, name='Hot')
+        for i in range(5):
+            product = Product.objects.create(site=site, category=drinks, title=f'Item {i}', price=100)
+            product.tags.add(tag)
+            order = Order.objects.create(
+                site=site, tenant=tenant, first_name='A', last_name='B', phone_number='0912', address='X',
+            )
+            OrderItem.objects.create(order=order, product=product, quantity=1)
+            Payment.objects.create(order=order, provider='zarinpal', amount=100)
+        return site
+
+    def test_deletes_expired_sites_bottom_up_in_batches(self):
+        deleted, job, finished = cleanup.delete_expired_sites(job=cleanup.SiteDeletionJob(batch_size=2, pause=0))
+
+        self.assertEqual((deleted, finished), (1, True))
+        self.assertFalse(Site.objects.filter(pk=self.expired.pk).exists())
+        self.assertFalse(Tenant.objects.filter(site_id=self.expired.pk).exists())
+        self.assertEqual(job.rows['orders.OrderItem'], 5)
+        self.assertEqual(job.rows['menu.Product'], 5)
+        self.assertEqual(Product.unscoped.filter(site=self.active).count(), 5)
+        self.assertEqual(OrderItem.unscoped.filter(order__site=self.active).count(), 5)
+        self.user.refresh_from_db()
+
+    def test_interrupted_run_is_resumed(self):
+        job = cleanup.SiteDeletionJob(batch_size=2, pause=0)
+        orders = Order.unscoped.filter(site=self.expired)
+        job._batched(Order, 'site_id', self.expired.pk, lambda rows: rows._raw_delete(rows.db))
+        self.assertFalse(orders.exists())
+
+        self.assertEqual(cleanup.delete_expired_sites()[0], 1)
+        self.assertEqual(cleanup.delete_expired_sites()[0], 0)
+        self.assertFalse(Payment.unscoped.filter(order__site=self.expired).exists())
+
+
+@override_settings(
+    SITE_PROVISIONING_POLL_INTERVAL=0.01, SITE_PROVISIONING_HEARTBEAT=0.05, SITE_PROVISIONING_STREAM_TIMEOUT=5,
+)
+class SiteProvisioningProgressTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.create(
+            owner=self.user, name='Cafe', slug='cafe-one', subdomain='cafe-one', category=self.category,
+        )
+
+    def stream(self, user, factory=AsyncRequestFactory, **params):
+        request = factory().get(
+            '/api/sites/creation-progress/stream/', params,
+            headers={'authorization': f'Bearer {AccessToken.for_user(user)}'},
+        )
+        return async_to_sync(SiteCreationProgressStreamView.as_view())(request)
+
+    def read_events(self, response, publish=()):
+        """
+        Collects the stream, publishing one queued stage after each event received.
+        """
+        async def collect():
+            events, pending = [], list(publish)
+            async for chunk in response.streaming_content:
+                chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+                if chunk.startswith('event: progress'):
+                    events.append(json.loads(chunk.split('data: ', 1)[1]))
+                    if pending:
+                        publish_progress(self.site.id, self.site.subdomain, pending.pop(0))
+            return events
+
+        return async_to_sync(collect)()
+
+    def test_stages_are_update_fields_transitions(self):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            provision_site_task(self.site.id)
+
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "sites_site"')]
+        self.assertEqual(len(updates), 5)
+        for sql in updates:
+            self.assertIn('SET "provisioning_status"', sql)
+            self.assertNotIn('"name"', sql)
+        self.assertTrue(cache.get(state_key(self.site.id))['is_ready'])
+
+    def test_stream_sends_transitions_until_ready(self):
+        response = self.stream(self.user, site_id=self.site.id)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = self.read_events(response, publish=['preparing_settings', 'ready'])
+        self.assertEqual(
+            [event['current_status'] for event in events],
+            ['optimizing_products', 'preparing_settings', 'ready'],
+        )
+        self.assertEqual([step['status'] for step in events[-1]['steps']], ['completed'] * 5)
+
+    def test_wsgi_falls_back_to_one_event_per_request(self):
+        response = self.stream(self.user, factory=RequestFactory, site_id=self.site.id)
+        self.assertFalse(response.streaming)
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertEqual(json.loads(body.split('data: ', 1)[1])['current_status'], 'optimizing_products')
+
+    def test_ready_site_gets_a_single_event(self):
+        Site.objects.filter(pk=self.site.pk).update(provisioning_status='ready')
+        events = self.read_events(self.stream(self.user))
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0]['is_ready'])
+
+    def test_stream_is_limited_to_the_owner(self):
+        other = User.objects.create_user(username='owner2', phone_number='09120000000', password='password')
+        self.assertEqual(self.stream(other, site_id=self.site.id).status_code, 404)
+
+        request = AsyncRequestFactory().get('/api/sites/creation-progress/stream/')
+        response = async_to_sync(SiteCreationProgressStreamView.as_view())(request)
+        self.assertEqual(response.status_code, 401)
+
+
+class SubdomainReservationTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.theme = Theme.objects.create(name='Minimal', slug='minimal', category=self.category)
+        self.site = Site.objects.create(owner=self.user, name='Taken', slug='taken', subdomain='taken', category=self.category)
+        claim_subdomain('taken', self.site)
+
+    def test_hold_is_exclusive_until_it_expires(self):
+        token = hold_subdomain('cafe')
+        self.assertIsNotNone(token)
+        self.assertIsNone(hold_subdomain('cafe'))
+        self.assertFalse(claim_subdomain('cafe', self.site))
+
+        SubdomainReservation.objects.filter(subdomain='cafe').update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNotNone(hold_subdomain('cafe'))
+        # The original holder lost the name to the takeover.
+        self.assertFalse(claim_subdomain('cafe', self.site, token=token))
+
+    def test_filter_answers_free_names_without_a_query(self):
+        subdomain_filter.load()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_available('never-used'))
+        with self.assertNumQueries(1):
+            self.assertFalse(is_available('taken'))
+        self.assertTrue(is_available('taken', site=self.site))
+        self.assertFalse(is_available('www'))
+
+    def test_filter_rebuild_replaces_the_whole_state(self):
+        names_filter = SubdomainFilter(capacity=1)
+        names_filter.ensure_loaded()
+        before = names_filter._state
+        for number in range(4):
+            claim_subdomain(f'cafe-{number}', self.site)
+        names_filter.invalidate()
+        with self.assertNumQueries(1):
+            names_filter.ensure_loaded()
+            names_filter.ensure_loaded()
+        # Grown past the old size; a reader holding the old tuple still sees a consistent filter.
+        self.assertGreater(names_filter._state[1], before[1])
+        self.assertTrue(all(names_filter.might_contain(f'cafe-{number}') for number in range(4)))
+
+    def test_suggestions_are_checked_in_one_query(self):
+        for name in ('taken-2', 'taken-3'):
+            claim_subdomain(name, self.site)
+        subdomain_filter.load()
+        with self.assertNumQueries(1):
+            self.assertEqual(suggest_subdomains('taken', 3), ['taken-4', 'taken-5', 'taken-6'])
+
+        response = self.client.get('/api/sites/check-subdomain/suggest/', {'subdomain': 'taken', 'count': 2}, HTTP_HOST='vofino.ir')
+        self.assertEqual(response.json()['suggestions'], ['taken-4', 'taken-5'])
+
+    def test_availability_endpoint(self):
+        def available(name):
+            response = self.client.get('/api/sites/check-subdomain/', {'subdomain': name}, HTTP_HOST='vofino.ir')
+            return response.json()['available']
+
+        self.assertFalse(available('taken'))
+        self.assertFalse(available('Taken.vofino.ir'))
+        self.assertTrue(available('fresh'))
+
+    def test_signup_holds_then_claims_the_name(self):
+        def signup(phone, **extra):
+            data = {
+                'phone_number': phone, 'password': 'password', 'site_name': 'My Cafe',
+                'category_id': self.category.id, 'theme_id': self.theme.id, **extra,
+            }
+            return self.client.post('/api/sites/signup/', data, format='json', HTTP_HOST='vofino.ir')
+
+        response = signup('09120000001', subdomain='fresh')
+        self.assertEqual(response.status_code, 201, response.content)
+        reservation = SubdomainReservation.objects.get(subdomain='fresh')
+        self.assertEqual((reservation.token, reservation.expires_at), ('', None))
+        self.assertEqual(reservation.site.subdomain, 'fresh')
+
+        response = signup('09120000002', subdomain='fresh')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('subdomain', response.json())
+
+        # Without a subdomain the site name is used, or the first free alternative.
+        self.assertEqual(signup('09120000003').status_code, 201)
+        self.assertEqual(signup('09120000004').status_code, 201)
+        self.assertTrue(Site.objects.filter(subdomain='my-cafe').exists())
+        self.assertTrue(Site.objects.filter(subdomain='my-cafe-2').exists())
+
+
+    def test_admin_rename_checks_and_releases_the_name(self):
+        other = Site.objects.create(owner=self.user, name='Other', slug='other', subdomain='other', category=self.category)
+        claim_subdomain('other', other)
+        request = RequestFactory().post('/admin/sites/site/')
+        request.user = self.user
+        site_admin = SiteAdmin(Site, admin.site)
+        form_class = site_admin.get_form(request, other, fields=['subdomain'])
+
+        form = form_class(data={'subdomain': 'taken'}, instance=other)
+        self.assertFalse(form.is_valid())
+        self.assertIn('subdomain', form.errors)
+
+        form = form_class(data={'subdomain': 'Renamed.vofino.ir'}, instance=other)
+        self.assertTrue(form.is_valid(), form.errors)
+        site_admin.save_model(request, form.save(commit=False), form, change=True)
+        self.assertEqual(set(other.subdomain_reservations.values_list('subdomain', flat=True)), {'renamed'})
+        self.assertTrue(is_available('other'))
+
+class SiteCreationServiceTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.theme = Theme.objects.create(
+            name='Minimal', slug='minimal', category=self.category, default_settings={'color': 'red'},
+        )
+        self.plugins = [Plugin.objects.create(key=key, name=key) for key in ('menu', 'orders', 'gallery')]
+        self.theme.required_plugins.set(self.plugins)
+
+    def signup(self, phone, subdomain):
+        data = {
+            'phone_number': phone, 'password': 'password', 'site_name': 'My Cafe', 'subdomain': subdomain,
+            'category_id': self.category.id, 'theme_id': self.theme.id,
+        }
+        return self.client.post('/api/sites/signup/', data, format='json', HTTP_HOST='vofino.ir')
+
+    def test_signup_query_count(self):
+        self.signup('09120000001', 'warm-up')
+        subdomain_filter.load()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.signup('09120000002', 'my-cafe')
+        self.assertEqual(response.status_code, 201, response.content)
+        # Category, theme, hold, user, site, claim, plugins, tenant, signup record.
+        statements = [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertLess(len(statements), 15, '\n'.join(statements))
+
+        # Provisioning: the site, then one status update and one tenant lookup per stage.
+        with self.assertNumQueries(11):
+            for callback in callbacks:
+                callback()
+
+        site = Site.objects.get(pk=response.json()['site_id'])
+        self.assertIsNotNone(site.trial_ends_at)
+        self.assertEqual((site.settings, effective_settings(site)), ({}, {'color': 'red'}))
+        self.assertEqual(site.provisioning_status, 'ready')
+        self.assertEqual(Tenant.objects.get(site=site).subdomain, 'my-cafe')
+        self.assertEqual(site.get_active_plugins(), ['gallery', 'menu', 'orders'])
+
+    def test_activate_theme_reactivates_disabled_plugins(self):
+        site = Site.objects.create(owner=self.user, name='Cafe', slug='cafe-one', subdomain='cafe-one', category=self.category)
+        SitePlugin.objects.create(site=site, plugin=self.plugins[0], is_active=False)
+
+        ThemeService.activate_theme(site, self.theme)
+        self.assertEqual(SitePlugin.objects.filter(site=site, is_active=True).count(), 3)
+        site.refresh_from_db()
+        self.assertEqual(site.theme_id, self.theme.id)
+
+
+class SiteSettingsPatchTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.create(
+            owner=self.user, name='Cafe', slug='cafe-one', subdomain='cafe-one', category=self.category,
+            settings={'colors': {'primary': 'red', 'secondary': 'blue'}, 'font': 'Vazir', 'links': [1, 2]},
+        )
+
+    def patch(self, data, **headers):
+        return self.client.patch('/api/sites/site/settings/', data, format='json', HTTP_HOST='vofino.ir', **headers)
+
+    def test_settings_are_merge_patched_with_partial_updates(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch({'settings': {'colors': {'primary': 'green'}, 'font': None, 'links': [3]}})
+        self.assertEqual(response.status_code, 200)
+
+        self.site.refresh_from_db()
+        self.assertEqual(self.site.settings, {'colors': {'primary': 'green', 'secondary': 'blue'}, 'links': [3]})
+        self.assertEqual(self.site.settings_version, 2)
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "sites_site"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"logo"', updates[0])
+        self.assertNotIn('"name"', updates[0])
+
+    def test_unchanged_patch_does_not_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch({'settings': {'font': 'Vazir'}, 'name': 'Cafe'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE "sites_site"')])
+
+    def test_if_match_rejects_stale_versions(self):
+        etag = self.client.get('/api/sites/site/me/', HTTP_HOST='vofino.ir')['ETag']
+        self.assertEqual(self.patch({'settings': {'font': 'Sahel'}}, HTTP_IF_MATCH=etag).status_code, 200)
+
+        # A second tab still holding the old tag.
+        response = self.patch({'settings': {'font': 'Tahoma'}}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.json()['settings_version'], 2)
+        self.site.refresh_from_db()
+        self.assertEqual(self.site.settings['font'], 'Sahel')
+
+        response = self.patch({'settings': {'font': 'Tahoma'}}, HTTP_IF_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['settings_version'], 3)
+
+
+class EffectiveSettingsTest(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.theme = Theme.objects.create(
+            name='Minimal', slug='minimal', category=self.category,
+            default_settings={'colors': {'primary': 'red', 'secondary': 'blue'}, 'font': 'Vazir'},
+        )
+        self.site = Site.objects.create(
+            owner=self.user, name='Cafe', slug='cafe-one', subdomain='cafe-one', category=self.category,
+            theme=self.theme, settings={'colors': {'primary': 'green'}},
+        )
+
+    def test_theme_defaults_are_deep_merged_and_memoized(self):
+        expected = {'colors': {'primary': 'green', 'secondary': 'blue'}, 'font': 'Vazir'}
+        self.assertEqual(effective_settings(self.site), expected)
+        self.assertIs(effective_settings(self.site), effective_settings(self.site))
+
+        # A theme-wide default change is one row write and reaches every site.
+        self.theme.default_settings = {**self.theme.default_settings, 'font': 'Sahel'}
+        self.theme.save()
+        self.assertEqual(self.theme.settings_version, 2)
+        site = Site.objects.select_related('theme').get(pk=self.site.pk)
+        self.assertEqual(effective_settings(site)['font'], 'Sahel')
+
+    def test_patch_stores_only_overrides(self):
+        response = self.client.patch(
+            '/api/sites/site/settings/',
+            {'settings': {'colors': {'secondary': 'blue', 'accent': 'gold'}, 'font': 'Vazir'}},
+            format='json', HTTP_HOST='vofino.ir',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['settings'],
+            {'colors': {'primary': 'green', 'secondary': 'blue', 'accent': 'gold'}, 'font': 'Vazir'},
+        )
+        self.site.refresh_from_db()
+        self.assertEqual(self.site.settings, {'colors': {'primary': 'green', 'accent': 'gold'}})
+
+    def test_every_settings_write_moves_the_version(self):
+        expected = effective_settings(self.site)
+        serializer = SiteSerializer(self.site, data={'settings': {'font': 'Sahel'}}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(self.site.settings_version, 2)
+        self.assertEqual(effective_settings(self.site)['font'], 'Sahel')
+        self.assertNotEqual(effective_settings(self.site), expected)
+
+        # Saves that leave settings alone keep the version, and so the If-Match tag.
+        self.site.name = 'Renamed'
+        self.site.save()
+        self.site.save(update_fields=['settings'])
+        self.site.refresh_from_db()
+        self.assertEqual(self.site.settings_version, 2)
@@ -14,8 +14,12 @@ from .views import (
     SitePluginToggleView,
     DebugSlugsView,
     SiteSitemapListView,
+    SitemapIndexView,
+    TenantSitemapView,
     SubdomainAvailabilityView,
-    SiteCreationProgressView
+    SubdomainSuggestionView,
+    SiteCreationProgressView,
+    SiteCreationProgressStreamView,
 )
 
 urlpatterns = [
@@ -31,8 +35,12 @@ urlpatterns = [
     re_path(r'^site/create/?$', SiteCreateView.as_view(), name='site-create'),
     re_path(r'^site/settings/?$', SiteSettingsUpdateView.as_view(), name='site-settings-update'),
     re_path(r'^site/sitemap/?$', SiteSitemapListView.as_view(), name='site-sitemap'),
+    re_path(r'^sitemap\.xml$', SitemapIndexView.as_view(), name='sitemap-index'),
+    re_path(r'^sitemap/(?P<slug>[^/]+)\.xml$', TenantSitemapView.as_view(), name='tenant-sitemap'),
     re_path(r'^check-subdomain/?$', SubdomainAvailabilityView.as_view(), name='check-subdomain'),
+    re_path(r'^check-subdomain/suggest/?$', SubdomainSuggestionView.as_view(), name='suggest-subdomain'),
     re_path(r'^creation-progress/?$', SiteCreationProgressView.as_view(), name='creation-progress'),
+    re_path(r'^creation-progress/stream/?$', SiteCreationProgressStreamView.as_view(), name='creation-progress-stream'),
     re_path(r'^debug-slugs/?$', DebugSlugsView.as_view(), name='debug-slugs'),
     re_path(r'^site/public/(?P<slug>[^/]+)/?$', SitePublicView.as_view(), name='site-public'),
 ]
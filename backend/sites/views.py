@@ -1,55 +1,93 @@
-from rest_framework import generics, status, permissions
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions, generics, serializers, status, permissions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from django.shortcuts import redirect
-from django.http import Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.db import transaction
-from django.conf import settings
 from django.views import View
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.core.cache import cache
 from .models import SiteCategory, Theme, Site, Plugin, SitePlugin
 from .serializers import (
     SiteCategorySerializer, ThemeSerializer, SiteSerializer, 
     SignupSerializer, PluginSerializer, SitePluginSerializer
 )
-from .services import ThemeService
+from .catalog import aget_catalog_version, catalog_cache_key, get_catalog_ttl
+from .provisioning import progress_payload, single_event, stream_progress
+from .services import SiteCreationService, SubdomainTakenError, ThemeService
+from .site_settings import (
+    effective_settings,
+    if_match_satisfied,
+    merge_patch,
+    parse_settings_patch,
+    settings_etag,
+    settings_overrides,
+    theme_defaults,
+)
+from .subdomains import ais_available, asuggest_subdomains, is_reserved_name, normalize_subdomain
+from .sitemaps import (
+    get_base_url,
+    index_page_count,
+    index_state,
+    iter_site_list_json,
+    iter_sitemap_index,
+    iter_tenant_sitemap,
+    tenant_sitemap_state,
+)
 from tenants.models import Tenant
-from tenants.resolver import resolve_tenant_from_host
-from tenants.services import ensure_tenant_for_site
+from tenants.generation import atenant_cache_key, get_view_cache_ttl, tenant_cache_key
+from tenants.hostset import ais_known_host
+from core.http import client_ip, json_response
 
 class PluginListView(generics.ListAPIView):
     queryset = Plugin.objects.filter(is_usable=True)
     serializer_class = PluginSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = None
 
 class SiteCategoryListView(generics.ListAPIView):
     queryset = SiteCategory.objects.filter(is_active=True)
     serializer_class = SiteCategorySerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = None
 
 class ThemeListView(generics.ListAPIView):
+    """
+    Active themes, optionally for one site category (`?category_id=`).
+    Responses are cached per host and category until a theme, category or plugin changes.
+    """
     serializer_class = ThemeSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = None
 
     def get_queryset(self):
-        queryset = Theme.objects.filter(is_active=True)
-        category_id = self.request.query_params.get('category_id')
+        queryset = Theme.objects.filter(is_active=True).select_related('category').prefetch_related('required_plugins')
+        category_id = self.get_category_id()
         if category_id:
-            try:
-                category = SiteCategory.objects.get(id=category_id)
-                # Filter in Python to avoid "contains lookup is not supported" on SQLite
-                all_themes = list(queryset)
-                filtered_ids = [
-                    theme.id for theme in all_themes 
-                    if theme.category_id == int(category_id) or category.slug in (theme.site_types or [])
-                ]
-                queryset = Theme.objects.filter(id__in=filtered_ids)
-            except SiteCategory.DoesNotExist:
-                queryset = queryset.filter(category_id=category_id)
-            except (ValueError, TypeError):
-                pass
+            queryset = queryset.filter(supported_categories=category_id)
         return queryset
 
+    def get_category_id(self):
+        try:
+            return int(self.request.query_params.get('category_id') or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def list(self, request, *args, **kwargs):
+        cache_key = catalog_cache_key(request.get_host(), self.get_category_id())
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.get_serializer(self.get_queryset(), many=True).data
+            cache.set(cache_key, data, get_catalog_ttl())
+        return Response(data)
+
 class ThemeDetailView(generics.RetrieveAPIView):
     queryset = Theme.objects.filter(is_active=True)
     serializer_class = ThemeSerializer
@@ -66,15 +104,16 @@ class SignupView(generics.CreateAPIView):
         return Response({
             "user_id": site.owner.id,
             "site_id": site.id,
-            "tokens": serializer.data.get("tokens")
+            "tokens": serializer.get_tokens(site)
         }, status=status.HTTP_201_CREATED)
 
 class UserSiteListView(generics.ListAPIView):
     serializer_class = SiteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
-        return self.request.user.sites.all()
+        return self.request.user.sites.with_profile()
 
 class SiteMeView(generics.RetrieveAPIView):
     serializer_class = SiteSerializer
@@ -84,88 +123,88 @@ class SiteMeView(generics.RetrieveAPIView):
         slug = self.request.query_params.get('slug')
         if slug:
             try:
-                return self.request.user.sites.get(slug=slug)
+                return self.request.user.sites.with_profile().get(slug=slug)
             except Site.DoesNotExist:
                 return None
-        return self.request.user.sites.first()
+        return self.request.user.sites.with_profile().first()
 
     def get(self, request, *args, **kwargs):
         instance = self.get_object()
         if not instance:
             return Response({"detail": "No site found for this user."}, status=status.HTTP_404_NOT_FOUND)
         serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        # Sent back as If-Match on settings updates.
+        return Response(serializer.data, headers={'ETag': settings_etag(instance)})
 
 class SiteCreateView(generics.CreateAPIView):
     serializer_class = SiteSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    @transaction.atomic
     def perform_create(self, serializer):
-        # Get data from validated_data or request.data
-        validated_data = serializer.validated_data
-        
+        fields = dict(serializer.validated_data)
+        name = fields.pop('name')
+        fields.pop('slug', None)
+
         # Handle subdomain and slug
-        subdomain = validated_data.get('subdomain', self.request.data.get('subdomain'))
+        subdomain = fields.pop('subdomain', None) or self.request.data.get('subdomain')
         if not subdomain:
             from django.utils.text import slugify
-            name = validated_data.get('name', self.request.data.get('name'))
             subdomain = slugify(name, allow_unicode=True)
-            
-        # Get theme default settings and merge with provided settings
-        theme = validated_data.get('theme')
-        site_settings = {}
-        if theme:
-            site_settings = theme.default_settings.copy()
-        
-        # Update with any settings provided in the request
-        request_settings = validated_data.get('settings', {})
-        if isinstance(request_settings, dict):
-            site_settings.update(request_settings)
-
-        site = serializer.save(
-            owner=self.request.user, 
-            subdomain=subdomain,
-            slug=subdomain, # Sync slug for now
-            settings=site_settings,
-            theme=theme,
-            provisioning_status='optimizing_products'
-        )
-        ensure_tenant_for_site(site)
-        
-        # Create UserSubdomain record and save user IP
-        from .models import UserSubdomain
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-            
-        UserSubdomain.objects.create(
-            subdomain=subdomain,
-            site=site,
-            user_ip=ip
-        )
-        
-        # Trigger the provisioning task
-        from .tasks import provision_site_task
-        provision_site_task.delay(site.id)
 
-class SitePublicView(generics.RetrieveAPIView):
-    queryset = Site.objects.select_related('theme').all()
-    serializer_class = SiteSerializer
-    permission_classes = [permissions.AllowAny]
-    lookup_field = 'slug'
-
-    def get_object(self):
-        tenant = getattr(self.request, 'tenant', None)
+        try:
+            serializer.instance = SiteCreationService.create_site(
+                self.request.user,
+                name=name,
+                subdomain=subdomain,
+                category=fields.pop('category'),
+                theme=fields.pop('theme', None),
+                settings=fields.pop('settings', None),
+                user_ip=client_ip(self.request),
+                **fields,
+            )
+        except SubdomainTakenError:
+            raise serializers.ValidationError({'subdomain': 'Subdomain is already taken.'})
+
+class SitePublicView(View):
+    """
+    Public site profile. Async so ASGI workers serve it without a thread hop.
+    """
+
+    async def get_object(self, request, slug):
+        queryset = Site.objects.with_profile()
+        tenant = getattr(request, 'tenant', None)
         if tenant and tenant.site_id:
-            return tenant.site
-        return super().get_object()
+            return await queryset.filter(pk=tenant.site_id).afirst()
+        return await queryset.filter(slug=slug).afirst()
 
-    @method_decorator(cache_page(60 * 15)) # Cache for 15 minutes
-    def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
+    async def get_tenant_id(self, request, slug):
+        tenant = getattr(request, 'tenant', None)
+        if tenant and tenant.site_id:
+            return tenant.id
+        return await Tenant.objects.filter(site__slug=slug).values_list('id', flat=True).afirst()
+
+    async def get(self, request, slug=None):
+        # Keyed by tenant generation so site edits show up immediately, and by the
+        # theme catalog version since theme defaults feed the effective settings.
+        tenant_id = await self.get_tenant_id(request, slug)
+        cache_key = None
+        if tenant_id:
+            cache_key = await atenant_cache_key(
+                tenant_id, 'site-public', request.get_host(), slug or '', await aget_catalog_version(),
+            )
+            data = await cache.aget(cache_key)
+            if data is not None:
+                return json_response(data)
+
+        site = await self.get_object(request, slug)
+        if site is None:
+            return json_response({"detail": "Not found."}, status=404)
+
+        # Everything the serializer reads is preloaded; the hop guards any lazy access left.
+        data = await sync_to_async(lambda: SiteSerializer(site, context={'request': request}).data)()
+        if cache_key:
+            await cache.aset(cache_key, data, get_view_cache_ttl())
+        return json_response(data)
 
 class SiteActivePluginsView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -237,18 +276,72 @@ class DebugSlugsView(generics.GenericAPIView):
     def get(self, request):
         return Response([(s.name, s.slug) for s in Site.objects.all()])
 
-class SiteSitemapListView(generics.ListAPIView):
-    queryset = Site.objects.all()
-    serializer_class = SiteSerializer
-    permission_classes = [permissions.AllowAny]
+class SiteSitemapListView(View):
+    """
+    JSON list of public sites for the frontend sitemap, streamed from a values_list.
+    """
 
-    def list(self, request, *args, **kwargs):
-        sites = self.get_queryset()
-        data = [{
-            'slug': site.slug,
-            'updated_at': site.updated_at
-        } for site in sites if site.slug]
-        return Response(data)
+    def get(self, request):
+        return StreamingHttpResponse(iter_site_list_json(), content_type='application/json')
+
+
+class SitemapIndexView(View):
+    """
+    XML sitemap index of per-tenant sitemaps, 50k per page (`?page=`).
+    """
+
+    def get(self, request):
+        try:
+            page = int(request.GET.get('page') or 1)
+        except ValueError:
+            raise Http404
+        count, last_modified = index_state()
+        if not 1 <= page <= index_page_count(count):
+            raise Http404
+
+        etag = f'"sitemap-index-{page}-{count}-{int(last_modified.timestamp()) if last_modified else 0}"'
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        template = request.build_absolute_uri(reverse('tenant-sitemap', kwargs={'slug': '__slug__'}))
+        response = StreamingHttpResponse(
+            iter_sitemap_index(page, lambda slug: template.replace('__slug__', quote(slug))),
+            content_type='application/xml; charset=utf-8',
+        )
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class TenantSitemapView(View):
+    """
+    A site's pages and products. Rendered once per tenant generation and
+    revalidated with ETag/Last-Modified.
+    """
+
+    def get(self, request, slug):
+        state = tenant_sitemap_state(slug)
+        if state is None:
+            raise Http404
+        tenant_id, site_id, last_modified, etag = state
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+        if not_modified is not None:
+            return not_modified
+
+        base_url = get_base_url()
+        cache_key = tenant_cache_key(tenant_id, 'sitemap', base_url)
+        body = cache.get(cache_key)
+        if body is None:
+            body = ''.join(iter_tenant_sitemap(site_id, slug, last_modified, base_url)).encode()
+            cache.set(cache_key, body, get_view_cache_ttl())
+
+        response = HttpResponse(body, content_type='application/xml; charset=utf-8')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
 
 class SiteSettingsUpdateView(generics.UpdateAPIView):
     serializer_class = SiteSerializer
@@ -258,19 +351,32 @@ class SiteSettingsUpdateView(generics.UpdateAPIView):
     def get_object(self):
         # We can pass slug in query params or it might be in the request data
         slug = self.request.query_params.get('slug') or self.request.data.get('slug')
+        # Locked so the If-Match check and the write see the same settings version.
+        sites = self.request.user.sites.select_for_update()
         if slug:
             try:
-                return self.request.user.sites.get(slug=slug)
+                return sites.get(slug=slug)
             except Site.DoesNotExist:
                 return None
-        return self.request.user.sites.first()
+        return sites.first()
 
     @transaction.atomic
     def patch(self, request, *args, **kwargs):
         instance = self.get_object()
         if not instance:
             return Response({"detail": "No site found for this user."}, status=status.HTTP_404_NOT_FOUND)
-        
+
+        if not if_match_satisfied(request.headers.get('If-Match'), settings_etag(instance)):
+            return Response(
+                {"detail": "Site settings were changed elsewhere; reload and retry.",
+                 "settings_version": instance.settings_version},
+                status=status.HTTP_412_PRECONDITION_FAILED,
+                headers={'ETag': settings_etag(instance)},
+            )
+
+        changed = set()
+        previous_theme_id = instance.theme_id
+
         # 1. Handle Theme Update
         theme_id = request.data.get('theme_id')
         if theme_id:
@@ -283,95 +389,87 @@ class SiteSettingsUpdateView(generics.UpdateAPIView):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                # Use ThemeService to activate theme and plugins
+                # Use ThemeService to activate theme and plugins; its defaults apply through effective settings.
                 ThemeService.activate_theme(instance, new_theme)
-                
-                # Merge new theme default settings with existing settings
-                if isinstance(new_theme.default_settings, dict) and isinstance(instance.settings, dict):
-                    merged_settings = new_theme.default_settings.copy()
-                    merged_settings.update(instance.settings)
-                    instance.settings = merged_settings
-                else:
-                    instance.settings = new_theme.default_settings
             except Theme.DoesNotExist:
                 return Response({"detail": "Theme not found or inactive."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 2. Handle Settings Update
-        settings_data = request.data.get('settings')
-        if settings_data is not None:
-            if isinstance(settings_data, str):
-                import json
-                try:
-                    settings_data = json.loads(settings_data)
-                except json.JSONDecodeError:
-                    pass
-            instance.settings = settings_data
-            
+        # 2. Handle Settings Update: an RFC 7396 merge patch of the effective settings,
+        # stored as the overrides left after removing the theme defaults.
+        settings_patch = request.data.get('settings')
+        if settings_patch is not None:
+            merged = merge_patch(effective_settings(instance), parse_settings_patch(settings_patch))
+            site_settings = settings_overrides(theme_defaults(instance), merged)
+            if site_settings != instance.settings:
+                instance.settings = site_settings
+                changed.add('settings')
+
+        if instance.theme_id != previous_theme_id and not changed:
+            # Only the defaults side moved; save() bumps the version for stored settings.
+            instance.settings_version += 1
+            changed.add('settings_version')
+
         # 3. Handle General Info Update
         name = request.data.get('name')
-        if name:
+        if name and name != instance.name:
             instance.name = name
+            changed.add('name')
 
         # 4. Handle SEO Fields Update
-        meta_title = request.data.get('meta_title')
-        if meta_title is not None:
-            instance.meta_title = meta_title
-            
-        meta_description = request.data.get('meta_description')
-        if meta_description is not None:
-            instance.meta_description = meta_description
-            
-        schema_type = request.data.get('schema_type')
-        if schema_type is not None:
-            instance.schema_type = schema_type
+        for field in ('meta_title', 'meta_description', 'schema_type'):
+            value = request.data.get(field)
+            if value is not None and value != getattr(instance, field):
+                setattr(instance, field, value)
+                changed.add(field)
+
+        # 5. Handle Logo and Cover Image Update
+        for field in Site.IMAGE_FIELDS:
+            upload = request.FILES.get(field)
+            if upload:
+                setattr(instance, field, upload)
+                changed.add(field)
+
+        if changed:
+            instance.save(update_fields=sorted(changed | {'updated_at'}))
+        return Response(self.get_serializer(instance).data, headers={'ETag': settings_etag(instance)})
+
+class SubdomainAvailabilityView(View):
+    async def get(self, request, *args, **kwargs):
+        value = request.GET.get('subdomain') or request.GET.get('slug') or request.GET.get('domain')
+        if not value:
+            return json_response({"error": "Subdomain is required"}, status=400)
 
-        # 5. Handle Logo Update
-        logo = request.FILES.get('logo')
-        if logo:
-            instance.logo = logo
+        value = value.strip().lower()
+        is_caddy_ask = 'domain' in request.GET
 
-        # 6. Handle Cover Image Update
-        cover_image = request.FILES.get('cover_image')
-        if cover_image:
-            instance.cover_image = cover_image
+        if is_caddy_ask:
+            # Legacy ask path; Caddy now calls TLSAskMiddleware directly.
+            if await ais_known_host(value):
+                return HttpResponse(status=200)
+            return HttpResponse(status=404)
 
-        instance.save()
-        return Response(self.get_serializer(instance).data)
+        value = normalize_subdomain(value)
+        if is_reserved_name(value):
+            return json_response({"available": False, "reserved": True}, status=200)
 
-class SubdomainAvailabilityView(generics.GenericAPIView):
-    permission_classes = [permissions.AllowAny]
+        return json_response({"available": await ais_available(value)})
 
-    def get(self, request, *args, **kwargs):
-        value = request.query_params.get('subdomain') or request.query_params.get('slug') or request.query_params.get('domain')
-        if not value:
-            return Response({"error": "Subdomain is required"}, status=400)
+class SubdomainSuggestionView(View):
+    """
+    Free alternatives to a requested subdomain, checked in a single query.
+    """
+    max_count = 20
 
-        value = value.strip().lower()
-        is_caddy_ask = 'domain' in request.query_params
+    async def get(self, request, *args, **kwargs):
+        value = normalize_subdomain(request.GET.get('subdomain') or request.GET.get('name'))
+        if not value:
+            return json_response({"error": "Subdomain is required"}, status=400)
+        try:
+            count = min(max(int(request.GET.get('count', 5)), 1), self.max_count)
+        except ValueError:
+            return json_response({"error": "count must be an integer"}, status=400)
 
-        if is_caddy_ask:
-            tenant, is_control_plane = resolve_tenant_from_host(value)
-            if tenant or is_control_plane:
-                return Response(status=200)
-            return Response(status=404)
-
-        if value.endswith(f".{settings.PLATFORM_DOMAIN}"):
-            value = value[: -(len(settings.PLATFORM_DOMAIN) + 1)]
-
-        if value == settings.PLATFORM_DOMAIN:
-            return Response({"available": False, "reserved": True}, status=200)
-
-        reserved = {item.lower() for item in settings.TENANT_RESERVED_SUBDOMAINS}
-        if value.lower() in reserved:
-            return Response({"available": False, "reserved": True}, status=200)
-
-        from .models import UserSubdomain
-        normalized = value.lower()
-        is_available = (
-            not Tenant.objects.filter(subdomain=normalized).exists()
-            and not UserSubdomain.objects.filter(subdomain=normalized).exists()
-        )
-        return Response({"available": is_available})
+        return json_response({"subdomain": value, "suggestions": await asuggest_subdomains(value, count)})
 
 class SiteCreationProgressView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -389,31 +487,52 @@ class SiteCreationProgressView(generics.GenericAPIView):
         if not site:
             return Response({"detail": "No site found."}, status=404)
 
-        status_map = {
-            'optimizing_products': 1,
-            'preparing_settings': 2,
-            'setting_subdomain': 3,
-            'receiving_ssl': 4,
-            'ready': 5,
-        }
-        
-        current_step_idx = status_map.get(site.provisioning_status, 1)
-        
-        steps = [
-            {"id": 1, "label": "در حال بهینه‌سازی محصولات", "status": "completed" if current_step_idx > 1 else ("in_progress" if current_step_idx == 1 else "pending")},
-            {"id": 2, "label": "در حال آماده‌سازی تنظیمات سایت", "status": "completed" if current_step_idx > 2 else ("in_progress" if current_step_idx == 2 else "pending")},
-            {"id": 3, "label": "در حال ست کردن سابدامین", "status": "completed" if current_step_idx > 3 else ("in_progress" if current_step_idx == 3 else "pending")},
-            {"id": 4, "label": "در حال دریافت و فعال‌سازی SSL", "status": "completed" if current_step_idx > 4 else ("in_progress" if current_step_idx == 4 else "pending")},
-            {"id": 5, "label": "سایت آماده است", "status": "completed" if current_step_idx == 5 else "pending"},
-        ]
-        
-        return Response({
-            "site_id": site.id,
-            "current_status": site.provisioning_status,
-            "subdomain": site.subdomain,
-            "steps": steps,
-            "is_ready": site.provisioning_status == 'ready'
-        })
+        return Response(progress_payload(site.id, site.subdomain, site.provisioning_status))
+
+
+class SiteCreationProgressStreamView(View):
+    """
+    Server-Sent Events twin of SiteCreationProgressView: sends the current stage,
+    then each transition as provision_site_task publishes it, and closes once the
+    site is ready. Clients read it with fetch() so the bearer token can be sent.
+    Each open stream is a coroutine under ASGI rather than a polling worker.
+
+    Under WSGI the worker would buffer the whole stream and stay blocked until it
+    ends, so there the view answers like SiteCreationProgressView instead: one
+    event with a `retry` hint, and the client reconnects to poll.
+    """
+
+    async def authenticate(self, request):
+        drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            return await sync_to_async(lambda: drf_request.user)()
+        except exceptions.APIException:
+            return None
+
+    async def get(self, request):
+        user = await self.authenticate(request)
+        if user is None or not user.is_authenticated:
+            return json_response({"detail": "Authentication credentials were not provided."}, status=401)
+
+        sites = Site.objects.filter(owner=user)
+        site_id = request.GET.get('site_id')
+        if site_id:
+            if not site_id.isdigit():
+                return json_response({"detail": "Site not found."}, status=404)
+            sites = sites.filter(id=site_id)
+        row = await sites.order_by('id').values_list('id', 'subdomain', 'provisioning_status').afirst()
+        if row is None:
+            return json_response({"detail": "Site not found." if site_id else "No site found."}, status=404)
+
+        payload = progress_payload(*row)
+        if isinstance(request, ASGIRequest):
+            response = StreamingHttpResponse(stream_progress(payload), content_type='text/event-stream')
+        else:
+            response = HttpResponse(single_event(payload), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep nginx from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
 class SiteRedirectView(View):
     def get(self, request, slug):
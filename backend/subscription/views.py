@@ -14,6 +14,7 @@ class PlanListView(generics.ListAPIView):
     serializer_class = PlanSerializer
     permission_classes = [AllowAny]
     authentication_classes = []
+    pagination_class = None
 
 class SubscriptionMeView(views.APIView):
     permission_classes = [AllowAny]
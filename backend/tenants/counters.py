@@ -0,0 +1,44 @@
+import time
+
+from django.core.cache import cache
+
+
+def _seed():
+    # A fresh counter must never reuse a number an evicted counter already handed out.
+    return time.time_ns() // 1000
+
+
+def get_counter(key) -> int:
+    """
+    Current value of a version counter kept in the shared cache, seeding it on
+    first read. Returns 0 when the cache is unavailable.
+    """
+    try:
+        value = cache.get(key)
+        if value is None:
+            cache.add(key, _seed(), timeout=None)
+            value = cache.get(key)
+    except Exception:
+        return 0
+    return value or 0
+
+
+async def aget_counter(key) -> int:
+    try:
+        value = await cache.aget(key)
+        if value is None:
+            await cache.aadd(key, _seed(), timeout=None)
+            value = await cache.aget(key)
+    except Exception:
+        return 0
+    return value or 0
+
+
+def bump_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), timeout=None)
+    except Exception:
+        # Do not fail writes if cache backend is unavailable.
+        pass
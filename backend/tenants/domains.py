@@ -0,0 +1,14 @@
+def canonicalize_domain(value) -> str:
+    """
+    Canonical hostname form used for storage and lookups:
+    lowercase, IDNA (punycode) labels, no port, no trailing dot.
+    """
+    if not value:
+        return ""
+    host = value.strip().split(":")[0].rstrip(".").lower()
+    if not host or host.isascii():
+        return host
+    try:
+        return host.encode("idna").decode("ascii")
+    except UnicodeError:
+        return host
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .counters import aget_counter, bump_counter, get_counter
+
+
+def _generation_key(tenant_id) -> str:
+    return f"tenant:gen:{tenant_id}"
+
+
+def _tenant_id(tenant):
+    return getattr(tenant, "pk", tenant)
+
+
+def get_view_cache_ttl():
+    return getattr(settings, "TENANT_VIEW_CACHE_TTL", 60 * 15)
+
+
+def get_tenant_generation(tenant) -> int:
+    return get_counter(_generation_key(_tenant_id(tenant)))
+
+
+async def aget_tenant_generation(tenant) -> int:
+    return await aget_counter(_generation_key(_tenant_id(tenant)))
+
+
+def get_with_generation(tenant, key):
+    """
+    Reads `key` together with the tenant's generation in one round trip.
+    Returns (generation, value).
+    """
+    gen_key = _generation_key(_tenant_id(tenant))
+    try:
+        found = cache.get_many([gen_key, key])
+    except Exception:
+        return 0, None
+    if gen_key not in found:
+        return get_tenant_generation(tenant), None
+    return found[gen_key], found.get(key)
+
+
+async def aget_with_generation(tenant, key):
+    gen_key = _generation_key(_tenant_id(tenant))
+    try:
+        found = await cache.aget_many([gen_key, key])
+    except Exception:
+        return 0, None
+    if gen_key not in found:
+        return await aget_tenant_generation(tenant), None
+    return found[gen_key], found.get(key)
+
+
+def tenant_cache_key(tenant, *parts) -> str:
+    """
+    Cache key for anything derived from a tenant's data.
+    Bumping the tenant's generation orphans every such key at once.
+    """
+    tenant_id = _tenant_id(tenant)
+    return ":".join([f"tenant:{tenant_id}:g{get_tenant_generation(tenant_id)}", *map(str, parts)])
+
+
+async def atenant_cache_key(tenant, *parts) -> str:
+    tenant_id = _tenant_id(tenant)
+    return ":".join([f"tenant:{tenant_id}:g{await aget_tenant_generation(tenant_id)}", *map(str, parts)])
+
+
+def _bump(tenant_id):
+    bump_counter(_generation_key(tenant_id))
+
+
+def bump_tenant_generation(tenant):
+    """
+    Invalidates every generation-keyed cache entry of a tenant in O(1).
+    Bumps again on commit so readers cannot re-cache pre-commit rows.
+    """
+    tenant_id = _tenant_id(tenant)
+    if not tenant_id:
+        return
+    _bump(tenant_id)
+    transaction.on_commit(lambda: _bump(tenant_id))
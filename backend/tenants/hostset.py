@@ -0,0 +1,91 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .models import Tenant
+from .domains import canonicalize_domain
+from .local_cache import ReloadableSet
+from .pubsub import publish, register_handler
+from .resolver import get_control_plane_hosts, get_platform_domain, normalize_host
+
+
+def tenant_hosts(subdomain, custom_domain):
+    """
+    All hostnames a tenant is reachable on.
+    """
+    hosts = []
+    if subdomain:
+        hosts.append(f"{subdomain}.{get_platform_domain()}".lower())
+    if custom_domain:
+        hosts.append(canonicalize_domain(custom_domain))
+    return hosts
+
+
+class HostSet(ReloadableSet):
+    """
+    Per-worker membership set of every valid tenant host.
+    Loaded with one query, then kept current by broadcast add/remove events.
+    A periodic full reload bounds drift if an event is ever missed.
+    """
+
+    def build(self):
+        hosts = set()
+        for subdomain, custom_domain in Tenant.objects.values_list("subdomain", "custom_domain").iterator():
+            hosts.update(tenant_hosts(subdomain, custom_domain))
+        return hosts
+
+    def patch(self, hosts, event):
+        added, removed = event
+        hosts.difference_update(removed)
+        hosts.update(added)
+        return hosts
+
+    def contains(self, host):
+        hosts = self._state
+        return hosts is not None and host in hosts
+
+
+host_set = HostSet(ttl=getattr(settings, "TENANT_HOST_SET_TTL", 300))
+
+
+def is_known_host(raw_host) -> bool:
+    """
+    Membership check for TLS issuance. Loads the set on first use or after its TTL.
+    """
+    host = normalize_host(raw_host)
+    if not host:
+        return False
+    host_set.ensure_loaded()
+    return host_set.contains(host) or host in get_control_plane_hosts()
+
+
+async def ais_known_host(raw_host) -> bool:
+    host = normalize_host(raw_host)
+    if not host:
+        return False
+    if host_set.is_stale():
+        await sync_to_async(host_set.ensure_loaded)()
+    return host_set.contains(host) or host in get_control_plane_hosts()
+
+
+def _apply_host_changes(payload):
+    host_set.apply((payload.get("added", []), payload.get("removed", [])))
+
+
+def _reset_host_set(payload):
+    host_set.invalidate()
+
+
+register_handler("hosts", _apply_host_changes)
+register_handler("reset", _reset_host_set)
+
+
+def broadcast_host_changes(added=(), removed=()):
+    """
+    Publishes host membership changes to every worker once the transaction commits.
+    """
+    added = [h for h in added if h]
+    removed = [h for h in removed if h and h not in added]
+    if not added and not removed:
+        return
+    transaction.on_commit(lambda: publish("hosts", added=added, removed=removed))
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+MISSING = object()
+
+
+class LocalLRUCache:
+    """
+    Bounded per-process LRU with a TTL.
+    Sits in front of the shared cache so hot keys never leave the worker.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ReloadableSet:
+    """
+    Per-process state rebuilt from the database every `ttl` seconds and patched
+    by broadcast events in between. Subclasses implement `build()` and `patch()`.
+
+    One thread rebuilds at a time and the others keep serving the previous state.
+    The rebuild runs outside `_lock`, so event handlers never wait on the query;
+    events that arrive during it are replayed onto the new state before the swap.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._state = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._pending = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def build(self):
+        raise NotImplementedError
+
+    def patch(self, state, event):
+        raise NotImplementedError
+
+    def is_stale(self):
+        return self._state is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def ensure_loaded(self):
+        if not self.is_stale():
+            return
+        with self._load_lock:
+            # Whoever held the lock before us may have just reloaded.
+            if self.is_stale():
+                self._reload()
+
+    def load(self):
+        with self._load_lock:
+            self._reload()
+
+    def _reload(self):
+        with self._lock:
+            self._pending = []
+            generation = self._generation
+        try:
+            state = self.build()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for event in self._pending:
+                state = self.patch(state, event)
+            self._pending = None
+            self._state = state
+            # A reset during the rebuild may have hidden changes from it; stay stale.
+            self._loaded_at = time.monotonic() if generation == self._generation else 0.0
+
+    def apply(self, event):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(event)
+            if self._state is not None:
+                self._state = self.patch(self._state, event)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = 0.0
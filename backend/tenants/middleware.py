@@ -1,36 +1,105 @@
-from django.http import JsonResponse
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 
 from .context import reset_current_tenant, set_current_tenant
+from .hostset import ais_known_host, is_known_host
 from .models import Tenant
-from .resolver import resolve_tenant_from_host
+from .pubsub import ensure_listener
+from .resolver import aresolve_tenant_from_host, resolve_tenant_from_host
 
 
-class TenantResolverMiddleware:
+class TLSAskMiddleware:
     """
-    Resolves tenant only from request host and stores it in request context.
+    Answers Caddy's on-demand TLS "ask" from the in-memory host set.
+    Must sit first in MIDDLEWARE: it never touches auth, sessions, DRF or ALLOWED_HOSTS.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.path = getattr(settings, "TENANT_TLS_ASK_PATH", "/internal/tls-ask/").rstrip("/")
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _is_ask(self, request):
+        return request.path_info.rstrip("/") == self.path
 
     def __call__(self, request):
-        host = request.get_host()
-        tenant, is_control_plane = resolve_tenant_from_host(host)
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._is_ask(request):
+            return self.get_response(request)
+
+        ensure_listener()
+        allowed = is_known_host(request.GET.get("domain", ""))
+        return HttpResponse(status=200 if allowed else 404)
+
+    async def __acall__(self, request):
+        if not self._is_ask(request):
+            return await self.get_response(request)
+
+        ensure_listener()
+        allowed = await ais_known_host(request.GET.get("domain", ""))
+        return HttpResponse(status=200 if allowed else 404)
+
+
+class TenantResolverMiddleware:
+    """
+    Resolves tenant only from request host and stores it in request context.
+    Runs natively under both WSGI and ASGI.
+    """
 
-        token = set_current_tenant(tenant)
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _bind(self, request, tenant):
         request.tenant = tenant
         request.site = tenant.site if tenant and tenant.site_id else None
+        return set_current_tenant(tenant)
 
-        try:
-            if tenant is None and not is_control_plane:
-                return JsonResponse({"detail": "Tenant not found."}, status=404)
+    def _reject(self, tenant, is_control_plane):
+        if tenant is None and not is_control_plane:
+            return JsonResponse({"detail": "Tenant not found."}, status=404)
+
+        if tenant and tenant.status == Tenant.Status.SUSPENDED:
+            return JsonResponse({"detail": "Tenant is suspended."}, status=403)
 
-            if tenant and tenant.status == Tenant.Status.SUSPENDED:
-                return JsonResponse({"detail": "Tenant is suspended."}, status=403)
+        if tenant and tenant.status == Tenant.Status.DISABLED:
+            return JsonResponse({"detail": "Tenant is disabled."}, status=403)
 
-            if tenant and tenant.status == Tenant.Status.DISABLED:
-                return JsonResponse({"detail": "Tenant is disabled."}, status=403)
+        return None
 
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        tenant, is_control_plane = resolve_tenant_from_host(request.get_host())
+        token = self._bind(request, tenant)
+        try:
+            rejection = self._reject(tenant, is_control_plane)
+            if rejection is not None:
+                return rejection
             return self.get_response(request)
         finally:
             reset_current_tenant(token)
+
+    async def __acall__(self, request):
+        tenant, is_control_plane = await aresolve_tenant_from_host(request.get_host())
+        token = self._bind(request, tenant)
+        try:
+            rejection = self._reject(tenant, is_control_plane)
+            if rejection is not None:
+                return rejection
+            return await self.get_response(request)
+        finally:
+            reset_current_tenant(token)
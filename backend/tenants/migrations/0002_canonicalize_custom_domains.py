@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from tenants.domains import canonicalize_domain
+
+
+def canonicalize_custom_domains(apps, schema_editor):
+    Tenant = apps.get_model("tenants", "Tenant")
+
+    rows = Tenant.objects.exclude(custom_domain__isnull=True).values_list("id", "custom_domain")
+    # Already-canonical rows keep their domain, so they claim it first.
+    rows = sorted(rows, key=lambda row: (canonicalize_domain(row[1]) != row[1], row[0]))
+    owners = {}
+    cleared, renamed = [], []
+    for tenant_id, custom_domain in rows:
+        canonical = canonicalize_domain(custom_domain) or None
+        if canonical is None or canonical in owners:
+            # Duplicate once canonicalized; keep the first owner, clear the rest.
+            cleared.append(tenant_id)
+            continue
+        owners[canonical] = tenant_id
+        if canonical != custom_domain:
+            renamed.append((tenant_id, canonical))
+
+    # Free every duplicate before renaming, so no UPDATE hits the unique index.
+    Tenant.objects.filter(id__in=cleared).update(custom_domain=None)
+    for tenant_id, canonical in renamed:
+        Tenant.objects.filter(id=tenant_id).update(custom_domain=canonical)
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tenants", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_custom_domains, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,24 @@
 from django.db import models
 
+from .domains import canonicalize_domain
 from .managers import TenantScopedManager
 
 
-class Tenant(models.Model):
+class SnapshotLoadingMixin:
+    """
+    Instances rebuilt from a cached snapshot only carry a few columns.
+    The first access to any other column loads all missing ones in a single query.
+    """
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        if fields is not None and getattr(self, "_from_snapshot", False):
+            deferred = self.get_deferred_fields()
+            if deferred and set(fields) <= deferred:
+                fields = list(deferred)
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+
+
+class Tenant(SnapshotLoadingMixin, models.Model):
     class Plan(models.TextChoices):
         FREE = "free", "Free"
         PRO = "pro", "Pro"
@@ -44,13 +59,21 @@ class Tenant(models.Model):
     def __str__(self):
         return f"{self.name} ({self.subdomain})"
 
+    def save(self, *args, **kwargs):
+        # Stored canonical so the resolver can use an exact match on the unique index.
+        self.custom_domain = canonicalize_domain(self.custom_domain) or None
+        super().save(*args, **kwargs)
+
 
 class TenantOwnedModel(models.Model):
     """
     Base model for tenant-owned rows.
     Adds tenant_id and centralizes tenant-aware manager behavior.
+    Writes bump the tenant's cache generation unless `bumps_tenant_generation` is False.
     """
 
+    bumps_tenant_generation = True
+
     tenant = models.ForeignKey(
         "tenants.Tenant",
         on_delete=models.CASCADE,
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_lock = threading.Lock()
+_listener_pid = None
+_publisher = None
+_publisher_pid = None
+
+
+def get_channel():
+    return getattr(settings, "TENANT_CACHE_PUBSUB_CHANNEL", "tenant:cache")
+
+
+def get_pubsub_url():
+    return getattr(settings, "TENANT_CACHE_PUBSUB_URL", None)
+
+
+def register_handler(event: str, handler):
+    """
+    Registers a callable(payload) run in every worker when `event` is published.
+    """
+    _handlers.setdefault(event, []).append(handler)
+
+
+def dispatch(event: str, payload: dict):
+    for handler in _handlers.get(event, []):
+        try:
+            handler(payload)
+        except Exception:
+            logger.exception("Tenant cache handler failed for %s", event)
+
+
+def _redis_client(url):
+    import redis
+
+    return redis.Redis.from_url(url, socket_connect_timeout=1, socket_timeout=1)
+
+
+def publish(event: str, **payload):
+    """
+    Broadcasts an event to every worker (including this one).
+    Falls back to a local dispatch when pub/sub is not configured.
+    """
+    global _publisher, _publisher_pid
+
+    url = get_pubsub_url()
+    if not url:
+        dispatch(event, payload)
+        return
+
+    message = json.dumps({"event": event, "payload": payload})
+    try:
+        if _publisher is None or _publisher_pid != os.getpid():
+            _publisher = _redis_client(url)
+            _publisher_pid = os.getpid()
+        _publisher.publish(get_channel(), message)
+    except Exception:
+        # Peers fall back to their local TTL; keep this worker consistent.
+        dispatch(event, payload)
+
+
+def _on_disconnect():
+    # Messages may have been missed while disconnected.
+    dispatch("reset", {})
+
+
+def _listen(url):
+    import redis
+
+    backoff = 1
+    while True:
+        try:
+            client = redis.Redis.from_url(url, socket_connect_timeout=1, health_check_interval=30)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(get_channel())
+            backoff = 1
+            for message in pubsub.listen():
+                try:
+                    data = json.loads(message["data"])
+                except (TypeError, ValueError, KeyError):
+                    continue
+                dispatch(data.get("event"), data.get("payload") or {})
+        except Exception:
+            logger.warning("Tenant cache listener disconnected; retrying in %ss", backoff)
+        _on_disconnect()
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+def ensure_listener():
+    """
+    Starts the subscriber thread once per process (safe after fork).
+    """
+    global _listener_pid
+
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _lock:
+        if _listener_pid == pid:
+            return
+        _listener_pid = pid
+        url = get_pubsub_url()
+        if not url:
+            return
+        try:
+            import redis  # noqa: F401
+        except ImportError:
+            return
+        thread = threading.Thread(
+            target=_listen,
+            args=(url,),
+            name="tenant-cache-listener",
+            daemon=True,
+        )
+        thread.start()
@@ -1,21 +1,40 @@
+import asyncio
+import math
+import random
+import threading
+import time
+
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
 
+from .domains import canonicalize_domain
+from .local_cache import MISSING, LocalLRUCache
 from .models import Tenant
+from .pubsub import ensure_listener, publish, register_handler
+from .snapshot import abuild_snapshot, build_snapshot, is_snapshot, materialize
 
 
 NEGATIVE_CACHE_VALUE = "missing"
 CONTROL_PLANE_CACHE_VALUE = "control"
 
+# Per-worker tier in front of the shared cache. Holds tenant+site snapshots.
+_local_cache = LocalLRUCache(
+    maxsize=getattr(settings, "TENANT_LOCAL_CACHE_SIZE", 2048),
+    ttl=getattr(settings, "TENANT_LOCAL_CACHE_TTL", 60),
+)
+
 
 def _cache_key(host: str) -> str:
     return f"tenant:host:{host}"
 
 
+def _lock_key(host: str) -> str:
+    return f"tenant:host-lock:{host}"
+
+
 def normalize_host(host: str) -> str:
-    if not host:
-        return ""
-    return host.split(":")[0].strip().lower().rstrip(".")
+    return canonicalize_domain(host)
 
 
 def get_control_plane_hosts():
@@ -26,8 +45,17 @@ def get_reserved_subdomains():
     return {s.lower() for s in getattr(settings, "TENANT_RESERVED_SUBDOMAINS", [])}
 
 
+def get_platform_domain() -> str:
+    return getattr(settings, "PLATFORM_DOMAIN", "vofino.ir").lower()
+
+
+def is_platform_host(host: str) -> bool:
+    platform_domain = get_platform_domain()
+    return host == platform_domain or host.endswith(f".{platform_domain}")
+
+
 def extract_subdomain(host: str):
-    platform_domain = getattr(settings, "PLATFORM_DOMAIN", "vofino.ir").lower()
+    platform_domain = get_platform_domain()
     if host == platform_domain:
         return None
     suffix = f".{platform_domain}"
@@ -41,10 +69,21 @@ def extract_subdomain(host: str):
     return left
 
 
-def invalidate_host_cache(host: str):
-    host = normalize_host(host)
-    if not host:
-        return
+def _evict_hosts(payload):
+    for host in payload.get("hosts", []):
+        _local_cache.delete(host)
+
+
+def _reset_local_cache(payload):
+    _local_cache.clear()
+
+
+register_handler("evict", _evict_hosts)
+register_handler("reset", _reset_local_cache)
+
+
+def _evict(host: str):
+    _local_cache.delete(host)
     try:
         cache.delete(_cache_key(host))
     except Exception:
@@ -52,9 +91,54 @@ def invalidate_host_cache(host: str):
         pass
 
 
-def _cache_set(host: str, value):
+def invalidate_host_cache(host: str):
+    """
+    Drops a host from both cache tiers and tells every worker to do the same.
+    Runs again on commit so readers cannot re-cache pre-commit rows.
+    """
+    host = normalize_host(host)
+    if not host:
+        return
+    _evict(host)
+
+    def broadcast():
+        _evict(host)
+        publish("evict", hosts=[host])
+
+    transaction.on_commit(broadcast)
+
+
+def _cache_ttl():
+    return getattr(settings, "TENANT_CACHE_TTL", 300)
+
+
+def _entry(value, delta):
+    """
+    Shared-cache envelope. `delta` is how long the rebuild took, used for early refresh.
+    """
+    return {"value": value, "expires_at": time.time() + _cache_ttl(), "delta": delta}
+
+
+def _is_entry(entry) -> bool:
+    if not isinstance(entry, dict) or "value" not in entry:
+        return False
+    value = entry["value"]
+    return value in (CONTROL_PLANE_CACHE_VALUE, NEGATIVE_CACHE_VALUE) or is_snapshot(value)
+
+
+def _should_refresh_early(entry) -> bool:
+    """
+    Probabilistic early expiration (XFetch): as expiry nears, a growing share of
+    readers volunteers to rebuild, so a hot key is refreshed before it expires.
+    """
+    beta = getattr(settings, "TENANT_CACHE_EARLY_REFRESH_BETA", 1.0)
+    jitter = -entry["delta"] * beta * math.log(1.0 - random.random())
+    return time.time() + jitter >= entry["expires_at"]
+
+
+def _cache_set(host: str, value, delta=0.0):
     try:
-        cache.set(_cache_key(host), value, timeout=getattr(settings, "TENANT_CACHE_TTL", 300))
+        cache.set(_cache_key(host), _entry(value, delta), timeout=_cache_ttl())
     except Exception:
         pass
 
@@ -66,6 +150,220 @@ def _cache_get(host: str):
         return None
 
 
+async def _acache_set(host: str, value, delta=0.0):
+    try:
+        await cache.aset(_cache_key(host), _entry(value, delta), timeout=_cache_ttl())
+    except Exception:
+        pass
+
+
+async def _acache_get(host: str):
+    try:
+        return await cache.aget(_cache_key(host))
+    except Exception:
+        return None
+
+
+def _lock_timeout():
+    return getattr(settings, "TENANT_CACHE_LOCK_TIMEOUT", 5)
+
+
+def _lock_wait():
+    return getattr(settings, "TENANT_CACHE_LOCK_WAIT", 1.0)
+
+
+def _acquire_lock(host: str) -> bool:
+    try:
+        return cache.add(_lock_key(host), 1, timeout=_lock_timeout())
+    except Exception:
+        # Without a shared cache there is nothing to coordinate on.
+        return True
+
+
+def _release_lock(host: str):
+    try:
+        cache.delete(_lock_key(host))
+    except Exception:
+        pass
+
+
+async def _aacquire_lock(host: str) -> bool:
+    try:
+        return await cache.aadd(_lock_key(host), 1, timeout=_lock_timeout())
+    except Exception:
+        return True
+
+
+async def _arelease_lock(host: str):
+    try:
+        await cache.adelete(_lock_key(host))
+    except Exception:
+        pass
+
+
+def _from_cached_value(value):
+    if value == CONTROL_PLANE_CACHE_VALUE:
+        return None, True
+    if value == NEGATIVE_CACHE_VALUE:
+        return None, False
+    return materialize(value), False
+
+
+def _remember(host: str, value):
+    _local_cache.set(host, value)
+    return _from_cached_value(value)
+
+
+def _lookup(host: str):
+    """
+    Database resolution. The only code path that queries for a host.
+    """
+    if host in get_control_plane_hosts():
+        return CONTROL_PLANE_CACHE_VALUE
+
+    # Platform hosts never carry a custom domain; skip that lookup entirely.
+    if not is_platform_host(host):
+        tenant = Tenant.objects.select_related("site").filter(custom_domain=host).first()
+        return build_snapshot(tenant) if tenant else NEGATIVE_CACHE_VALUE
+
+    subdomain = extract_subdomain(host)
+    if not subdomain:
+        return NEGATIVE_CACHE_VALUE
+
+    tenant = Tenant.objects.select_related("site").filter(subdomain=subdomain).first()
+    if tenant:
+        return build_snapshot(tenant)
+
+    return NEGATIVE_CACHE_VALUE
+
+
+async def _alookup(host: str):
+    if host in get_control_plane_hosts():
+        return CONTROL_PLANE_CACHE_VALUE
+
+    if not is_platform_host(host):
+        tenant = await Tenant.objects.select_related("site").filter(custom_domain=host).afirst()
+        return await abuild_snapshot(tenant) if tenant else NEGATIVE_CACHE_VALUE
+
+    subdomain = extract_subdomain(host)
+    if not subdomain:
+        return NEGATIVE_CACHE_VALUE
+
+    tenant = await Tenant.objects.select_related("site").filter(subdomain=subdomain).afirst()
+    if tenant:
+        return await abuild_snapshot(tenant)
+
+    return NEGATIVE_CACHE_VALUE
+
+
+def _rebuild(host: str, stale_entry=None):
+    """
+    Rebuilds the shared entry under a short distributed lock.
+    Losers serve the stale entry (early refresh) or wait briefly for the winner.
+    """
+    locked = _acquire_lock(host)
+    if not locked:
+        if stale_entry is not None:
+            return stale_entry["value"]
+        deadline = time.monotonic() + _lock_wait()
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            entry = _cache_get(host)
+            if _is_entry(entry):
+                return entry["value"]
+        # Lock holder is slow or gone; resolve without caching over it.
+
+    try:
+        started = time.monotonic()
+        value = _lookup(host)
+        if locked:
+            _cache_set(host, value, delta=time.monotonic() - started)
+        return value
+    finally:
+        if locked:
+            _release_lock(host)
+
+
+async def _arebuild(host: str, stale_entry=None):
+    locked = await _aacquire_lock(host)
+    if not locked:
+        if stale_entry is not None:
+            return stale_entry["value"]
+        deadline = time.monotonic() + _lock_wait()
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+            entry = await _acache_get(host)
+            if _is_entry(entry):
+                return entry["value"]
+
+    try:
+        started = time.monotonic()
+        value = await _alookup(host)
+        if locked:
+            await _acache_set(host, value, delta=time.monotonic() - started)
+        return value
+    finally:
+        if locked:
+            await _arelease_lock(host)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+_aflights = {}
+
+
+def _single_flight(host: str, stale_entry=None):
+    """
+    Coalesces concurrent misses for one host inside this worker.
+    """
+    with _flights_lock:
+        flight = _flights.get(host)
+        leader = flight is None
+        if leader:
+            flight = _flights[host] = _Flight()
+
+    if not leader:
+        if flight.done.wait(_lock_wait()) and flight.value is not None:
+            return flight.value
+        return _rebuild(host, stale_entry)
+
+    try:
+        flight.value = _rebuild(host, stale_entry)
+        return flight.value
+    finally:
+        with _flights_lock:
+            _flights.pop(host, None)
+        flight.done.set()
+
+
+async def _asingle_flight(host: str, stale_entry=None):
+    flight = _aflights.get(host)
+    if flight is not None:
+        try:
+            value = await asyncio.wait_for(asyncio.shield(flight), _lock_wait())
+        except asyncio.TimeoutError:
+            value = None
+        if value is not None:
+            return value
+        return await _arebuild(host, stale_entry)
+
+    flight = asyncio.get_running_loop().create_future()
+    _aflights[host] = flight
+    value = None
+    try:
+        value = await _arebuild(host, stale_entry)
+        return value
+    finally:
+        _aflights.pop(host, None)
+        flight.set_result(value)
+
+
 def resolve_tenant_from_host(raw_host: str):
     """
     Returns:
@@ -75,34 +373,38 @@ def resolve_tenant_from_host(raw_host: str):
     if not host:
         return None, True
 
-    cached = _cache_get(host)
-    if cached == CONTROL_PLANE_CACHE_VALUE:
-        return None, True
-    if cached == NEGATIVE_CACHE_VALUE:
-        return None, False
-    if cached:
-        tenant = Tenant.objects.select_related("site").filter(id=cached).first()
-        if tenant:
-            return tenant, False
+    ensure_listener()
+    local = _local_cache.get(host)
+    if local is not MISSING:
+        return _from_cached_value(local)
 
-    if host in get_control_plane_hosts():
-        _cache_set(host, CONTROL_PLANE_CACHE_VALUE)
-        return None, True
+    entry = _cache_get(host)
+    if not _is_entry(entry):
+        entry = None
+    elif not _should_refresh_early(entry):
+        return _remember(host, entry["value"])
 
-    tenant = Tenant.objects.select_related("site").filter(custom_domain__iexact=host).first()
-    if tenant:
-        _cache_set(host, tenant.id)
-        return tenant, False
+    return _remember(host, _single_flight(host, entry))
 
-    subdomain = extract_subdomain(host)
-    if not subdomain:
-        _cache_set(host, NEGATIVE_CACHE_VALUE)
-        return None, False
 
-    tenant = Tenant.objects.select_related("site").filter(subdomain=subdomain).first()
-    if tenant:
-        _cache_set(host, tenant.id)
-        return tenant, False
+async def aresolve_tenant_from_host(raw_host: str):
+    """
+    Async twin of resolve_tenant_from_host for the ASGI path.
+    Uses the async cache API and async ORM so no thread hop is needed.
+    """
+    host = normalize_host(raw_host)
+    if not host:
+        return None, True
+
+    ensure_listener()
+    local = _local_cache.get(host)
+    if local is not MISSING:
+        return _from_cached_value(local)
+
+    entry = await _acache_get(host)
+    if not _is_entry(entry):
+        entry = None
+    elif not _should_refresh_early(entry):
+        return _remember(host, entry["value"])
 
-    _cache_set(host, NEGATIVE_CACHE_VALUE)
-    return None, False
+    return _remember(host, await _asingle_flight(host, entry))
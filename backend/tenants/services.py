@@ -3,6 +3,7 @@ from django.utils.text import slugify
 from django.conf import settings
 from django.db.utils import OperationalError, ProgrammingError
 
+from .generation import bump_tenant_generation
 from .models import Tenant
 from .resolver import invalidate_host_cache
 
@@ -52,5 +53,21 @@ def ensure_tenant_for_site(site, *, plan=Tenant.Plan.FREE, status=Tenant.Status.
     invalidate_host_cache(f"{subdomain}.{platform_domain}")
     if tenant.custom_domain:
         invalidate_host_cache(tenant.custom_domain)
+    # Site fields feed the tenant's cached public pages.
+    bump_tenant_generation(tenant)
 
     return tenant
+
+
+def invalidate_site_tenant(site_id):
+    """
+    Drops the cached snapshot and generation of a site's tenant without re-syncing it.
+    """
+    tenant = Tenant.objects.filter(site_id=site_id).values("id", "subdomain", "custom_domain").first()
+    if not tenant:
+        return
+    platform_domain = getattr(settings, "PLATFORM_DOMAIN", "vofino.ir")
+    invalidate_host_cache(f"{tenant['subdomain']}.{platform_domain}")
+    if tenant["custom_domain"]:
+        invalidate_host_cache(tenant["custom_domain"])
+    bump_tenant_generation(tenant["id"])
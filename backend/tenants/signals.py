@@ -1,13 +1,16 @@
-from django.db.models.signals import post_delete, post_save, pre_save
+from django.apps import apps
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.conf import settings
 from django.db.utils import OperationalError, ProgrammingError
 
-from sites.models import Site
+from sites.models import Site, SitePlugin
 
-from .models import Tenant
+from .generation import bump_tenant_generation
+from .hostset import broadcast_host_changes, tenant_hosts
+from .models import Tenant, TenantOwnedModel
 from .resolver import invalidate_host_cache
-from .services import ensure_tenant_for_site
+from .services import ensure_tenant_for_site, invalidate_site_tenant
 
 
 @receiver(pre_save, sender=Tenant)
@@ -31,6 +34,7 @@ def tenant_clear_cache_on_save(sender, instance, **kwargs):
         invalidate_host_cache(f"{instance._old_subdomain}.{platform_domain}")
     if getattr(instance, "_old_custom_domain", None):
         invalidate_host_cache(instance._old_custom_domain)
+    bump_tenant_generation(instance)
 
 
 @receiver(post_delete, sender=Tenant)
@@ -39,14 +43,81 @@ def tenant_clear_cache_on_delete(sender, instance, **kwargs):
     invalidate_host_cache(f"{instance.subdomain}.{platform_domain}")
     if instance.custom_domain:
         invalidate_host_cache(instance.custom_domain)
+    bump_tenant_generation(instance)
+
+
+@receiver(post_save, sender=Tenant)
+def tenant_update_host_set_on_save(sender, instance, **kwargs):
+    new_hosts = tenant_hosts(instance.subdomain, instance.custom_domain)
+    old_hosts = tenant_hosts(
+        getattr(instance, "_old_subdomain", None),
+        getattr(instance, "_old_custom_domain", None),
+    )
+    broadcast_host_changes(
+        added=[host for host in new_hosts if host not in old_hosts],
+        removed=[host for host in old_hosts if host not in new_hosts],
+    )
+
+
+@receiver(post_delete, sender=Tenant)
+def tenant_update_host_set_on_delete(sender, instance, **kwargs):
+    broadcast_host_changes(removed=tenant_hosts(instance.subdomain, instance.custom_domain))
+
+
+@receiver(post_save, sender=SitePlugin)
+@receiver(post_delete, sender=SitePlugin)
+def site_plugin_clear_tenant_cache(sender, instance, **kwargs):
+    # Cached tenant snapshots carry the site's active plugin keys.
+    invalidate_site_tenant(instance.site_id)
+
+
+def tenant_owned_bump_generation(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    bump_tenant_generation(instance.tenant_id)
+
+
+def tenant_owned_m2m_bump_generation(sender, instance, action, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if isinstance(instance, TenantOwnedModel) and instance.bumps_tenant_generation:
+        bump_tenant_generation(instance.tenant_id)
+
+
+def connect_generation_signals():
+    """
+    Connects generation bumps per opted-in model rather than globally,
+    so deletes of unrelated models keep Django's fast-delete path.
+    """
+    for model in apps.get_models():
+        if not issubclass(model, TenantOwnedModel) or not model.bumps_tenant_generation:
+            continue
+        post_save.connect(tenant_owned_bump_generation, sender=model)
+        post_delete.connect(tenant_owned_bump_generation, sender=model)
+        for field in model._meta.local_many_to_many:
+            m2m_changed.connect(tenant_owned_m2m_bump_generation, sender=field.remote_field.through)
+
+
+connect_generation_signals()
+
+
+# Site fields copied onto its Tenant by ensure_tenant_for_site.
+TENANT_SYNC_FIELDS = frozenset({"name", "subdomain", "slug", "owner"})
 
 
 @receiver(post_save, sender=Site)
-def sync_tenant_from_site(sender, instance, created, raw, **kwargs):
+def sync_tenant_from_site(sender, instance, created, raw, update_fields=None, **kwargs):
     if raw:
         return
+    # Set by callers that sync the tenant themselves once the site is complete.
+    if instance.__dict__.pop("_skip_tenant_sync", False):
+        return
     if not (instance.subdomain or instance.slug):
         return
+    if update_fields is not None and not TENANT_SYNC_FIELDS & set(update_fields):
+        # Nothing the tenant row copies changed; only its cached pages are stale.
+        invalidate_site_tenant(instance.pk)
+        return
     try:
         ensure_tenant_for_site(instance)
     except (OperationalError, ProgrammingError):
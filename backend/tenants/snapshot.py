@@ -0,0 +1,68 @@
+from django.db import router
+
+from sites.models import Site
+
+from .models import Tenant
+
+
+# Bump whenever the field lists change so stale cache entries are rebuilt.
+SNAPSHOT_VERSION = 1
+
+TENANT_FIELDS = ("id", "name", "subdomain", "custom_domain", "plan", "status", "site_id")
+SITE_FIELDS = ("id", "owner_id", "category_id", "theme_id", "name", "slug", "subdomain", "provisioning_status")
+
+
+def _active_plugin_keys(site):
+    return site.site_plugins.filter(is_active=True).values_list("plugin__key", flat=True)
+
+
+def _snapshot(tenant, plugin_keys):
+    site = tenant.site if tenant.site_id else None
+    return {
+        "v": SNAPSHOT_VERSION,
+        "tenant": tuple(getattr(tenant, name) for name in TENANT_FIELDS),
+        "site": tuple(getattr(site, name) for name in SITE_FIELDS) if site is not None else None,
+        "plugins": tuple(sorted(plugin_keys)),
+    }
+
+
+def build_snapshot(tenant):
+    """
+    Compact, cache-friendly view of a tenant, its site and the site's active plugins.
+    Expects `tenant.site` to be loaded (select_related).
+    """
+    plugin_keys = list(_active_plugin_keys(tenant.site)) if tenant.site_id else []
+    return _snapshot(tenant, plugin_keys)
+
+
+async def abuild_snapshot(tenant):
+    plugin_keys = [key async for key in _active_plugin_keys(tenant.site)] if tenant.site_id else []
+    return _snapshot(tenant, plugin_keys)
+
+
+def is_snapshot(value) -> bool:
+    return isinstance(value, dict) and value.get("v") == SNAPSHOT_VERSION
+
+
+def _instance(model, field_names, values):
+    """
+    Builds a model instance with only the snapshot columns loaded.
+    Any other column is deferred and loaded on first access.
+    """
+    data = dict(zip(field_names, values))
+    ordered = [data[f.attname] for f in model._meta.concrete_fields if f.attname in data]
+    instance = model.from_db(router.db_for_read(model), data.keys(), ordered)
+    instance._from_snapshot = True
+    return instance
+
+
+def materialize(snapshot):
+    """
+    Returns a fresh Tenant (with `site` attached) for the current request.
+    """
+    tenant = _instance(Tenant, TENANT_FIELDS, snapshot["tenant"])
+    if snapshot["site"] is not None:
+        site = _instance(Site, SITE_FIELDS, snapshot["site"])
+        site._active_plugin_keys = frozenset(snapshot["plugins"])
+        tenant.site = site
+    return tenant
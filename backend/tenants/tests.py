@@ -0,0 +1,259 @@
+import json
+import threading
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from menu.models import Product, ProductCategory
+from menu.views import PublicMenuDataView
+from orders.models import Cart
+from sites.models import Plugin, Site, SiteCategory, SitePlugin
+from .middleware import TenantResolverMiddleware
+from .generation import get_tenant_generation
+from .hostset import HostSet, host_set
+from .models import Tenant
+from .resolver import _cache_key, _local_cache, _lock_key, aresolve_tenant_from_host, resolve_tenant_from_host
+from .services import ensure_tenant_for_site
+
+User = get_user_model()
+
+
+class TenantResolverCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_cache.clear()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.host = f'{self.tenant.subdomain}.vofino.ir'
+
+    def test_known_host_is_served_without_queries(self):
+        tenant, is_control_plane = resolve_tenant_from_host(self.host)
+        self.assertEqual(tenant.id, self.tenant.id)
+        self.assertFalse(is_control_plane)
+
+        with self.assertNumQueries(0):
+            tenant, _ = resolve_tenant_from_host(self.host)
+            self.assertEqual(tenant.site.id, self.site.id)
+
+    def test_cached_tenant_is_not_shared_between_requests(self):
+        first, _ = resolve_tenant_from_host(self.host)
+        first.name = 'Changed'
+        second, _ = resolve_tenant_from_host(self.host)
+        self.assertEqual(second.name, self.tenant.name)
+
+    def test_tenant_save_evicts_local_entry(self):
+        resolve_tenant_from_host(self.host)
+        self.tenant.status = Tenant.Status.SUSPENDED
+        self.tenant.save()
+
+        tenant, _ = resolve_tenant_from_host(self.host)
+        self.assertEqual(tenant.status, Tenant.Status.SUSPENDED)
+
+    def test_shared_cache_hit_rebuilds_tenant_without_queries(self):
+        resolve_tenant_from_host(self.host)
+        _local_cache.clear()
+
+        with self.assertNumQueries(0):
+            tenant, _ = resolve_tenant_from_host(self.host)
+            self.assertEqual(tenant.plan, self.tenant.plan)
+            self.assertEqual(tenant.site.owner_id, self.user.id)
+            self.assertFalse(tenant.site.is_plugin_active('menu'))
+
+    def test_non_snapshot_field_is_loaded_on_access(self):
+        tenant, _ = resolve_tenant_from_host(self.host)
+        with self.assertNumQueries(1):
+            self.assertEqual(tenant.site.schema_type, self.site.schema_type)
+            self.assertEqual(tenant.site.created_at, self.site.created_at)
+
+    def test_custom_domain_is_stored_canonical_and_resolved_exactly(self):
+        self.tenant.custom_domain = ' Shop.Example.COM. '
+        self.tenant.save()
+        self.tenant.refresh_from_db()
+        self.assertEqual(self.tenant.custom_domain, 'shop.example.com')
+
+        tenant, _ = resolve_tenant_from_host('SHOP.example.com:443')
+        self.assertEqual(tenant.id, self.tenant.id)
+
+        self.tenant.custom_domain = 'کافه.example'
+        self.tenant.save()
+        self.assertTrue(self.tenant.custom_domain.startswith('xn--'))
+        tenant, _ = resolve_tenant_from_host('کافه.example')
+        self.assertEqual(tenant.id, self.tenant.id)
+
+    def test_platform_host_miss_skips_custom_domain_lookup(self):
+        with self.assertNumQueries(1):
+            tenant, is_control_plane = resolve_tenant_from_host('unknown.vofino.ir')
+        self.assertIsNone(tenant)
+        self.assertFalse(is_control_plane)
+
+    def test_expiring_entry_is_served_stale_while_another_worker_rebuilds(self):
+        resolve_tenant_from_host(self.host)
+        _local_cache.clear()
+        entry = cache.get(_cache_key(self.host))
+        entry['expires_at'] = 0
+        cache.set(_cache_key(self.host), entry)
+        cache.add(_lock_key(self.host), 1)
+
+        with self.assertNumQueries(0):
+            tenant, _ = resolve_tenant_from_host(self.host)
+        self.assertEqual(tenant.id, self.tenant.id)
+
+    def test_early_refresh_rebuilds_entry_when_lock_is_free(self):
+        resolve_tenant_from_host(self.host)
+        _local_cache.clear()
+        entry = cache.get(_cache_key(self.host))
+        entry['expires_at'] = 0
+        cache.set(_cache_key(self.host), entry)
+
+        resolve_tenant_from_host(self.host)
+        self.assertGreater(cache.get(_cache_key(self.host))['expires_at'], 0)
+        self.assertIsNone(cache.get(_lock_key(self.host)))
+
+
+
+class AsyncTenantResolutionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.host = f'{self.tenant.subdomain}.vofino.ir'
+
+    async def test_async_resolver_matches_sync_resolver(self):
+        tenant, is_control_plane = await aresolve_tenant_from_host(self.host)
+        self.assertEqual(tenant.id, self.tenant.id)
+        self.assertEqual(tenant.site.id, self.site.id)
+        self.assertFalse(is_control_plane)
+
+        tenant, is_control_plane = await aresolve_tenant_from_host('vofino.ir')
+        self.assertIsNone(tenant)
+        self.assertTrue(is_control_plane)
+
+    async def test_async_middleware_serves_public_menu(self):
+        middleware = TenantResolverMiddleware(PublicMenuDataView.as_view())
+        response = await middleware(self.factory.get('/api/menu/public-data/', HTTP_HOST=self.host))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.content)['plugin_inactive'])
+
+    async def test_async_middleware_rejects_unknown_host(self):
+        middleware = TenantResolverMiddleware(PublicMenuDataView.as_view())
+        response = await middleware(self.factory.get('/api/menu/public-data/', HTTP_HOST='nope.vofino.ir'))
+        self.assertEqual(response.status_code, 404)
+
+
+class TenantGenerationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+        self.host = f'{self.tenant.subdomain}.vofino.ir'
+        SitePlugin.objects.create(site=self.site, plugin=Plugin.objects.create(key='menu', name='Menu'))
+        self.menu_category = ProductCategory.objects.create(site=self.site, name='Drinks')
+        self.middleware = TenantResolverMiddleware(PublicMenuDataView.as_view())
+
+    def get_menu(self):
+        request = self.factory.get('/api/menu/public-data/', HTTP_HOST=self.host)
+        return json.loads(async_to_sync(self.middleware)(request).content)
+
+    def test_menu_write_is_visible_immediately(self):
+        self.assertEqual(self.get_menu()['products'], [])
+        with self.assertNumQueries(0):
+            self.get_menu()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(site=self.site, category=self.menu_category, title='Latte', price=100)
+        self.assertEqual([p['title'] for p in self.get_menu()['products']], ['Latte'])
+
+    def test_order_writes_do_not_bump_generation(self):
+        generation = get_tenant_generation(self.tenant)
+        Cart.objects.create(site=self.site, tenant=self.tenant)
+        self.assertEqual(get_tenant_generation(self.tenant), generation)
+
+        self.menu_category.name = 'Hot drinks'
+        self.menu_category.save()
+        self.assertGreater(get_tenant_generation(self.tenant), generation)
+
+
+class TLSAskEndpointTest(TestCase):
+    def setUp(self):
+        host_set.invalidate()
+        self.user = User.objects.create_user(username='owner1', phone_number='09123456789', password='password')
+        self.category = SiteCategory.objects.create(name='Cafe', slug='cafe')
+        self.site = Site.objects.create(owner=self.user, name='My Cafe', slug='my-cafe', subdomain='my-cafe', category=self.category)
+        self.tenant = ensure_tenant_for_site(self.site)
+
+    def ask(self, domain):
+        return self.client.get('/internal/tls-ask/', {'domain': domain}, HTTP_HOST='django:8000')
+
+    def test_known_and_unknown_hosts(self):
+        self.assertEqual(self.ask('my-cafe.vofino.ir').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ask('MY-CAFE.vofino.ir.').status_code, 200)
+            self.assertEqual(self.ask('scanner-probe.example.com').status_code, 404)
+            self.assertEqual(self.ask('').status_code, 404)
+
+    def test_membership_follows_tenant_changes(self):
+        self.ask('my-cafe.vofino.ir')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenant.subdomain = 'new-cafe'
+            self.tenant.custom_domain = 'shop.example.com'
+            self.tenant.save()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ask('shop.example.com').status_code, 200)
+            self.assertEqual(self.ask('new-cafe.vofino.ir').status_code, 200)
+            self.assertEqual(self.ask('my-cafe.vofino.ir').status_code, 404)
+
+
+class HostSetReloadTest(SimpleTestCase):
+    def make_host_set(self, hosts):
+        host_set = HostSet(ttl=300)
+        self.builds = 0
+        self.release = threading.Event()
+
+        def build():
+            self.builds += 1
+            self.release.wait(5)
+            return set(hosts)
+
+        host_set.build = build
+        return host_set
+
+    def test_concurrent_stale_checks_reload_once(self):
+        host_set = self.make_host_set({'a.vofino.ir'})
+        threads = [threading.Thread(target=host_set.ensure_loaded) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.builds, 1)
+        self.assertTrue(host_set.contains('a.vofino.ir'))
+
+    def test_events_during_a_reload_are_replayed(self):
+        host_set = self.make_host_set({'a.vofino.ir', 'b.vofino.ir'})
+        loader = threading.Thread(target=host_set.load)
+        loader.start()
+        while not self.builds:
+            pass
+        # The listener thread is not blocked by the running query.
+        host_set.apply((['c.vofino.ir'], ['b.vofino.ir']))
+        self.release.set()
+        loader.join()
+        self.assertTrue(host_set.contains('c.vofino.ir'))
+        self.assertFalse(host_set.contains('b.vofino.ir'))
+        self.assertFalse(host_set.is_stale())
+
+        host_set.invalidate()
+        self.assertTrue(host_set.is_stale())
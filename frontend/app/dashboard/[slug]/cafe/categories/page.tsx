@@ -54,8 +54,8 @@ export default function CategoriesPage() {
     setIsLoading(true)
     try {
       const [categoriesData, productsData] = await Promise.all([
-        api.get("/menu/categories/"),
-        api.get("/menu/products/")
+        api.getAll("/menu/categories/"),
+        api.getAll("/menu/products/")
       ])
       setCategories(categoriesData)
       setProducts(productsData)
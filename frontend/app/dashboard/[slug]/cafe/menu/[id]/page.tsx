@@ -50,8 +50,8 @@ export default function EditProductPage({ params }: { params: Promise<{ id: stri
       try {
         const [product, cats, tags] = await Promise.all([
           api.get(`/menu/products/${id}/`),
-          api.get("/menu/categories/"),
-          api.get("/menu/tags/"),
+          api.getAll("/menu/categories/"),
+          api.getAll("/menu/tags/"),
         ])
         setFormData({
           ...product,
@@ -46,8 +46,8 @@ export default function NewProductPage() {
     const fetchData = async () => {
       try {
         const [cats, tags] = await Promise.all([
-          api.get("/menu/categories/"),
-          api.get("/menu/tags/"),
+          api.getAll("/menu/categories/"),
+          api.getAll("/menu/tags/"),
         ])
         setCategories(cats)
         setAvailableTags(tags)
@@ -62,8 +62,8 @@ export default function ProductsPage() {
     const fetchData = async () => {
       try {
         const [productsData, categoriesData] = await Promise.all([
-          api.get("/menu/products/"),
-          api.get("/menu/categories/")
+          api.getAll("/menu/products/"),
+          api.getAll("/menu/categories/")
         ])
         setProducts(productsData)
         setCategories(categoriesData)
@@ -30,7 +30,7 @@ export default function OrdersPage() {
     if (isPluginLoading) return
     const fetchOrders = async () => {
       try {
-        const data = await api.get("/orders/")
+        const data = await api.getAll("/orders/")
         setOrders(data)
       } catch (error) {
         console.error("Failed to fetch orders", error)
@@ -39,7 +39,7 @@ export default function PaymentListPage() {
     const fetchPayments = async () => {
       try {
         const data = await api.get('/orders/payment-list/')
-        setPayments(data.payments)
+        setPayments(await api.getAll('/orders/payment-list/', 'payments', data))
         setTotalSum(data.total_sum)
       } catch (error) {
         console.error("Failed to fetch payments", error)
@@ -61,7 +61,7 @@ export default function DashboardPage() {
   const fetchSites = async () => {
     setIsFetchingSites(true)
     try {
-      const data = await api.get("/sites/user-sites/")
+      const data = await api.getAll("/sites/user-sites/")
       setSites(data)
     } catch (error) {
       toast.error("خطا در دریافت لیست سایت‌ها")
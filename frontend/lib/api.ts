@@ -40,6 +40,18 @@ export const api = {
     return handleResponse(response, endpoint)
   },
 
+  // Lists are paged by cursor; follows `next` until the last page.
+  async getAll(endpoint: string, key = "results", firstPage?: any): Promise<any[]> {
+    const path = endpoint.split("?")[0]
+    let page: any = firstPage ?? await api.get(endpoint)
+    const items: any[] = [...page[key]]
+    while (page.next) {
+      page = await api.get(`${path}${new URL(page.next).search}`)
+      items.push(...page[key])
+    }
+    return items
+  },
+
   async post(endpoint: string, data: any) {
     const headers = await getAuthHeaders()
     const isFormData = data instanceof FormData
@@ -39,7 +39,7 @@ export const useSiteStore = create<SiteState>((set, get) => ({
   fetchAllSites: async () => {
     set({ isLoading: true, error: null })
     try {
-      const sitesData = await api.get('/sites/user-sites/')
+      const sitesData = await api.getAll('/sites/user-sites/')
       set({ 
         sites: sitesData,
         isLoading: false 